@@ -1,48 +1,303 @@
+import argparse
+import asyncio
 import sys
 import threading
 import time
+from typing import Callable, Dict, Optional
 
-from mcdreforged.api.decorator import new_thread
 from mcdreforged.api.rtext import *
 
+from player.online import OnlinePlayers, players
+from utils.aio import get_runtime
 from utils.commands import AbstractCommand, CommandParsingError
+from utils.executor import CommandExecutor, ExecutorMode
+from utils.log_rotation import RotatingLogHandler
+from utils.log_sink import AsyncLogSink, OverflowPolicy
 from utils.logger import get_logger, log
+from utils.profiler import get_profiler
+from utils.rcon import RconServer, get_rcon
+from utils.reader import AsyncLineReader, LineReader
+from utils.render_cache import RenderCache, get_render_cache
+from utils.scoreboard import get_scoreboard
+from utils.status import ServerStatus, get_status
+from utils.ticks import TickScheduler, get_scheduler
+from utils.world import WorldState, get_world
 
+MIB = 1024 * 1024
 
-def main(start_time: float):
+
+def bounded(kind: Callable[[str], float], minimum: float, maximum: Optional[float] = None) -> Callable[[str], float]:
+    """
+    argparse type of kind, rejecting values outside of [minimum, maximum]
+    """
+    def parse(text: str) -> float:
+        value = kind(text)
+        if not (value >= minimum and (maximum is None or value <= maximum)):
+            limit = f'at least {minimum}' if maximum is None else f'between {minimum} and {maximum}'
+            raise argparse.ArgumentTypeError(f'must be {limit}, found {text}')
+        return value
+
+    # argparse names the type in its "invalid int value" messages
+    parse.__name__ = kind.__name__
+    return parse
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Fake server to debug MCDR plugins')
+    parser.add_argument('--workers', type=int, default=CommandExecutor.WORKERS,
+                        help='Worker thread amount used in parallel mode')
+    parser.add_argument('--queue-size', type=int, default=CommandExecutor.QUEUE_SIZE,
+                        help='Pending command amount before the input is blocked')
+    parser.add_argument('--mode', choices=[mode.value for mode in ExecutorMode], default=CommandExecutor.MODE.value,
+                        help='fifo: run commands strictly in order; parallel: only keep the order of the same command')
+    parser.add_argument('--encoding', default=sys.getfilesystemencoding(),
+                        help='Encoding used to decode the command input')
+    parser.add_argument('--script', metavar='FILE',
+                        help='Run every command in FILE ("-" for stdin) as fast as possible, then exit')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='Run the server on an asyncio event loop instead of the worker thread pool')
+    parser.add_argument('--async-log', action='store_true',
+                        help='Format and write log messages on a dedicated thread in batches')
+    parser.add_argument('--log-queue-size', type=int, default=AsyncLogSink.QUEUE_SIZE,
+                        help='Pending log message amount of the async log writer')
+    parser.add_argument('--log-overflow', choices=[policy.value for policy in OverflowPolicy],
+                        default=OverflowPolicy.BLOCK.value,
+                        help='block: wait for the log writer when its queue is full; drop: discard the message')
+    parser.add_argument('--log-max-size', type=int, default=RotatingLogHandler.MAX_BYTES // MIB, metavar='MIB',
+                        help='Archive logs/latest.log once it reaches this size, 0 to only rotate daily')
+    parser.add_argument('--log-retention', type=int, default=RotatingLogHandler.RETENTION_BYTES // MIB, metavar='MIB',
+                        help='Delete the oldest archived logs beyond this total size, 0 to keep all of them')
+    parser.add_argument('--render-cache-size', type=bounded(int, 0), default=RenderCache.SIZE,
+                        help='Amount of rendered tellraw texts to keep, 0 to disable the cache')
+    parser.add_argument('--max-players', type=int, default=OnlinePlayers.LIMIT,
+                        help='Maximum amount of online fake players')
+    parser.add_argument('--tps', type=bounded(float, TickScheduler.MIN_TPS, TickScheduler.MAX_TPS),
+                        default=TickScheduler.TPS,
+                        help='Target tick rate of the tick loop')
+    parser.add_argument('--world', default=WorldState.DIRECTORY, metavar='DIR',
+                        help='Directory of the persistent world state')
+    parser.add_argument('--autosave-interval', type=int, default=WorldState.AUTOSAVE_INTERVAL, metavar='TICKS',
+                        help='Ticks between autosaves, 0 to only save on save-all and stop')
+    parser.add_argument('--rcon-port', type=int, metavar='PORT',
+                        help=f'Listen for RCON connections on PORT (e.g. {RconServer.PORT}), 0 to pick a free one')
+    parser.add_argument('--rcon-host', default=RconServer.HOST,
+                        help='Address the RCON listener binds to')
+    parser.add_argument('--rcon-password', default='',
+                        help='Password of RCON clients, RCON stays disabled without one')
+    parser.add_argument('--status-port', type=int, metavar='PORT',
+                        help=f'Answer Server List Ping on PORT (e.g. {ServerStatus.PORT}), 0 to pick a free one')
+    parser.add_argument('--query-port', type=int, metavar='PORT',
+                        help=f'Answer the UDP Query protocol on PORT (e.g. {ServerStatus.PORT}), 0 to pick a free one')
+    parser.add_argument('--status-host', default=ServerStatus.HOST,
+                        help='Address the Server List Ping and Query listeners bind to')
+    parser.add_argument('--motd', default=ServerStatus.MOTD,
+                        help='Message of the day shown by Server List Ping and Query')
+    parser.add_argument('--virtual-clock', action='store_true',
+                        help='Let game time and log timestamps advance with ticks only, so tick sprint fast-forwards them')
+    return parser.parse_args(argv)
+
+
+def open_input(args: argparse.Namespace):
+    if args.script is None or args.script == '-':
+        return sys.stdin.buffer
+    return open(args.script, 'rb')
+
+
+def report_script(lines: int, script_start: float):
+    cost = max(time.time() - script_start, 1e-9)
+    log(f'Script finished: {lines} lines in {round(cost, 3)}s ({round(lines / cost)} lines/sec)')
+
+
+def report_log_sink():
+    stats = get_logger().sink_stats
+    if stats is not None:
+        log(f'Log writer: {stats.written} lines in {stats.batches} batches, '
+            f'{stats.dropped} dropped, peak queue depth {stats.peak_depth}')
+
+
+def report_render_cache():
+    stats = get_render_cache().stats
+    if stats.hits + stats.misses != 0:
+        log(f'Text render cache: {round(stats.hit_rate * 100, 1)}% hit rate '
+            f'({stats.hits} hits, {stats.misses} misses), {stats.evictions} evicted, {stats.size}/{stats.capacity} entries')
+
+
+def load_world(args: argparse.Namespace):
+    start = time.perf_counter()
+    world = get_world()
+    log(f'Preparing level "{args.world}"')
+    regions = world.open(args.world)
+    players.load_usercache()
+    get_scoreboard().load()
+    log(f'Indexed {regions} regions ({world.file_size} bytes) in {round((time.perf_counter() - start) * 1000, 2)} ms')
+
+
+async def open_listeners(args: argparse.Namespace):
+    if args.status_port is not None or args.query_port is not None:
+        await get_status().open(args.status_host, args.status_port, args.query_port)
+    if args.rcon_port is not None:
+        await get_rcon().open(args.rcon_host, args.rcon_port, args.rcon_password)
+
+
+async def close_listeners():
+    await get_status().close()
+    await get_rcon().close()
+
+
+def main(start_time: float, args: argparse.Namespace):
+    file_handler = get_logger().file_handler
+    file_handler.max_bytes = args.log_max_size * MIB
+    file_handler.retention_bytes = args.log_retention * MIB
+    get_render_cache().resize(args.render_cache_size)
+    players.limit = args.max_players
+    get_status().motd = args.motd
+    if args.async_log:
+        get_logger().enable_async(args.log_queue_size, OverflowPolicy(args.log_overflow))
+    scheduler = get_scheduler()
+    scheduler.set_rate(args.tps)
+    if args.virtual_clock:
+        scheduler.virtual = True
+        get_logger().time_source = scheduler.time
+    load_world(args)
+    if args.autosave_interval > 0:
+        scheduler.schedule(args.autosave_interval, get_world().autosave, interval=args.autosave_interval)
+    scheduler.start()
+    try:
+        if args.asyncio:
+            try:
+                asyncio.run(async_main(start_time, args))
+            except KeyboardInterrupt:
+                log('Server Interrupted')
+                log('rue')
+        else:
+            threaded_main(start_time, args)
+    finally:
+        get_status().stop()
+        get_rcon().stop()
+        scheduler.stop()
+        get_world().close()
+        get_logger().disable_async()
+
+
+def threaded_main(start_time: float, args: argparse.Namespace):
+    executor = CommandExecutor(args.workers, args.queue_size, ExecutorMode(args.mode))
+    CommandExecutor.set_instance(executor)
     try:
         time.sleep(0.001)
         # log('Starting minecraft server version 1.19.2')
-        log(f"Current encoding method: {sys.getfilesystemencoding()}")
+        log(f"Current encoding method: {args.encoding}")
         AbstractCommand._refresh()
+        executor.start()
         log(f'Done ({round(time.time() - start_time, 3)}s)! For help, type "help"')
-        
-        @new_thread('Server Thread')
+        get_runtime().call(open_listeners(args))
+
         def command_exec(cmd: str):
             try:
                 if len(cmd) != 0:
                     AbstractCommand._parse(cmd)
             except CommandParsingError:
                 log(cmd)
-            except:
-                get_logger().exception(RText(f'Error occurred in {threading.current_thread().getName()}:', RColor.red))
 
-        while True:
-            text = input()
+        stream = open_input(args)
+        reader = LineReader(stream, args.encoding)
+        script_start = time.time()
+
+        for text in reader:
             # log(f'Parsing command {text}')
             if text in AbstractCommand.SHUTDOWN_KEYWORDS:
                 log('Stopping the server')
                 break
             else:
-                command_exec(text)
+                executor.submit(command_exec, text, key=AbstractCommand._canonical_name(text.strip().split(' ', 1)[0]))
+        else:
+            if args.script is None:
+                raise EOFError
+        if stream is not sys.stdin.buffer:
+            stream.close()
 
+        executor.stop()
+        if args.script is not None:
+            report_script(reader.lines_read, script_start)
         log('Stopping server')
     except (EOFError, KeyboardInterrupt):
+        executor.stop()
+        log('Server Interrupted')
+    except:
+        get_logger().exception(RText(f'Error occurred in {threading.current_thread().getName()}:', RColor.red))
+    report_log_sink()
+    report_render_cache()
+    log('rue')
+
+
+async def async_main(start_time: float, args: argparse.Namespace):
+    runtime = get_runtime()
+    runtime.attach(asyncio.get_running_loop())
+    runtime.sync_workers = args.workers
+    mode = ExecutorMode(args.mode)
+    slots = asyncio.Semaphore(args.queue_size)
+    # the latest task of every command name, each task waits for its predecessor to keep their order
+    last_tasks: Dict[str, asyncio.Task] = {}
+
+    async def command_exec(cmd: str, previous: asyncio.Task = None, key: str = None):
+        queued = time.perf_counter() if get_profiler().running else None
+        try:
+            if previous is not None:
+                await asyncio.wait([previous])
+            if queued is not None:
+                get_profiler().record_wait(key, time.perf_counter() - queued)
+            await AbstractCommand._parse_async(cmd)
+        except:
+            get_logger().exception(RText(f'Error occurred in {threading.current_thread().getName()}:', RColor.red))
+        finally:
+            slots.release()
+
+    async def drain():
+        if len(last_tasks) != 0:
+            await asyncio.wait(last_tasks.values())
+
+    try:
+        log(f"Current encoding method: {args.encoding}")
+        AbstractCommand._refresh()
+        log(f'Done ({round(time.time() - start_time, 3)}s)! For help, type "help"')
+        await open_listeners(args)
+
+        stream = open_input(args)
+        reader = AsyncLineReader(stream, args.encoding)
+        script_start = time.time()
+
+        async for text in reader:
+            if text in AbstractCommand.SHUTDOWN_KEYWORDS:
+                log('Stopping the server')
+                break
+            elif len(text) != 0:
+                await slots.acquire()
+                key = AbstractCommand._canonical_name(text.strip().split(' ', 1)[0])
+                if mode == ExecutorMode.FIFO:
+                    await command_exec(text, key=key)
+                else:
+                    last_tasks[key] = asyncio.ensure_future(command_exec(text, last_tasks.get(key), key))
+        else:
+            if args.script is None:
+                raise EOFError
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+        await drain()
+        if args.script is not None:
+            report_script(reader.lines_read, script_start)
+        log('Stopping server')
+    except EOFError:
+        await drain()
         log('Server Interrupted')
     except:
         get_logger().exception(RText(f'Error occurred in {threading.current_thread().getName()}:', RColor.red))
+    finally:
+        await close_listeners()
+        runtime.stop()
+    report_log_sink()
+    report_render_cache()
     log('rue')
 
 
 if __name__ == '__main__':
-    sys.exit(main(time.time()))
+    sys.exit(main(time.time(), parse_args()))
@@ -0,0 +1,43 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+
+__all__ = [
+    "measure",
+    "quiet_logger",
+]
+
+
+def measure(func: Callable[[], object], number: int, repeat: int = 3) -> float:
+    """
+    Call func number times per round and return the best round as operations per second
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return number / max(best, 1e-9)
+
+
+@contextmanager
+def quiet_logger():
+    """
+    Keep the dummy server logger from writing anything while benchmarking
+    """
+    from utils.logger import get_logger
+    logger = get_logger()
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(logging.NullHandler())
+    try:
+        yield logger
+    finally:
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+        for handler in handlers:
+            logger.addHandler(handler)
@@ -0,0 +1,157 @@
+import argparse
+import json
+import math
+import os
+import pkgutil
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_DIR = os.path.join(ROOT, 'benchmarks')
+# every benchmark runs in its own interpreter and working directory, so singletons and files do not leak
+WORKER = (
+    'import json, sys; sys.path.insert(0, sys.argv[1]); from importlib import import_module; '
+    'results = import_module("benchmarks." + sys.argv[2]).run(); '
+    'open(sys.argv[3], "w").write(json.dumps(results))'
+)
+THRESHOLD = 0.1
+
+
+def discover() -> List[str]:
+    return sorted(name for _, name, _ in pkgutil.iter_modules([PACKAGE_DIR]) if name.startswith('bench_'))
+
+
+def lower_is_better(key: str) -> bool:
+    return key.endswith('_ms')
+
+
+def unit(key: str) -> str:
+    if lower_is_better(key):
+        return 'ms'
+    return 'lines/s' if key.startswith('e2e.') else 'ops/s'
+
+
+def format_value(key: str, value: Optional[float]) -> str:
+    if value is None:
+        return 'n/a'
+    return f'{round(value, 2) if lower_is_better(key) else round(value)} {unit(key)}'
+
+
+def run_benchmark(name: str) -> Dict[str, Optional[float]]:
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, 'results.json')
+        subprocess.run([sys.executable, '-c', WORKER, ROOT, name, output],
+                       cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+        with open(output, encoding='utf8') as file:
+            results = json.load(file)
+    return {key: None if value is None or math.isnan(value) else value for key, value in results.items()}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              check=True).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: Dict[str, Optional[float]], current: Dict[str, Optional[float]],
+            threshold: float, complete: bool = True) -> Tuple[List[str], List[str]]:
+    """
+    Print the change of every metric against the baseline, returning the regressed and improved metric names.
+    Metrics only in the baseline are listed if every benchmark ran
+    """
+    regressed, improved = [], []
+    width = max(map(len, current), default=0)
+    for key, value in current.items():
+        old = baseline.get(key)
+        if old is None or value is None or old == 0:
+            note = 'new' if key not in baseline else 'not comparable'
+            print(f'{key:<{width}}  {format_value(key, value):>16}  ({note})')
+            continue
+        change = value / old - 1
+        worse = change > threshold if lower_is_better(key) else change < -threshold
+        better = change < -threshold if lower_is_better(key) else change > threshold
+        flag = 'REGRESSION' if worse else 'improved' if better else ''
+        if worse:
+            regressed.append(key)
+        elif better:
+            improved.append(key)
+        print(f'{key:<{width}}  {format_value(key, old):>16} -> {format_value(key, value):>16}  '
+              f'{change * 100:+7.1f}%  {flag}')
+    for key in baseline if complete else ():
+        if key not in current:
+            print(f'{key:<{width}}  missing from this run')
+    return regressed, improved
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the benchmark suite offline')
+    parser.add_argument('names', nargs='*', metavar='NAME',
+                        help='Benchmarks to run, e.g. dispatch or bench_dispatch, all of them by default')
+    parser.add_argument('--output', '-o', metavar='FILE', help='Write the results as JSON to FILE')
+    parser.add_argument('--compare', '-c', metavar='BASELINE',
+                        help='Compare against the JSON results in BASELINE and fail on regressions')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='Relative change counted as a regression or an improvement')
+    parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+    args = parser.parse_args(argv)
+
+    available = discover()
+    if args.list:
+        print('\n'.join(available))
+        return 0
+    selected = available
+    if len(args.names) != 0:
+        selected = [name if name.startswith('bench_') else f'bench_{name}' for name in args.names]
+        unknown = [name for name in selected if name not in available]
+        if len(unknown) != 0:
+            parser.error(f"unknown benchmark: {', '.join(unknown)}")
+
+    results: Dict[str, Optional[float]] = {}
+    errors: Dict[str, str] = {}
+    for name in selected:
+        start = time.perf_counter()
+        print(f'Running {name}...', file=sys.stderr)
+        try:
+            results.update(run_benchmark(name))
+        except subprocess.CalledProcessError as exc:
+            lines = exc.stderr.decode('utf8', 'replace').strip().splitlines()
+            errors[name] = lines[-1] if lines else str(exc)
+            print(f'{name} failed: {errors[name]}', file=sys.stderr)
+        else:
+            print(f'{name} done in {round(time.perf_counter() - start, 1)}s', file=sys.stderr)
+
+    report = {
+        'meta': {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+        'errors': errors,
+    }
+    if args.output is not None:
+        with open(args.output, 'w', encoding='utf8') as file:
+            json.dump(report, file, indent=2)
+
+    if args.compare is None:
+        width = max(map(len, results), default=0)
+        for key, value in results.items():
+            print(f'{key:<{width}}  {format_value(key, value)}')
+        return 1 if errors else 0
+    with open(args.compare, encoding='utf8') as file:
+        baseline = json.load(file)
+    regressed, improved = compare(baseline.get('results', {}), results, args.threshold, selected == available)
+    print(f'{len(regressed)} regressed, {len(improved)} improved by more than {round(args.threshold * 100)}% '
+          f"against {args.compare} ({baseline.get('meta', {}).get('commit') or 'unknown commit'})")
+    return 1 if errors or regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,36 @@
+from typing import Dict
+
+from benchmarks import measure, quiet_logger
+from player.online import players
+from utils.commands import AbstractCommand
+
+
+COMMANDS = {
+    'list': 'list',
+    'data': 'data get entity Steve Pos',
+    'data_path': 'data get entity Steve Attributes[{Name:"minecraft:generic.movement_speed"}].Base',
+    'tellraw': 'tellraw @a {"text":"Hello","color":"red"}',
+    'tellraw_rich': 'tellraw @a ["",{"text":"[Server] ","color":"gold","bold":true},'
+                    '{"text":"Backup ","color":"gray"},{"text":"done","color":"green","underlined":true},'
+                    '{"text":" in 1.5s","color":"gray","italic":true}]',
+    'unknown': 'unknown command',
+}
+
+
+def run(number: int = 20000) -> Dict[str, float]:
+    AbstractCommand._refresh()
+    results = {}
+    with quiet_logger():
+        joined = players.append('Steve', '127.0.0.1')
+        try:
+            for name, line in COMMANDS.items():
+                results[f'dispatch.{name}'] = measure(lambda: AbstractCommand._parse(line), number)
+        finally:
+            if joined is not None:
+                players.remove('Steve')
+    return results
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
@@ -0,0 +1,57 @@
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from typing import Dict, List
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '__main__.py')
+FINISHED_PATTERN = re.compile(r'Script finished: (\d+) lines in [\d.]+s \((\d+) lines/sec\)')
+
+MIXES = {
+    'list': ['list'],
+    'mixed': [
+        'list',
+        'tellraw @a {"text":"Hello","color":"red"}',
+        'tellraw @a ["",{"text":"[QB] ","color":"aqua"},{"text":"Backup #3 done","color":"gray"}]',
+        'data get entity Steve Pos',
+        'scoreboard players add Steve kills 1',
+        'unknown command',
+    ],
+}
+SETUP = ['player join Steve 127.0.0.1', 'scoreboard objectives add kills dummy']
+
+
+def feed(lines: List[str], *options: str) -> float:
+    """
+    Pipe the lines through a fresh server and return the lines/sec it reports, its stdout included
+    """
+    script = '\n'.join(SETUP + lines + ['']).encode('utf8')
+    with tempfile.TemporaryDirectory() as directory:
+        process = subprocess.run(
+            [sys.executable, MAIN, '--script', '-', '--world', os.path.join(directory, 'world'),
+             '--autosave-interval', '0', *options],
+            input=script, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=directory, check=True,
+        )
+    match = FINISHED_PATTERN.search(process.stdout.decode('utf8', 'replace'))
+    if match is None:
+        raise RuntimeError('The server did not report the script result')
+    return float(match.group(2))
+
+
+def run(number: int = 20000) -> Dict[str, float]:
+    """
+    End to end lines per second from stdin to stdout
+    """
+    results = {}
+    for name, mix in MIXES.items():
+        lines = (mix * (number // len(mix) + 1))[:number]
+        results[f'e2e.{name}'] = feed(lines)
+        results[f'e2e.{name}.async_log'] = feed(lines, '--async-log')
+        results[f'e2e.{name}.parallel'] = feed(lines, '--mode', 'parallel')
+    return results
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} lines/s')
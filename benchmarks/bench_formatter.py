@@ -0,0 +1,35 @@
+import logging
+from typing import Dict
+
+from mcdreforged.api.rtext import RText, RTextList, RColor, RStyle
+
+from benchmarks import measure
+from utils.logger import DummyServerLogger
+
+
+PLAIN = 'Steve[/127.0.0.1:51234] logged in with entity id 1 at (174.0, 1.0, -184.0)'
+COLORED = RTextList(*[
+    RText(f'part {index} ', color, (RStyle.bold,) if index % 2 else None)
+    for index, color in enumerate([RColor.red, RColor.gold, RColor.green, RColor.aqua, RColor.gray] * 4)
+]).to_colored_text()
+
+
+def make_record(message: str) -> logging.LogRecord:
+    record = logging.LogRecord('bench', logging.INFO, __file__, 0, message, None, None)
+    record.message = record.getMessage()
+    record.asctime = '12:00:00'
+    return record
+
+
+def run(number: int = 50000) -> Dict[str, float]:
+    formatter = DummyServerLogger.get_console_formatter()
+    plain, colored = make_record(PLAIN), make_record(COLORED)
+    return {
+        'formatter.plain': measure(lambda: formatter.formatMessage(plain), number),
+        'formatter.colored': measure(lambda: formatter.formatMessage(colored), number),
+    }
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
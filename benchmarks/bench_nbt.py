@@ -0,0 +1,59 @@
+import copy
+from typing import Dict
+
+from benchmarks import measure
+from commands.command_data import CommandData
+from utils import nbt
+from utils.nbt_store import NbtTemplate
+
+
+PLAYER = nbt.parse_snbt(CommandData.FAKE_PLAYER_RAW)
+# a large compound: a full inventory and ender chest of enchanted items
+ITEM = nbt.parse_snbt('{Slot: 0b, id: "minecraft:diamond_sword", Count: 1b, tag: {Damage: 0, Enchantments: [{id: "minecraft:sharpness", lvl: 5s}, {id: "minecraft:unbreaking", lvl: 3s}], display: {Name: \'{"text":"Sword"}\'}}}')
+LARGE = dict(PLAYER, Inventory=[dict(ITEM, Slot=nbt.Byte(slot)) for slot in range(36)],
+             EnderItems=[dict(ITEM, Slot=nbt.Byte(slot)) for slot in range(27)])
+LARGE_RAW = nbt.to_snbt(LARGE)
+TEMPLATE = NbtTemplate(PLAYER)
+PATH = 'Attributes[{Name:"minecraft:generic.movement_speed"}].Base'
+
+
+def run(number: int = 200) -> Dict[str, float]:
+    """
+    Operations per second
+    """
+    compiled = nbt.compile_path(PATH)
+    filtered = nbt.compile_path('Inventory[{tag:{Enchantments:[{id:"minecraft:sharpness"}]}}].Slot')
+
+    health = nbt.compile_path('Health')
+    speed = nbt.compile_path(PATH)
+
+    def modify():
+        data = TEMPLATE.create(Pos=PLAYER['Pos'])
+        data.set(health, nbt.Float(5.0))
+        data.set(speed, nbt.Double(0.2))
+
+    cached = TEMPLATE.create(Pos=PLAYER['Pos'])
+
+    def compile_cold():
+        nbt.compile_path.cache_clear()
+        nbt.compile_path(PATH)
+
+    return {
+        'nbt.serialize.player': measure(lambda: nbt.to_snbt(PLAYER), number),
+        'nbt.serialize.large': measure(lambda: nbt.to_snbt(LARGE), number),
+        'nbt.parse.player': measure(lambda: nbt.parse_snbt(CommandData.FAKE_PLAYER_RAW), number),
+        'nbt.parse.large': measure(lambda: nbt.parse_snbt(LARGE_RAW), number),
+        'nbt.path.compile': measure(compile_cold, number),
+        'nbt.path.cached': measure(lambda: nbt.compile_path(PATH), number * 100),
+        'nbt.path.query': measure(lambda: compiled.get(PLAYER), number * 100),
+        'nbt.path.query.filtered': measure(lambda: filtered.get(LARGE), number),
+        'nbt.entity.deepcopy': measure(lambda: copy.deepcopy(PLAYER), number * 10),
+        'nbt.entity.create': measure(lambda: TEMPLATE.create(Pos=PLAYER['Pos']), number * 10),
+        'nbt.entity.create_modify': measure(modify, number * 10),
+        'nbt.entity.snbt.cached': measure(cached.snbt, number * 100),
+    }
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
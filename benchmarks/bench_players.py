@@ -0,0 +1,43 @@
+import itertools
+from typing import Dict
+
+from benchmarks import measure, quiet_logger
+from player.online import OnlinePlayers
+from utils.grammar import EntitySelector
+
+
+SIZES = (10, 1000, 100000)
+
+
+def run(number: int = 20000) -> Dict[str, float]:
+    """
+    Operations per second with 10, 1k and 100k players online, a join_leave counts the pair as one
+    """
+    results = {}
+    with quiet_logger():
+        for size in SIZES:
+            online = OnlinePlayers(limit=size + 1)
+            names = [f'Sim{index}' for index in range(size)]
+            records = online.append_many((name, '127.0.0.1') for name in names)
+            uuids = [record.uuid for record in records]
+            cycle_names = itertools.cycle(names)
+            cycle_uuids = itertools.cycle(uuids)
+            single = EntitySelector('Sim0', None, 'Sim0', None)
+            random_one = EntitySelector('@r', 'r', None, None)
+
+            def join_leave():
+                online.append('Guest', '127.0.0.1')
+                online.remove('Guest')
+
+            results[f'players.{size}.lookup'] = measure(lambda: online.get(next(cycle_names)), number * 10)
+            results[f'players.{size}.lookup_uuid'] = measure(lambda: online.get_by_uuid(next(cycle_uuids)), number * 10)
+            results[f'players.{size}.select_name'] = measure(lambda: online.select(single), number * 10)
+            results[f'players.{size}.select_random'] = measure(lambda: online.select(random_one), number * 10)
+            results[f'players.{size}.join_leave'] = measure(join_leave, number)
+            results[f'players.{size}.snapshot'] = measure(online.snapshot, max(10, number * 10 // size))
+    return results
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
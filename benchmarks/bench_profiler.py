@@ -0,0 +1,35 @@
+import tempfile
+from typing import Dict
+
+from benchmarks import measure, quiet_logger
+from utils.commands import AbstractCommand
+from utils.profiler import LatencyHistogram, get_profiler
+
+
+COMMAND = 'list'
+
+
+def run(number: int = 20000) -> Dict[str, float]:
+    """
+    Dispatch rate with the profiler off, collecting metrics only and sampling every thread as well
+    """
+    AbstractCommand._refresh()
+    profiler = get_profiler()
+    results = {}
+    with quiet_logger(), tempfile.TemporaryDirectory() as directory:
+        profiler.report_dir = directory
+        results['profiler.off'] = measure(lambda: AbstractCommand._parse(COMMAND), number)
+        for name, sample in (('metrics', False), ('sampling', True)):
+            profiler.start(sample=sample)
+            try:
+                results[f'profiler.{name}'] = measure(lambda: AbstractCommand._parse(COMMAND), number)
+            finally:
+                profiler.stop()
+    histogram = LatencyHistogram()
+    results['profiler.histogram_add'] = measure(lambda: histogram.add(0.000123), number * 10)
+    return results
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from benchmarks import quiet_logger
+from utils.commands import AbstractCommand
+from utils.rcon import RconClient, get_rcon
+
+
+PASSWORD = 'bench'
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def connection(host: str, port: int, password: str, requests: int, pipeline: int, command: str,
+                     latencies: List[float]):
+    """
+    Keep up to pipeline requests in flight on one connection until requests replies arrived
+    """
+    client = RconClient()
+    await client.connect(host, port, password)
+    sent: Dict[int, float] = {}
+    issued = done = 0
+    try:
+        while done < requests:
+            while issued < requests and issued - done < pipeline:
+                sent[client.send(command)] = time.perf_counter()
+                issued += 1
+            await client.flush()
+            request_id, _ = await client.receive()
+            latencies.append(time.perf_counter() - sent.pop(request_id))
+            done += 1
+    finally:
+        await client.close()
+
+
+async def load(host: str, port: int, password: str, connections: int, requests: int, pipeline: int,
+               command: str) -> Dict[str, float]:
+    latencies: List[float] = []
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        connection(host, port, password, requests, pipeline, command, latencies) for _ in range(connections)
+    ))
+    cost = max(time.perf_counter() - start, 1e-9)
+    return {
+        'rcon.requests_per_sec': len(latencies) / cost,
+        'rcon.p50_ms': percentile(latencies, 0.5) * 1000,
+        'rcon.p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def run(connections: int = 16, requests: int = 500, pipeline: int = 4, command: str = 'list',
+        host: Optional[str] = None, port: Optional[int] = None, password: str = PASSWORD) -> Dict[str, float]:
+    """
+    Load a running server at host:port, or one started in this process if no host is given
+    """
+    with quiet_logger():
+        server = None
+        if host is None:
+            AbstractCommand._refresh()
+            server = get_rcon()
+            server.start(port=0, password=password)
+            host, port = server.address
+        try:
+            return asyncio.run(load(host, port, password, connections, requests, pipeline, command))
+        finally:
+            if server is not None:
+                server.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RCON load client')
+    parser.add_argument('--host', help='Address of a running server, omit to start one in this process')
+    parser.add_argument('--port', type=int, default=25575)
+    parser.add_argument('--password', default=PASSWORD)
+    parser.add_argument('--connections', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=500, help='Requests per connection')
+    parser.add_argument('--pipeline', type=int, default=4, help='Requests in flight per connection')
+    parser.add_argument('--command', default='list')
+    args = parser.parse_args()
+    results = run(args.connections, args.requests, args.pipeline, args.command,
+                  args.host, args.port if args.host else None, args.password)
+    print(f"rcon: {round(results['rcon.requests_per_sec'])} req/s, "
+          f"p50 {round(results['rcon.p50_ms'], 2)} ms, p99 {round(results['rcon.p99_ms'], 2)} ms")
@@ -0,0 +1,42 @@
+import random
+from typing import Dict
+
+from benchmarks import measure
+from utils.scoreboard import Scoreboard
+
+
+HOLDERS = 100000
+
+
+def run(number: int = 5) -> Dict[str, float]:
+    """
+    Operations per second, bulk results are counted per score
+    """
+    scoreboard = Scoreboard()
+    names = [f'Sim{index}' for index in range(HOLDERS)]
+    objective = scoreboard.add_objective('kills', 'dummy')
+    for name in names:
+        scoreboard.set(name, objective, random.randrange(1000000))
+    other = scoreboard.add_objective('deaths', 'dummy')
+    counter = iter(range(10 ** 9))
+
+    def set_one():
+        scoreboard.set(names[next(counter) % HOLDERS], other, 1)
+
+    def top_changed():
+        scoreboard.add(names[next(counter) % HOLDERS], objective, 1)
+        scoreboard.top(objective, 15)
+
+    return {
+        'scoreboard.set': measure(set_one, number * 10000),
+        'scoreboard.get': measure(lambda: scoreboard.get('Sim5000', objective), number * 10000),
+        'scoreboard.add': measure(lambda: scoreboard.add('Sim5000', objective, 1), number * 10000),
+        'scoreboard.top15.cached': measure(lambda: scoreboard.top(objective, 15), number * 10000),
+        'scoreboard.top15.after_change': measure(top_changed, number),
+        'scoreboard.tracked': measure(scoreboard.tracked, number) * HOLDERS,
+    }
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
@@ -0,0 +1,66 @@
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '__main__.py')
+IMPORT_TIME_PATTERN = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+DONE_PATTERN = re.compile(r'Done \((\d+(?:\.\d+)?)s\)!')
+
+
+def start_server() -> Tuple[float, List[Tuple[str, int]]]:
+    """
+    Start the server with -X importtime on an empty script, returning the Done time in ms
+    and the cumulative import time in us of every top level import
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', MAIN, '--script', '-', '--world', os.path.join(directory, 'world')],
+            input=b'', capture_output=True, cwd=directory, check=True,
+        )
+    imports = []
+    for line in process.stderr.decode('utf8', 'replace').splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        # top level imports are indented by a single space
+        if match is not None and len(match.group(3)) == 1:
+            imports.append((match.group(4), int(match.group(2))))
+    done = DONE_PATTERN.search(process.stdout.decode('utf8', 'replace') + process.stderr.decode('utf8', 'replace'))
+    return float(done.group(1)) * 1000 if done else float('nan'), imports
+
+
+def breakdown(imports: List[Tuple[str, int]]) -> Dict[str, float]:
+    """
+    Import time in ms per top level package
+    """
+    packages = defaultdict(float)
+    for name, cumulative in imports:
+        packages[name.split('.', 1)[0]] += cumulative / 1000
+    return dict(packages)
+
+
+def run(repeat: int = 5) -> Dict[str, float]:
+    """
+    Best of repeat starts, so a cold disk cache does not count
+    """
+    results = {}
+    for _ in range(repeat):
+        done, imports = start_server()
+        packages = breakdown(imports)
+        sample = {'startup.done_ms': done, 'startup.import_ms': sum(packages.values())}
+        # interpreter internals below a millisecond only add noise to comparisons
+        sample.update((f'startup.import.{name}_ms', value) for name, value in packages.items() if value >= 1)
+        for key, value in sample.items():
+            results[key] = min(results.get(key, value), value)
+    return results
+
+
+if __name__ == '__main__':
+    results = run()
+    print(f"startup: Done in {round(results.pop('startup.done_ms'), 2)} ms, "
+          f"imports take {round(results.pop('startup.import_ms'), 2)} ms")
+    for key, value in sorted(results.items(), key=lambda item: -item[1]):
+        if value >= 0.5:
+            print(f"  {key[len('startup.import.'):-3]}: {round(value, 2)} ms")
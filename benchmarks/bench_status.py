@@ -0,0 +1,108 @@
+import asyncio
+import struct
+import time
+from typing import Dict, Tuple
+
+from benchmarks import measure, quiet_logger
+from player.online import players
+from utils.status import ServerStatus, get_status, read_varint, write_varint
+
+
+def handshake(host: str, port: int) -> bytes:
+    address = host.encode('utf8')
+    body = (b'\x00' + write_varint(ServerStatus.PROTOCOL) + write_varint(len(address)) + address
+            + struct.pack('>H', port) + write_varint(1))
+    return write_varint(len(body)) + body
+
+
+async def ping(host: str, port: int) -> bytes:
+    """
+    One Server List Ping on a new connection, like a status monitor polling the server
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(handshake(host, port) + b'\x01\x00' + b'\x09\x01' + struct.pack('>q', 42))
+    length = await read_varint(reader)
+    status = await reader.readexactly(length)
+    await reader.readexactly(10)
+    writer.close()
+    return status
+
+
+async def slp(host: str, port: int, clients: int, polls: int) -> float:
+    async def client():
+        for _ in range(polls):
+            await ping(host, port)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return clients * polls / max(time.perf_counter() - start, 1e-9)
+
+
+class QueryClient(asyncio.DatagramProtocol):
+    """
+    Sends full stat requests and counts the replies, keeping a fixed amount in flight
+    """
+
+    def __init__(self, polls: int, window: int):
+        self.polls = polls
+        self.window = window
+        self.received = 0
+        self.token = None
+        self.transport = None
+        self.done = asyncio.get_running_loop().create_future()
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.sendto(struct.pack('>2sBi', ServerStatus.QUERY_MAGIC, ServerStatus.QUERY_HANDSHAKE, 1))
+
+    def __request(self):
+        self.transport.sendto(struct.pack('>2sBii', ServerStatus.QUERY_MAGIC, ServerStatus.QUERY_STAT, 1, self.token)
+                              + b'\x00' * 4)
+
+    def datagram_received(self, data, address):
+        if self.token is None:
+            self.token = int(data[5:-1])
+            for _ in range(self.window):
+                self.__request()
+            return
+        self.received += 1
+        if self.received == self.polls:
+            self.done.set_result(None)
+        elif self.received <= self.polls - self.window:
+            self.__request()
+
+
+async def query(address: Tuple[str, int], polls: int, window: int = 32) -> float:
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    transport, protocol = await loop.create_datagram_endpoint(lambda: QueryClient(polls, window), remote_addr=address)
+    try:
+        await asyncio.wait_for(protocol.done, 30)
+    finally:
+        transport.close()
+    return polls / max(time.perf_counter() - start, 1e-9)
+
+
+def run(number: int = 2000, clients: int = 16) -> Dict[str, float]:
+    status = get_status()
+    results = {}
+    with quiet_logger():
+        players.append_many((f'Player{i}', None) for i in range(20))
+        try:
+            results['status.cached'] = measure(status.cache, number * 100)
+            results['status.rebuild'] = measure(lambda: (status.invalidate(), status.cache()), number)
+            status.start(status_port=0, query_port=0)
+            try:
+                host, port = status.status_address
+                results['status.slp_polls'] = asyncio.run(slp(host, port, clients, number // clients))
+                results['status.query_full_polls'] = asyncio.run(query(status.query_address, number * 10))
+            finally:
+                status.stop()
+        finally:
+            players.remove_all()
+    return results
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
@@ -0,0 +1,67 @@
+import json
+from typing import Dict
+
+from mcdreforged.api.rtext import RTextBase
+
+from benchmarks import measure
+from utils.raw_json_parser import convert_json_object, convert_rtext
+
+
+def deep(depth: int) -> dict:
+    root = node = {'text': 'level 0', 'color': 'gold'}
+    for index in range(1, depth):
+        child = {'text': f' level {index}', 'bold': index % 2 == 0, 'color': 'red' if index % 3 else 'aqua'}
+        node['extra'] = [child]
+        node = child
+    return root
+
+
+def wide(width: int) -> list:
+    return [''] + [
+        {'text': f'item {index} ', 'color': ['red', 'green', 'gray'][index % 3], 'italic': index % 4 == 0,
+         'hoverEvent': {'action': 'show_text', 'contents': {'text': f'hover {index}'}},
+         'clickEvent': {'action': 'run_command', 'value': f'/say {index}'}}
+        for index in range(width)
+    ]
+
+
+# mcdreforged builds nested RTextList recursively, deeper components hit the recursion limit
+PAYLOADS = {
+    'deep': json.dumps(deep(100)),
+    'wide': json.dumps(wide(200)),
+}
+
+# what MCDR plugins typically send with tellraw
+TELLRAW = {
+    'plain': '"Server will restart in 10 seconds"',
+    'backup': '["",{"text":"[QB] ","color":"aqua"},{"text":"Backup ","color":"gray"},'
+              '{"text":"#3","color":"gold","bold":true},{"text":" created in ","color":"gray"},'
+              '{"text":"2.4s","color":"green"}]',
+    'join': '{"text":"","extra":[{"text":"Welcome ","color":"yellow"},{"text":"Steve","color":"gold",'
+            '"hoverEvent":{"action":"show_text","contents":"UUID: 5627dd98-e6be-3c21-b8a8-e92344183641"},'
+            '"clickEvent":{"action":"suggest_command","value":"/tell Steve "}},{"text":", 3 players online",'
+            '"color":"yellow"}]}',
+    'menu': json.dumps(['', {'text': '[Here] ', 'color': 'dark_aqua'}] + [
+        {'text': f'[{action}] ', 'color': 'green', 'underlined': True,
+         'clickEvent': {'action': 'run_command', 'value': f'!!here {action}'},
+         'hoverEvent': {'action': 'show_text', 'contents': {'text': f'Click to {action}', 'italic': True}}}
+        for action in ('show', 'hide', 'share', 'follow', 'stop')
+    ]),
+}
+
+
+def run(number: int = 500) -> Dict[str, float]:
+    results = {}
+    for name, raw in TELLRAW.items():
+        results[f'text.tellraw.{name}'] = measure(lambda: convert_rtext(raw).to_colored_text(), number * 10)
+    for name, raw in PAYLOADS.items():
+        results[f'text.{name}.mcdr'] = measure(
+            lambda: RTextBase.from_json_object(json.loads(raw)).to_colored_text(), number)
+        results[f'text.{name}.compiler'] = measure(
+            lambda: convert_json_object(json.loads(raw)).to_colored_text(), number)
+    return results
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
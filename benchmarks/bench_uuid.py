@@ -0,0 +1,37 @@
+import uuid
+from typing import Dict
+
+from benchmarks import measure
+from utils import uuid_
+
+
+NAMES = [f'Sim{index}' for index in range(1000)]
+UUIDS = uuid_.get_offline_uuids(NAMES)
+ARRAYS = uuid_.get_tuple_uuids(UUIDS)
+
+
+def run(number: int = 20) -> Dict[str, float]:
+    """
+    Operations per second, batch results are counted per UUID
+    """
+    size = len(NAMES)
+    target = UUIDS[0]
+    array = ARRAYS[0]
+
+    def offline_cold():
+        uuid_._offline_uuid.cache_clear()
+        uuid_.get_offline_uuids(NAMES)
+
+    return {
+        'uuid.offline.cold': measure(offline_cold, number) * size,
+        'uuid.offline.memoized': measure(lambda: uuid_.get_offline_uuids(NAMES), number) * size,
+        'uuid.to_int_array': measure(lambda: uuid_.get_tuple_uuid(target), number * size),
+        'uuid.from_int_array': measure(lambda: uuid_.convert_uuid_from_tuple(array), number * size),
+        'uuid.to_int_array.batch': measure(lambda: uuid_.get_tuple_uuids(UUIDS), number) * size,
+        'uuid.format_int_array': measure(lambda: uuid_.format_int_array(target), number * size),
+    }
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
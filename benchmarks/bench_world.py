@@ -0,0 +1,93 @@
+import tempfile
+import threading
+import time
+from typing import Dict
+
+from benchmarks import measure, quiet_logger
+from commands.command_data import CommandData
+from utils.commands import AbstractCommand
+from utils.nbt import Float, compile_path
+from utils.world import WorldState, get_world
+
+
+ENTITIES = 2000
+# a data command stuck this long behind a save is a deadlock
+DEADLOCK_TIMEOUT = 20.0
+
+
+def data_while_saving(directory: str, regions: int) -> float:
+    """
+    Data commands per second on new regions while another thread keeps saving the ones they changed,
+    raising if they deadlock against the save
+    """
+    AbstractCommand._refresh()
+    world = get_world()
+    world.open(directory)
+    stopped = threading.Event()
+
+    def save_loop():
+        while not stopped.is_set():
+            world.save()
+
+    def commands():
+        for index in range(regions):
+            x = index * CommandData.REGION_SIZE
+            AbstractCommand._parse(f'data merge block {x} 64 0 {{Lock: "{index}"}}')
+            AbstractCommand._parse(f'data get block {x + CommandData.REGION_SIZE} 64 0')
+
+    saver = threading.Thread(target=save_loop, daemon=True)
+    worker = threading.Thread(target=commands, daemon=True)
+    with quiet_logger():
+        saver.start()
+        start = time.perf_counter()
+        worker.start()
+        worker.join(DEADLOCK_TIMEOUT)
+        elapsed = time.perf_counter() - start
+        stopped.set()
+        saver.join(DEADLOCK_TIMEOUT)
+    if worker.is_alive() or saver.is_alive():
+        raise RuntimeError(f'data commands and world saves deadlocked for {DEADLOCK_TIMEOUT}s')
+    world.close()
+    return regions * 2 / elapsed
+
+
+def run(number: int = 3) -> Dict[str, float]:
+    """
+    Regions per second for saving and indexing, operations per second otherwise
+    """
+    health = compile_path('Health')
+    entities = []
+    for index in range(ENTITIES):
+        data = CommandData.FAKE_PLAYER_DATA.create()
+        data.set(health, Float(index))
+        entities.append(data)
+
+    with tempfile.TemporaryDirectory() as directory:
+        world = WorldState()
+        world.open(directory)
+
+        def save(flush: bool):
+            for index, data in enumerate(entities):
+                world.mark_dirty(f'playerdata/{index}', data.snbt)
+            world.save(flush)
+
+        def single():
+            world.mark_dirty('playerdata/0', entities[0].snbt)
+            world.save()
+
+        result = {
+            'world.save': measure(lambda: save(False), number) * ENTITIES,
+            'world.save.flush': measure(lambda: save(True), number) * ENTITIES,
+            'world.save.single_region': measure(single, number * 100),
+            'world.open': measure(lambda: world.open(directory), number) * world.regions,
+            'world.restore': measure(lambda: world.restore('playerdata/1'), number * 100),
+        }
+        world.close(save=False)
+    with tempfile.TemporaryDirectory() as directory:
+        result['world.data_while_saving'] = data_while_saving(directory, 500)
+    return result
+
+
+if __name__ == '__main__':
+    for key, value in run().items():
+        print(f'{key}: {round(value)} ops/s')
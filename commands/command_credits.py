@@ -1,4 +1,5 @@
-from utils.commands import AbstractCommand
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode
 from utils.logger import log
 from mcdreforged.api.rtext import *
 
@@ -6,8 +7,9 @@ from mcdreforged.api.rtext import *
 class CommandInfo(AbstractCommand):
     NAME = 'credits'
     HELP = 'Show dummy server info'
+    TREE = CommandNode().runs('_direct')
 
-    def _direct(self):
+    def _direct(self, ctx: CommandContext):
         log(RTextList(
             RText('--- ', RColor.gray), RText('Dummy server for MCDR'), RText(' ---', RColor.gray), '\n',
             RText('CLI Version 0.0.0 '), RText(" Work in progress", RColor.yellow)
@@ -1,204 +1,210 @@
-from utils.commands import AbstractCommand, CommandParsingError
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode, Literal, Entity, BlockPos, ResourceLocation, Coordinate, EntitySelector
 from utils.logger import log
-from typing import Optional, Union, List, Dict, Any
-import json
-import collections
+from utils.nbt import Double, Int, IntArray, NbtPath, NbtPathArgument, CompoundArgument, TagArgument, parse_snbt, to_snbt
+from utils.nbt_store import CowCompound, NbtTemplate
+from typing import Any, Callable, Dict, Optional, Tuple
+import threading
 
-from player.online import players
-
-
-_NOT_FOUND = object()
-Coordinate = collections.namedtuple('Coordinate', 'x y z')
+from player.online import PlayerRecord, players
+from utils.uuid_ import get_tuple_uuid
+from utils.world import get_world
 
 
 class CommandData(AbstractCommand):
     FAKE_BLOCK_TITLE = '{x}, {y}, {z} has the following block data: '
-    FAKE_BLOCK_RAW = '{z: %ZVALUE%, powered: 0b, x: %XVALUE%, auto: 0b, UpdateLastExecution: 1b, id: "minecraft:command_block", y: %YVALUE%, conditionMet: 0b, Command: "", SuccessCount: 0, CustomName: \'{"text":"@"}\', TrackOutput: 1b}'
-    FAKE_BLOCK_DATA = {
-        "z": -19,
-        "powered": 0,
-        "x": 565,
-        "auto": 0,
-        "UpdateLastExecution": 1,
-        "id": "minecraft:command_block",
-        "y": 100,
-        "conditionMet": 0,
-        "Command": "",
-        "SuccessCount": 0,
-        "CustomName": "{\"text\":\"@\"}",
-        "TrackOutput": 1
-    }
+    FAKE_BLOCK_RAW = '{z: -19, powered: 0b, x: 565, auto: 0b, UpdateLastExecution: 1b, id: "minecraft:command_block", y: 100, conditionMet: 0b, Command: "", SuccessCount: 0, CustomName: \'{"text":"@"}\', TrackOutput: 1b}'
 
     FAKE_PLAYER_TITLE = "{player} has the following entity data: "
     FAKE_PLAYER_RAW = '{seenCredits: 0b, DeathTime: 0s, foodTickTimer: 0, recipeBook: {isBlastingFurnaceFilteringCraftable: 0b, isGuiOpen: 0b, toBeDisplayed: [], isFurnaceFilteringCraftable: 0b, isBlastingFurnaceGuiOpen: 0b, isFurnaceGuiOpen: 0b, isSmokerGuiOpen: 0b, isFilteringCraftable: 0b, isSmokerFilteringCraftable: 0b, recipes: []}, OnGround: 1b, AbsorptionAmount: 0.0f, XpTotal: 0, playerGameType: 1, Attributes: [{Name: "minecraft:generic.movement_speed", Base: 0.10000000149011612d}], Invulnerable: 0b, SelectedItemSlot: 0, Brain: {memories: {}}, Dimension: "minecraft:overworld", abilities: {walkSpeed: 0.1f, flySpeed: 0.05f, instabuild: 1b, flying: 0b, mayfly: 1b, invulnerable: 1b, mayBuild: 1b}, Score: 0, Rotation: [0.0f, 0.0f], HurtByTimestamp: 0, foodSaturationLevel: 5.0f, Air: 300s, EnderItems: [], XpSeed: 1266479716, foodLevel: 20, UUID: [I; 240899192, 1909081247, -1531449260, -1479246119], XpLevel: 0, Inventory: [], Motion: [0.0d, -0.0784000015258789d, 0.0d], FallDistance: 0.0f, DataVersion: 2586, SleepTimer: 0s, XpP: 0.0f, previousPlayerGameType: -1, Health: 20.0f, HurtTime: 0s, Pos: [174.0d, 1.0d, -184.0d], FallFlying: 0b, Fire: -20s, PortalCooldown: 0, foodExhaustionLevel: 0.0f}'
-    FAKE_PLAYER_DATA = {
-        "seenCredits": 0,
-        "DeathTime": 0,
-        "foodTickTimer": 0,
-        "recipeBook": {
-            "isBlastingFurnaceFilteringCraftable": 0,
-            "isGuiOpen": 0,
-            "toBeDisplayed": [],
-            "isFurnaceFilteringCraftable": 0,
-            "isBlastingFurnaceGuiOpen": 0,
-            "isFurnaceGuiOpen": 0,
-            "isSmokerGuiOpen": 0,
-            "isFilteringCraftable": 0,
-            "isSmokerFilteringCraftable": 0,
-            "recipes": []
-        },
-        "OnGround": 1,
-        "AbsorptionAmount": 0,
-        "XpTotal": 0,
-        "playerGameType": 1,
-        "Attributes": [
-            {
-                "Name": "minecraft:generic.movement_speed",
-                "Base": 0.10000000149011612
-            }
-        ],
-        "Invulnerable": 0,
-        "SelectedItemSlot": 0,
-        "Brain": {
-            "memories": {}
-        },
-        "Dimension": "minecraft:overworld",
-        "abilities": {
-            "walkSpeed": 0.1,
-            "flySpeed": 0.05,
-            "instabuild": 1,
-            "flying": 0,
-            "mayfly": 1,
-            "invulnerable": 1,
-            "mayBuild": 1
-        },
-        "Score": 0,
-        "Rotation": [
-            0,
-            0
-        ],
-        "HurtByTimestamp": 0,
-        "foodSaturationLevel": 5,
-        "Air": 300,
-        "EnderItems": [],
-        "XpSeed": 1266479716,
-        "foodLevel": 20,
-        "UUID": [
-            240899192,
-            1909081247,
-            -1531449260,
-            -1479246119
-        ],
-        "XpLevel": 0,
-        "Inventory": [],
-        "Motion": [
-            0,
-            -0.0784000015258789,
-            0
-        ],
-        "FallDistance": 0,
-        "DataVersion": 2586,
-        "SleepTimer": 0,
-        "XpP": 0,
-        "previousPlayerGameType": -1,
-        "Health": 20,
-        "HurtTime": 0,
-        "Pos": [
-            174,
-            1,
-            -184
-        ],
-        "FallFlying": 0,
-        "Fire": -20,
-        "PortalCooldown": 0,
-        "foodExhaustionLevel": 0
-    }
-
-    FAKE_STORAGE_DATA = "Storage {storage} has the following contents: {}"
-    FAKE_STORAGE = "{}"
+    # every player and block starts from the SNBT above, each one only copies what it changes
+    FAKE_PLAYER_DATA = NbtTemplate(parse_snbt(FAKE_PLAYER_RAW))
+    FAKE_BLOCK_DATA = NbtTemplate(parse_snbt(FAKE_BLOCK_RAW))
+
+    FAKE_STORAGE_DATA = "Storage {storage} has the following contents: "
+    FAKE_STORAGE = NbtTemplate({})
+    MULTIPLE_VALUES = 'This argument accepts a single NBT value'
+    NOT_FOUND = 'Found no elements matching {}'
+    MERGE_FAILED = 'Nothing changed. The merged properties already have these values'
+    MODIFY_FAILED = 'Nothing changed. The specified properties already have these values'
+    MODIFIED_PLAYER = 'Modified entity data of {player}'
+    MODIFIED_BLOCK = 'Modified block data of {x}, {y}, {z}'
+    MODIFIED_STORAGE = 'Modified storage {storage}'
+    # blocks are saved in regions of 32 by 32 chunks like vanilla
+    REGION_SIZE = 512
 
     NAME = 'data'
     HELP = 'Show a fake data'
-
-    @staticmethod
-    def __is_float(string: str):
-        try:
-            float(string)
-            return True
-        except ValueError:
-            return False
-
-    def _full_cmd(self, *args):
-        return f'{self.NAME} {" ".join(*args)}'
-
-    def __display_player_message(self, player: str, path: Optional[str] = None):
-        title = self.FAKE_PLAYER_TITLE.format(player=player)
-        data = self.__get_dict_item(self.FAKE_PLAYER_DATA, list(path.split('.')))
-        if path is None:
-            log(title + self.FAKE_PLAYER_RAW)
-        elif data is _NOT_FOUND:
-            log(f'Found no elements matching {path}')
-        else:
-            log(title + data)
-
-    def __display_block_message(self, pos: Coordinate, path: Optional[str] = None):
-        title = self.FAKE_BLOCK_TITLE.format(x=pos.x, y=pos.y, z=pos.z)
-        data = self.FAKE_BLOCK_DATA
-        data['x'], data['y'], data['z'] = pos.x, pos.y, pos.z
-        data = self.__get_dict_item(self.FAKE_BLOCK_DATA, list(path.split('.')))
+    TREE = CommandNode().then(
+        Literal('get').then(
+            Literal('entity').then(
+                Entity('target', single=True).runs('get_entity').then(NbtPathArgument('path').runs('get_entity'))
+            ),
+            Literal('block').then(
+                BlockPos('pos').runs('get_block').then(NbtPathArgument('path').runs('get_block'))
+            ),
+            Literal('storage').then(
+                ResourceLocation('storage').runs('get_storage').then(NbtPathArgument('path').runs('get_storage'))
+            ),
+        ),
+        Literal('merge').then(
+            Literal('entity').then(Entity('target', single=True).then(CompoundArgument('nbt').runs('merge_entity'))),
+            Literal('block').then(BlockPos('pos').then(CompoundArgument('nbt').runs('merge_block'))),
+            Literal('storage').then(ResourceLocation('storage').then(CompoundArgument('nbt').runs('merge_storage'))),
+        ),
+        Literal('modify').then(
+            Literal('entity').then(Entity('target', single=True).then(NbtPathArgument('path').then(
+                Literal('set').then(Literal('value').then(TagArgument('value').runs('modify_entity')))
+            ))),
+            Literal('block').then(BlockPos('pos').then(NbtPathArgument('path').then(
+                Literal('set').then(Literal('value').then(TagArgument('value').runs('modify_block')))
+            ))),
+            Literal('storage').then(ResourceLocation('storage').then(NbtPathArgument('path').then(
+                Literal('set').then(Literal('value').then(TagArgument('value').runs('modify_storage')))
+            ))),
+        ),
+    )
+
+    def __init__(self):
+        super(CommandData, self).__init__()
+        self.__lock = threading.Lock()
+        self.__regions: Dict[Tuple[int, int], Dict[Tuple[int, int, int], CowCompound]] = {}
+        self.__storages: Dict[str, CowCompound] = {}
+
+    def __display(self, title: str, data: CowCompound, path: Optional[NbtPath]):
         if path is None:
-            log(title + self.FAKE_BLOCK_RAW.replace('%ZVALUE%', str(pos.z)).replace('%YVALUE%', str(pos.y)).replace('%XVALUE%', str(pos.x)))
-        elif data is _NOT_FOUND:
-            log(f'Found no elements matching {path}')
+            log(title + data.snbt())
+            return
+        values = data.get(path)
+        if len(values) == 0:
+            log(self.NOT_FOUND.format(path))
+        elif len(values) > 1:
+            log(self.MULTIPLE_VALUES)
         else:
-            log(title + data)
+            log(title + to_snbt(values[0]))
 
     @staticmethod
-    def __get_dict_item(data: Dict[str, Any], path: List[str], fallback: Any = _NOT_FOUND):
-        path = path.copy()
-        data: Union[dict, Any]
-        if len(path) == 0:
-            return fallback
-        while True:
-            key = path.pop(0)
-            if not isinstance(data, dict) or key not in data.keys():
-                return fallback
-            data = data[key]
-            if len(path) == 0:
-                break
-        if not isinstance(data, (str, int, float)):
-            data = json.dumps(data, ensure_ascii=False)
+    def __player_region(player: PlayerRecord) -> str:
+        return f'playerdata/{player.uuid}'
+
+    def __region(self, pos: Coordinate) -> Tuple[int, int]:
+        return pos.x // self.REGION_SIZE, pos.z // self.REGION_SIZE
+
+    def __player_data(self, player: PlayerRecord) -> CowCompound:
+        if player.nbt is None:
+            with self.__lock:
+                if player.nbt is None:
+                    overrides = dict(
+                        UUID=IntArray(map(Int, get_tuple_uuid(player.uuid))),
+                        Pos=[Double(value) for value in player.position]
+                    )
+                    saved = get_world().restore(self.__player_region(player))
+                    if saved is None:
+                        player.nbt = self.FAKE_PLAYER_DATA.create(**overrides)
+                    else:
+                        saved.update(overrides)
+                        player.nbt = self.FAKE_PLAYER_DATA.restore(saved)
+        return player.nbt
+
+    def __block_region(self, region: Tuple[int, int]) -> Dict[Tuple[int, int, int], CowCompound]:
+        blocks = self.__regions.get(region)
+        if blocks is None:
+            with self.__lock:
+                blocks = self.__regions.get(region)
+                if blocks is None:
+                    blocks = {}
+                    saved = get_world().restore('region/r.{}.{}'.format(*region))
+                    for data in () if saved is None else saved['blocks']:
+                        blocks[data['x'], data['y'], data['z']] = self.FAKE_BLOCK_DATA.restore(data)
+                    self.__regions[region] = blocks
+        return blocks
+
+    def __block_data(self, pos: Coordinate) -> CowCompound:
+        blocks = self.__block_region(self.__region(pos))
+        data = blocks.get(pos)
+        if data is None:
+            with self.__lock:
+                data = blocks.get(pos)
+                if data is None:
+                    data = blocks[pos] = self.FAKE_BLOCK_DATA.create(x=Int(pos.x), y=Int(pos.y), z=Int(pos.z))
         return data
 
-    def get(self, target: str, *args: str):
-        arg_list = list(args)
-        if target == 'entity':
-            if len(arg_list) in [1, 2]:
-                path = None
-                player = arg_list[0]
-                if not players.is_online(player):
-                    log('No entity was found')
-                    return
-                if len(arg_list) == 2:
-                    path = arg_list[1]
-                self.__display_player_message(player, path=path)
-            else:
-                raise CommandParsingError(self._full_cmd(target, *args))
-
-        elif target == 'block':
-            if len(arg_list) not in [3, 4] or any([isinstance(p, (int, float)) for p in arg_list[:3]]):
-                raise CommandParsingError(self._full_cmd(target, *args))
-            pos = Coordinate(*arg_list[:3])
-            path = None
-            if len(arg_list) == 4:
-                path = arg_list[3]
-            self.__display_block_message(pos, path)
+    def __storage_data(self, storage: str) -> CowCompound:
+        data = self.__storages.get(storage)
+        if data is None:
+            with self.__lock:
+                data = self.__storages.get(storage)
+                if data is None:
+                    saved = get_world().restore(f'data/storage/{storage}')
+                    template = self.FAKE_STORAGE
+                    data = self.__storages[storage] = template.create() if saved is None else template.restore(saved)
+        return data
+
+    def __region_snbt(self, region: Tuple[int, int]) -> str:
+        with self.__lock:
+            blocks = list(self.__regions[region].values())
+        return '{blocks: [' + ', '.join(data.snbt() for data in blocks) + ']}'
+
+    def __player_changed(self, player: PlayerRecord):
+        get_world().mark_dirty(self.__player_region(player), player.nbt.snbt)
 
+    def __block_changed(self, pos: Coordinate):
+        region = self.__region(pos)
+        get_world().mark_dirty('region/r.{}.{}'.format(*region), lambda: self.__region_snbt(region))
+
+    def __storage_changed(self, storage: str):
+        get_world().mark_dirty(f'data/storage/{storage}', self.__storages[storage].snbt)
+
+    @staticmethod
+    def __report(changed: int, failed: str, message: str, mark: Callable[[Any], None], key: Any):
+        if changed:
+            mark(key)
+            log(message)
         else:
-            if len(arg_list) not in [1, 2]:
-                raise CommandParsingError(self._full_cmd(target, *args))
-            storage_name = arg_list[0].strip()
-            namespace = storage_name.split(':', maxsplit=1)
-            if namespace == storage_name:
-                storage_name = f'minecraft:{storage_name}'
-            log(f"Storage {storage_name} has the following contents: {self.FAKE_STORAGE}")
+            log(failed)
+
+    def __target(self, target: EntitySelector) -> Optional[PlayerRecord]:
+        selected = players.select(target)
+        if len(selected) == 0:
+            log('No entity was found')
+            return None
+        return selected[0]
+
+    def get_entity(self, ctx: CommandContext, target: EntitySelector, path: Optional[NbtPath] = None):
+        player = self.__target(target)
+        if player is not None:
+            self.__display(self.FAKE_PLAYER_TITLE.format(player=player.name), self.__player_data(player), path)
+
+    def get_block(self, ctx: CommandContext, pos: Coordinate, path: Optional[NbtPath] = None):
+        self.__display(self.FAKE_BLOCK_TITLE.format(x=pos.x, y=pos.y, z=pos.z), self.__block_data(pos), path)
+
+    def get_storage(self, ctx: CommandContext, storage: str, path: Optional[NbtPath] = None):
+        self.__display(self.FAKE_STORAGE_DATA.format(storage=storage), self.__storage_data(storage), path)
+
+    def merge_entity(self, ctx: CommandContext, target: EntitySelector, nbt: dict):
+        player = self.__target(target)
+        if player is not None:
+            self.__report(self.__player_data(player).merge(nbt), self.MERGE_FAILED,
+                          self.MODIFIED_PLAYER.format(player=player.name), self.__player_changed, player)
+
+    def merge_block(self, ctx: CommandContext, pos: Coordinate, nbt: dict):
+        self.__report(self.__block_data(pos).merge(nbt), self.MERGE_FAILED,
+                      self.MODIFIED_BLOCK.format(x=pos.x, y=pos.y, z=pos.z), self.__block_changed, pos)
+
+    def merge_storage(self, ctx: CommandContext, storage: str, nbt: dict):
+        self.__report(self.__storage_data(storage).merge(nbt), self.MERGE_FAILED,
+                      self.MODIFIED_STORAGE.format(storage=storage), self.__storage_changed, storage)
+
+    def modify_entity(self, ctx: CommandContext, target: EntitySelector, path: NbtPath, value: Any):
+        player = self.__target(target)
+        if player is not None:
+            self.__report(self.__player_data(player).set(path, value), self.MODIFY_FAILED,
+                          self.MODIFIED_PLAYER.format(player=player.name), self.__player_changed, player)
+
+    def modify_block(self, ctx: CommandContext, pos: Coordinate, path: NbtPath, value: Any):
+        self.__report(self.__block_data(pos).set(path, value), self.MODIFY_FAILED,
+                      self.MODIFIED_BLOCK.format(x=pos.x, y=pos.y, z=pos.z), self.__block_changed, pos)
+
+    def modify_storage(self, ctx: CommandContext, storage: str, path: NbtPath, value: Any):
+        self.__report(self.__storage_data(storage).set(path, value), self.MODIFY_FAILED,
+                      self.MODIFIED_STORAGE.format(storage=storage), self.__storage_changed, storage)
@@ -0,0 +1,27 @@
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode, CommandSyntaxError, Literal
+from utils.logger import get_logger, log
+from utils.profiler import get_profiler
+from utils.ticks import get_scheduler
+
+
+class CommandDebug(AbstractCommand):
+    NAME = 'debug'
+    HELP = 'Start or stop profiling, the report is written to the debug folder'
+    TREE = CommandNode().then(
+        Literal('start').runs('start'),
+        Literal('stop').runs('stop'),
+    )
+
+    def start(self, ctx: CommandContext):
+        if not get_profiler().start(get_scheduler().tick):
+            raise CommandSyntaxError('The tick profiler is already started')
+        log('Started tick profiling')
+
+    def stop(self, ctx: CommandContext):
+        results = get_profiler().stop(get_scheduler().tick)
+        if results is None:
+            raise CommandSyntaxError("The tick profiler hasn't started")
+        log(f'Stopped tick profiling after {results.seconds:.2f} seconds and {results.ticks} ticks '
+            f'({results.tps:.2f} ticks per second)')
+        get_logger().info(f'Profiler results dumped to {results.path}')
@@ -1,22 +1,22 @@
-from utils.commands import AbstractCommand, CommandParsingError
+from utils.commands import AbstractCommand, CommandContext, CommandParsingError
+from utils.grammar import CommandNode, GreedyString, Literal
 from utils.logger import log
 
 
 class CommandExecute(AbstractCommand):
     NAME = 'execute'
     HELP = 'Fake execute'
+    TREE = CommandNode().then(
+        Literal('run').then(GreedyString('command').runs('run')),
+        GreedyString('arguments').runs('_direct'),
+    )
 
-    def _direct(self, *args):
-        if len(args) <= 1:
-            raise CommandParsingError(self._current_command)
-        arg_to_parse = []
-        for a in reversed(args):
-            if a == 'run':
-                break
-            arg_to_parse.append(a)
-        arg_to_parse.reverse()
-        print(arg_to_parse)
-        self.run(*arg_to_parse)
+    def _direct(self, ctx: CommandContext, arguments: str):
+        # modifiers are ignored, only the command after "run" is executed
+        _, sep, command = f' {arguments}'.partition(' run ')
+        if not sep or len(command.strip()) == 0:
+            raise CommandParsingError(ctx.command)
+        self.run(ctx, command)
 
-    def run(self, *args):
-        self._parse(' '.join(args))
\ No newline at end of file
+    def run(self, ctx: CommandContext, command: str):
+        self._parse(command)
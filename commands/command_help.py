@@ -1,4 +1,5 @@
-from utils.commands import AbstractCommand
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode
 from utils.logger import log
 
 
@@ -11,8 +12,9 @@ tellraw: Show colored text'''
 class CommandHelp(AbstractCommand):
     NAME = 'help'
     HELP = 'Show command help'
+    TREE = CommandNode().runs('_direct')
 
-    def _direct(self):
+    def _direct(self, ctx: CommandContext):
         result = {f'{"/".join(self.SHUTDOWN_KEYWORDS)}: Exit this dummy server'}
         for line in self._commands().values():
             result.add(line._get_command_help())
@@ -1,4 +1,7 @@
-from utils.commands import AbstractCommand
+from typing import List
+
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode, Literal
 from utils.logger import log
 from player.online import players
 
@@ -6,7 +9,15 @@ from player.online import players
 class CommandList(AbstractCommand):
     NAME = 'list'
     HELP = 'Show a fake player list'
+    TREE = CommandNode().runs('_direct').then(Literal('uuids').runs('uuids'))
+
+    def _direct(self, ctx: CommandContext):
+        self.__list([record.name for record in players.snapshot()])
+
+    def uuids(self, ctx: CommandContext):
+        self.__list([f'{record.name} ({record.uuid})' for record in players.snapshot()])
 
-    def _direct(self, *args):
+    @staticmethod
+    def __list(entries: List[str]):
         log('There are {amount} of a max of {limit} players online:{players}'.format(
-            amount=players.amount, limit=players.limit, players=' ' + ', '.join(players.player_list)))
+            amount=len(entries), limit=players.limit, players=' ' + ', '.join(entries)))
@@ -1,4 +1,5 @@
-from utils.commands import AbstractCommand
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode, GreedyString, Integer, Literal, Word
 from utils.logger import get_logger, log
 from player.online import players
 
@@ -6,13 +7,43 @@ from player.online import players
 class CommandPlayer(AbstractCommand):
     NAME = 'player'
     HELP = 'Manage fake player join & left'
+    TREE = CommandNode().runs('_direct').then(
+        Literal('join').then(Word('name').runs('join').then(Word('ip').runs('join'))),
+        Literal('left').then(Word('name').runs('left')),
+        Literal('join-many').then(Word('prefix').then(Integer('count', 1).runs('join_many'))),
+        Literal('join-file').then(GreedyString('path').runs('join_file')),
+        Literal('left-all').runs('left_all'),
+    )
 
-    def _direct(self, *args):
+    def _direct(self, ctx: CommandContext):
         log("""player join <name> Fake player join
-player left <name> Fake player left""")
+player left <name> Fake player left
+player join-many <prefix> <count> Fake players <prefix>1 to <prefix><count> join
+player join-file <path> Fake players join, one "<name> [<ip>]" per line
+player left-all All fake players left""")
 
-    def join(self, name: str, ip=None):
+    def join(self, ctx: CommandContext, name: str, ip=None):
         players.append(name, ip=ip)
 
-    def left(self, name: str):
+    def left(self, ctx: CommandContext, name: str):
         players.remove(name)
+
+    def join_many(self, ctx: CommandContext, prefix: str, count: int):
+        players.append_many((f'{prefix}{index}', None) for index in range(1, count + 1))
+
+    def join_file(self, ctx: CommandContext, path: str):
+        try:
+            with open(path, encoding='utf-8') as file:
+                lines = file.read().splitlines()
+        except OSError as exc:
+            get_logger().error(f'Failed to read player file {path}: {exc.strerror}')
+            return
+        entries = []
+        for line in lines:
+            parts = line.split()
+            if len(parts) != 0 and not parts[0].startswith('#'):
+                entries.append((parts[0], parts[1] if len(parts) > 1 else None))
+        players.append_many(entries)
+
+    def left_all(self, ctx: CommandContext):
+        players.remove_all()
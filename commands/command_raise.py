@@ -1,9 +1,11 @@
-from utils.commands import AbstractCommand
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode
 
 
 class CommandRaise(AbstractCommand):
     NAME = 'raise'
     HELP = 'Raise a command for debug'
+    TREE = CommandNode().runs('_direct')
 
-    def _direct(self):
+    def _direct(self, ctx: CommandContext):
         raise RuntimeError('Raised on purpose')
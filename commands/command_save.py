@@ -1,10 +1,47 @@
-from utils.commands import AbstractCommand
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode, Literal
 from utils.logger import log
+from utils.world import get_world
 
 
 class CommandSave(AbstractCommand):
     NAME = 'save', 'save-all'
-    HELP = 'Show a fake saved message'
+    HELP = 'Save the changed world regions, flush also syncs them to the disk'
+    TREE = CommandNode().runs('_direct').then(Literal('flush').runs('flush'))
 
-    def _direct(self, *args):
+    def _direct(self, ctx: CommandContext, flush: bool = False):
+        # saving is forced here, save-off only stops the autosave like vanilla
+        log('Saving the game (this may take a moment!)')
+        log(str(get_world().save(flush)))
         log('Saved the game')
+
+    def flush(self, ctx: CommandContext):
+        self._direct(ctx, flush=True)
+
+
+class CommandSaveOff(AbstractCommand):
+    NAME = 'save-off'
+    HELP = 'Turn the autosave off'
+    TREE = CommandNode().runs('_direct')
+
+    def _direct(self, ctx: CommandContext):
+        world = get_world()
+        if not world.saving_enabled:
+            log('Saving is already turned off')
+            return
+        world.saving_enabled = False
+        log('Automatic saving is now disabled')
+
+
+class CommandSaveOn(AbstractCommand):
+    NAME = 'save-on'
+    HELP = 'Turn the autosave back on'
+    TREE = CommandNode().runs('_direct')
+
+    def _direct(self, ctx: CommandContext):
+        world = get_world()
+        if world.saving_enabled:
+            log('Saving is already turned on')
+            return
+        world.saving_enabled = True
+        log('Automatic saving is now enabled')
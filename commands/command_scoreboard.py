@@ -0,0 +1,253 @@
+import operator
+from typing import List, Optional
+
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import (
+    CommandNode, CommandSyntaxError, EntitySelector, Integer, Json, JsonValue, Literal, Operation, ScoreHolder, Word
+)
+from utils.logger import log
+from utils.raw_json_parser import TextComponentError, convert_json_object
+from utils.scoreboard import INT_MAX, INT_MIN, Objective, ScoreboardError, get_scoreboard, wrap_int
+from player.online import players
+
+
+class CommandScoreboard(AbstractCommand):
+    NAME = 'scoreboard'
+    HELP = 'Manage scoreboard objectives and scores'
+    SIDEBAR_SIZE = 15
+    # vanilla integer division and modulo round towards negative infinity, like python
+    OPERATIONS = {
+        '=': lambda a, b: b,
+        '+=': operator.add,
+        '-=': operator.sub,
+        '*=': operator.mul,
+        '/=': operator.floordiv,
+        '%=': operator.mod,
+        '<': min,
+        '>': max,
+    }
+    TREE = CommandNode().then(
+        Literal('objectives').then(
+            Literal('list').runs('list_objectives'),
+            Literal('add').then(Word('objective').then(
+                Word('criterion').runs('add_objective').then(Json('display_name').runs('add_objective'))
+            )),
+            Literal('remove').then(Word('objective').runs('remove_objective')),
+            Literal('setdisplay').then(
+                Word('slot').runs('set_display').then(Word('objective').runs('set_display'))
+            ),
+            Literal('modify').then(Word('objective').then(
+                Literal('displayname').then(Json('display_name').runs('modify_display_name')),
+                Literal('rendertype').then(
+                    Literal('hearts').runs('render_hearts'), Literal('integer').runs('render_integer')
+                ),
+            )),
+        ),
+        Literal('players').then(
+            Literal('list').runs('list_players').then(ScoreHolder('target', single=True).runs('list_scores')),
+            Literal('get').then(ScoreHolder('target', single=True).then(Word('objective').runs('get_score'))),
+            Literal('set').then(ScoreHolder('targets').then(Word('objective').then(
+                Integer('score', INT_MIN, INT_MAX).runs('set_score')
+            ))),
+            Literal('add').then(ScoreHolder('targets').then(Word('objective').then(
+                Integer('score', 0, INT_MAX).runs('add_score')
+            ))),
+            Literal('remove').then(ScoreHolder('targets').then(Word('objective').then(
+                Integer('score', 0, INT_MAX).runs('remove_score')
+            ))),
+            Literal('reset').then(ScoreHolder('targets').runs('reset_scores').then(Word('objective').runs('reset_scores'))),
+            Literal('operation').then(ScoreHolder('targets').then(Word('target_objective').then(Operation('operation').then(
+                ScoreHolder('source').then(Word('source_objective').runs('operation'))
+            )))),
+        ),
+        Literal('sidebar').runs('sidebar').then(Integer('count', 1).runs('sidebar')),
+    )
+
+    @staticmethod
+    def __holders(selector: EntitySelector) -> List[str]:
+        if selector.kind is None:
+            return [selector.name]
+        if selector.kind == ScoreHolder.ALL:
+            names = get_scoreboard().tracked()
+        else:
+            names = [record.name for record in players.select(selector)]
+        if len(names) == 0:
+            raise CommandSyntaxError('No entity was found')
+        return names
+
+    @staticmethod
+    def __objective(name: str, writable: bool = False) -> Objective:
+        try:
+            objective = get_scoreboard().objective(name)
+        except ScoreboardError as exc:
+            raise CommandSyntaxError(str(exc))
+        if writable and objective.read_only:
+            raise CommandSyntaxError(f"Scoreboard objective '{name}' is read-only")
+        return objective
+
+    @staticmethod
+    def __text(component: JsonValue) -> str:
+        try:
+            return convert_json_object(component.value).to_plain_text()
+        except TextComponentError as exc:
+            raise CommandSyntaxError(Json.ERROR.format(exc))
+
+    def list_objectives(self, ctx: CommandContext):
+        objectives = list(get_scoreboard().objectives.values())
+        if len(objectives) == 0:
+            log('There are no objectives')
+        else:
+            log(f"There are {len(objectives)} objectives: {', '.join(map(str, objectives))}")
+
+    def add_objective(self, ctx: CommandContext, objective: str, criterion: str, display_name: JsonValue = None):
+        display = None if display_name is None else self.__text(display_name)
+        try:
+            created = get_scoreboard().add_objective(objective, criterion, display)
+        except ScoreboardError as exc:
+            raise CommandSyntaxError(str(exc))
+        log(f'Created new objective {created}')
+
+    def remove_objective(self, ctx: CommandContext, objective: str):
+        removed = self.__objective(objective)
+        get_scoreboard().remove_objective(removed.name)
+        log(f'Removed objective {removed}')
+
+    def set_display(self, ctx: CommandContext, slot: str, objective: str = None):
+        scoreboard = get_scoreboard()
+        if slot not in scoreboard.DISPLAY_SLOTS:
+            raise CommandSyntaxError(f"Unknown display slot '{slot}'")
+        shown = None if objective is None else self.__objective(objective)
+        if not scoreboard.set_display(slot, None if shown is None else shown.name):
+            if shown is None:
+                log('Nothing changed. That display slot is already empty')
+            else:
+                log('Nothing changed. That display slot is already showing that objective')
+        elif shown is None:
+            log(f'Cleared any objectives in display slot {slot}')
+        else:
+            log(f'Set display slot {slot} to show objective {shown}')
+
+    def modify_display_name(self, ctx: CommandContext, objective: str, display_name: JsonValue):
+        target = self.__objective(objective)
+        get_scoreboard().modify(target, display_name=self.__text(display_name))
+        log(f'Changed the display name of {target.name} to {target}')
+
+    def render_hearts(self, ctx: CommandContext, objective: str):
+        self.__render_type(objective, 'hearts')
+
+    def render_integer(self, ctx: CommandContext, objective: str):
+        self.__render_type(objective, 'integer')
+
+    def __render_type(self, objective: str, render_type: str):
+        target = self.__objective(objective)
+        get_scoreboard().modify(target, render_type=render_type)
+        log(f'Changed the render type of objective {target}')
+
+    def list_players(self, ctx: CommandContext):
+        names = get_scoreboard().tracked()
+        if len(names) == 0:
+            log('There are no tracked entities')
+        else:
+            log(f"There are {len(names)} tracked entities: {', '.join(names)}")
+
+    def list_scores(self, ctx: CommandContext, target: EntitySelector):
+        name = self.__holders(target)[0]
+        scores = get_scoreboard().scores_of(name)
+        if len(scores) == 0:
+            log(f'{name} has no scores to show')
+            return
+        log(f'{name} has {len(scores)} scores:')
+        for objective, score in scores:
+            log(f'{objective}: {score}')
+
+    def get_score(self, ctx: CommandContext, target: EntitySelector, objective: str):
+        name = self.__holders(target)[0]
+        source = self.__objective(objective)
+        score = get_scoreboard().get(name, source)
+        if score is None:
+            raise CommandSyntaxError(f"Can't get value of {source.name} for {name}; none is set")
+        log(f'{name} has {score} {source}')
+
+    def set_score(self, ctx: CommandContext, targets: EntitySelector, objective: str, score: int):
+        names, target = self.__holders(targets), self.__objective(objective, writable=True)
+        scoreboard = get_scoreboard()
+        for name in names:
+            scoreboard.set(name, target, score)
+        if len(names) == 1:
+            log(f'Set {target} for {names[0]} to {score}')
+        else:
+            log(f'Set {target} for {len(names)} entities to {score}')
+
+    def add_score(self, ctx: CommandContext, targets: EntitySelector, objective: str, score: int):
+        self.__add(targets, objective, score, 'Added {amount} to {objective} for {target}')
+
+    def remove_score(self, ctx: CommandContext, targets: EntitySelector, objective: str, score: int):
+        self.__add(targets, objective, -score, 'Removed {amount} from {objective} for {target}')
+
+    def __add(self, targets: EntitySelector, objective: str, delta: int, message: str):
+        names, target = self.__holders(targets), self.__objective(objective, writable=True)
+        scoreboard = get_scoreboard()
+        with scoreboard.lock:
+            values = [scoreboard.add(name, target, delta) for name in names]
+        if len(names) == 1:
+            log(message.format(amount=abs(delta), objective=target, target=names[0]) + f' (now {values[0]})')
+        else:
+            log(message.format(amount=abs(delta), objective=target, target=f'{len(names)} entities'))
+
+    def reset_scores(self, ctx: CommandContext, targets: EntitySelector, objective: str = None):
+        names = self.__holders(targets)
+        target = None if objective is None else self.__objective(objective)
+        scoreboard = get_scoreboard()
+        for name in names:
+            scoreboard.reset(name, target)
+        holder = names[0] if len(names) == 1 else f'{len(names)} entities'
+        if target is None:
+            log(f'Reset all scores for {holder}')
+        else:
+            log(f'Reset {target} for {holder}')
+
+    def operation(self, ctx: CommandContext, targets: EntitySelector, target_objective: str, operation: str,
+                  source: EntitySelector, source_objective: str):
+        names, target = self.__holders(targets), self.__objective(target_objective, writable=True)
+        sources = self.__holders(source)
+        source_target = self.__objective(source_objective, writable=operation == '><')
+        scoreboard = get_scoreboard()
+        with scoreboard.lock:
+            for name in names:
+                for source_name in sources:
+                    self.__apply(name, target, operation, source_name, source_target)
+            if len(names) == 1:
+                log(f'Set {target} for {names[0]} to {scoreboard.get(names[0], target)}')
+            else:
+                log(f'Updated {target} for {len(names)} entities')
+
+    @staticmethod
+    def __apply(name: str, target: Objective, operation: str, source_name: str, source: Objective):
+        scoreboard = get_scoreboard()
+        # both scores are created with 0 when missing, like vanilla
+        a = scoreboard.get(name, target)
+        b = scoreboard.get(source_name, source)
+        a = scoreboard.set(name, target, 0) if a is None else a
+        b = scoreboard.set(source_name, source, 0) if b is None else b
+        if operation == '><':
+            scoreboard.set(name, target, b)
+            scoreboard.set(source_name, source, a)
+            return
+        if operation in ('/=', '%=') and b == 0:
+            raise CommandSyntaxError('Cannot divide by zero')
+        result = CommandScoreboard.OPERATIONS[operation](a, b)
+        scoreboard.set(name, target, wrap_int(result))
+
+    def sidebar(self, ctx: CommandContext, count: Optional[int] = None):
+        """
+        Print the sidebar like a client would show it, best scores first
+        """
+        scoreboard = get_scoreboard()
+        shown = scoreboard.display_slots.get('sidebar')
+        if shown is None:
+            log('No objective is displayed in the sidebar')
+            return
+        objective = scoreboard.objective(shown)
+        log(objective.display_name)
+        for name, score in scoreboard.top(objective, count or self.SIDEBAR_SIZE):
+            log(f'{name}: {score}')
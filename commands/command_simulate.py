@@ -0,0 +1,60 @@
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode, Float, Integer, Literal, Word
+from utils.logger import get_logger, log
+from player.simulator import ArrivalPattern, EventMix, simulator
+
+
+def _options(handler: str) -> Integer:
+    return Integer('population', 1).runs(handler).then(Word('mix').runs(handler))
+
+
+class CommandSimulate(AbstractCommand):
+    NAME = 'simulate'
+    HELP = 'Generate fake player join, leave and chat events'
+    TREE = CommandNode().runs('_direct').then(
+        Literal('start').then(
+            Float('rate', 0.001).runs('start_poisson').then(
+                Literal('poisson').runs('start_poisson').then(_options('start_poisson')),
+                Literal('burst').runs('start_burst').then(_options('start_burst')),
+            )
+        ),
+        Literal('stop').runs('stop'),
+        Literal('status').runs('status'),
+    )
+
+    def _direct(self, ctx: CommandContext):
+        log("""simulate start <events/sec> [poisson|burst] [<population>] [<join:leave:chat>] Start generating events
+simulate status Show the achieved event rate
+simulate stop Stop generating events""")
+
+    def start_poisson(self, ctx: CommandContext, rate: float, population: int = None, mix: str = None):
+        self.__start(ArrivalPattern.POISSON, rate, population, mix)
+
+    def start_burst(self, ctx: CommandContext, rate: float, population: int = None, mix: str = None):
+        self.__start(ArrivalPattern.BURST, rate, population, mix)
+
+    @staticmethod
+    def __start(pattern: ArrivalPattern, rate: float, population: int = None, mix: str = None):
+        try:
+            mix = None if mix is None else EventMix.parse(mix)
+        except ValueError as exc:
+            get_logger().error(str(exc))
+            return
+        if not simulator.start(rate, pattern, mix, population):
+            get_logger().error('Simulation is already running')
+            return
+        log(f'Simulating {rate} events/sec ({pattern.value}, population {population or simulator.POPULATION}, '
+            f'join:leave:chat {mix or simulator.MIX})')
+
+    def status(self, ctx: CommandContext):
+        if not simulator.running:
+            log('No simulation is running')
+        else:
+            log(f'Simulation running: {simulator.stats}')
+
+    def stop(self, ctx: CommandContext):
+        stats = simulator.stop()
+        if stats is None:
+            log('No simulation is running')
+        else:
+            log(f'Simulation stopped: {stats}')
@@ -1,22 +1,23 @@
 import json
-from json.decoder import JSONDecodeError
-from utils.commands import AbstractCommand, CommandParsingError
+from utils.commands import AbstractCommand, CommandContext, CommandSyntaxError
+from utils.grammar import CommandNode, Entity, Json, EntitySelector, JsonValue
 from utils.logger import log
-from utils.raw_json_parser import convert_rtext
+from utils.raw_json_parser import TextComponentError, render_json
 
 
 class CommandTellRaw(AbstractCommand):
     NAME = 'tellraw'
     HELP = 'Show colored text'
+    TREE = CommandNode().then(
+        Entity('targets').then(Json('message').runs('_direct'))
+    )
     DEBUG = False
 
-    def _direct(self, *args):
-        if len(args) <= 1:
-            raise CommandParsingError(self._current_command)
-        content = ' '.join(args[1:])
+    def _direct(self, ctx: CommandContext, targets: EntitySelector, message: JsonValue):
         try:
-            log(convert_rtext(content))
-            if self.DEBUG:
-                log(json.dumps(json.loads(content), ensure_ascii=False, indent=4))
-        except JSONDecodeError:
-            log(content)
+            text = render_json(message.raw, message.value)
+        except TextComponentError as exc:
+            raise CommandSyntaxError(Json.ERROR.format(exc), ctx.raw, ctx.raw.rfind(message.raw))
+        log(text)
+        if self.DEBUG:
+            log(json.dumps(message.value, ensure_ascii=False, indent=4))
@@ -0,0 +1,62 @@
+from utils.commands import AbstractCommand, CommandContext
+from utils.grammar import CommandNode, Float, Literal, Time
+from utils.logger import get_logger, log
+from utils.ticks import TickScheduler, get_scheduler
+
+
+class CommandTick(AbstractCommand):
+    NAME = 'tick'
+    HELP = 'Query or control the tick loop'
+    TREE = CommandNode().runs('query').then(
+        Literal('query').runs('query'),
+        Literal('rate').then(Float('rate', TickScheduler.MIN_TPS, TickScheduler.MAX_TPS).runs('rate')),
+        Literal('freeze').runs('freeze'),
+        Literal('unfreeze').runs('unfreeze'),
+        Literal('step').runs('step').then(Time('time', 1).runs('step')),
+        Literal('sprint').then(Literal('stop').runs('stop_sprint'), Time('time', 1).runs('sprint')),
+        Literal('lag').then(Float('milliseconds', 0.0).runs('lag')),
+    )
+
+    def query(self, ctx: CommandContext):
+        scheduler = get_scheduler()
+        if scheduler.sprinting:
+            state = 'The game is sprinting'
+        elif scheduler.frozen:
+            state = 'The game is frozen'
+        else:
+            state = 'The game is running normally'
+        log(f'{state}\nTarget tick rate: {scheduler.tps} per second.\n'
+            f'Average time per tick: {round(scheduler.mspt, 1)}ms (Target: {round(1000 / scheduler.tps, 1)}ms)')
+
+    def rate(self, ctx: CommandContext, rate: float):
+        get_scheduler().set_rate(rate)
+        log(f'Set the target tick rate to {rate} per second')
+
+    def freeze(self, ctx: CommandContext):
+        get_scheduler().freeze()
+        log('The game is frozen')
+
+    def unfreeze(self, ctx: CommandContext):
+        get_scheduler().unfreeze()
+        log('The game is running normally')
+
+    def step(self, ctx: CommandContext, time: int = 1):
+        scheduler = get_scheduler()
+        if not scheduler.frozen:
+            get_logger().error('Can only step when the game is frozen')
+            return
+        scheduler.step(time)
+        log(f'Stepping {time} tick(s)')
+
+    def sprint(self, ctx: CommandContext, time: int):
+        get_scheduler().sprint(time)
+
+    def stop_sprint(self, ctx: CommandContext):
+        if get_scheduler().stop_sprint():
+            log('Interrupted the current tick sprint')
+        else:
+            get_logger().error('No tick sprint in progress')
+
+    def lag(self, ctx: CommandContext, milliseconds: float):
+        get_scheduler().inject_lag(milliseconds)
+        log(f'The next tick will take {milliseconds}ms longer')
@@ -1,53 +1,196 @@
+import itertools
 import threading
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional, Tuple
 
 from utils.logger import get_logger
-from random import uniform, randint
+from utils.nbt import IntArray, Long, to_snbt
+from utils.uuid_ import get_offline_uuid, get_tuple_uuid, convert_uuid_from_tuple
+from utils.world import get_world
+from random import uniform, randint, randrange, sample
 from ipaddress import IPv4Address
 
 
+MAX_RANDOM_IP = int(IPv4Address('255.255.255.25'))
+
+
+class PlayerRecord:
+    __slots__ = ('name', 'uuid', 'ip', 'port', 'entity_id', 'position', 'join_time', 'nbt')
+
+    def __init__(self, name: str, uuid_: uuid.UUID, ip: str, port: int, entity_id: int,
+                 position: Tuple[float, float, float], join_time: float):
+        self.name = name
+        self.uuid = uuid_
+        self.ip = ip
+        self.port = port
+        self.entity_id = entity_id
+        self.position = position
+        self.join_time = join_time
+        # copy-on-write entity data, created by the data command on first use
+        self.nbt = None
+
+    def __repr__(self):
+        return f'PlayerRecord(name={self.name!r}, uuid={self.uuid}, entity_id={self.entity_id})'
+
+
 class OnlinePlayers:
-    def __init__(self):
+    LIMIT = 20
+    USERCACHE_REGION = 'usercache'
+
+    def __init__(self, limit: Optional[int] = None):
         self.__lock = threading.RLock()
         self.__id = 0
-        self.__player_list = []
-        self.limit = 20
+        # insertion ordered, so iteration follows the join order like the vanilla player list
+        self.__players: Dict[str, PlayerRecord] = {}
+        self.__uuids: Dict[uuid.UUID, PlayerRecord] = {}
+        # the online players in no particular order and the position of each name, so @r picks by index
+        self.__pool: List[PlayerRecord] = []
+        self.__positions: Dict[str, int] = {}
+        # every player that ever joined, with the last join time, persisted in the world
+        self.__usercache: Dict[str, Tuple[uuid.UUID, float]] = {}
+        self.limit = self.LIMIT if limit is None else limit
+        # bumped on every join and leave, so caches built from the player list know when to rebuild
+        self.version = 0
 
     @property
     def amount(self):
-        return len(self.__player_list)
+        return len(self.__players)
 
     @property
-    def player_list(self):
-        return self.__player_list
+    def player_list(self) -> List[str]:
+        """
+        Snapshot of the online player names
+        """
+        with self.__lock:
+            return list(self.__players)
+
+    def snapshot(self) -> Tuple[PlayerRecord, ...]:
+        with self.__lock:
+            return tuple(self.__players.values())
+
+    def get(self, name: str) -> Optional[PlayerRecord]:
+        return self.__players.get(name)
+
+    def get_by_uuid(self, uuid_: uuid.UUID) -> Optional[PlayerRecord]:
+        return self.__uuids.get(uuid_)
 
     def is_online(self, player: str):
-        return player in self.__player_list
+        return player in self.__players
 
-    def append(self, name: str, ip=None) -> None:
+    @property
+    def known(self) -> int:
+        return len(self.__usercache)
+
+    def load_usercache(self) -> int:
+        saved = get_world().restore(self.USERCACHE_REGION)
+        with self.__lock:
+            for entry in () if saved is None else saved:
+                self.__usercache[entry['name']] = (convert_uuid_from_tuple(entry['uuid']), entry['lastSeen'] / 1000)
+        return len(self.__usercache)
+
+    def __usercache_snbt(self) -> str:
         with self.__lock:
-            if self.amount >= self.limit:
-                get_logger().error('Player limit reached')
-                return
-            if name in self.player_list:
-                get_logger().error('Player already logged in')
-            else:
-                self.__id += 1
-                if ip is None:
-                    ip = str(IPv4Address(randint(0, int(IPv4Address('255.255.255.25')))))
-                port = randint(0, 65535)
-                self.player_list.append(name)
-                x = get_random_coordinate()
-                z = get_random_coordinate()
-                y = get_random_coordinate(320, 1)
-                get_logger().info(f'{name}[/{ip}:{port}] logged in with entity id {self.__id} at ({x}, {y}, {z})')
-
-    def remove(self, name: str):
+            entries = list(self.__usercache.items())
+        return to_snbt([
+            {'name': name, 'uuid': IntArray(get_tuple_uuid(uuid_)), 'lastSeen': Long(join_time * 1000)}
+            for name, (uuid_, join_time) in entries
+        ])
+
+    def select(self, selector) -> List[PlayerRecord]:
+        """
+        Resolve an EntitySelector against the online players, as seen from the server console
+        """
         with self.__lock:
-            if name not in self.player_list:
-                get_logger().error('Player not found')
-            else:
-                self.player_list.remove(name)
-                get_logger().info(f'{name} left the game')
+            if selector.kind is None:
+                record = self.__players.get(selector.name)
+                if record is None and len(selector.name) > 16:
+                    record = self.__uuids.get(uuid.UUID(selector.name))
+                return [] if record is None else [record]
+            if selector.kind == 's':
+                return []
+            if selector.kind == 'r':
+                pool = self.__pool
+                count = min(len(pool), selector.limit or 1)
+                if count == 1:
+                    return [pool[randrange(len(pool))]]
+                return [pool[index] for index in sample(range(len(pool)), count)]
+            limit = 1 if selector.kind == 'p' else selector.limit
+            return list(itertools.islice(self.__players.values(), limit))
+
+    def __create(self, name: str, ip: Optional[str]) -> PlayerRecord:
+        self.__id += 1
+        if ip is None:
+            ip = str(IPv4Address(randint(0, MAX_RANDOM_IP)))
+        x = get_random_coordinate()
+        z = get_random_coordinate()
+        y = get_random_coordinate(320, 1)
+        return PlayerRecord(name, get_offline_uuid(name, verify_name=False), ip, randint(0, 65535), self.__id,
+                            (x, y, z), time.time())
+
+    def append(self, name: str, ip=None) -> Optional[PlayerRecord]:
+        joined = self.append_many([(name, ip)])
+        return joined[0] if len(joined) != 0 else None
+
+    def append_many(self, entries: Iterable[Tuple[str, Optional[str]]]) -> List[PlayerRecord]:
+        """
+        Log in every (name, ip) entry under a single lock acquisition, writing the join messages as one batch
+        """
+        logger = get_logger()
+        joined = []
+        with logger.batch(), self.__lock:
+            for name, ip in entries:
+                if self.amount >= self.limit:
+                    logger.error('Player limit reached')
+                    break
+                if name in self.__players:
+                    logger.error('Player already logged in')
+                    continue
+                record = self.__players[name] = self.__create(name, ip)
+                self.__uuids[record.uuid] = record
+                self.__positions[name] = len(self.__pool)
+                self.__pool.append(record)
+                self.__usercache[name] = (record.uuid, record.join_time)
+                joined.append(record)
+                x, y, z = record.position
+                logger.info(f'{name}[/{record.ip}:{record.port}] logged in with entity id {record.entity_id} at ({x}, {y}, {z})')
+            if len(joined) != 0:
+                self.version += 1
+        if len(joined) != 0:
+            get_world().mark_dirty(self.USERCACHE_REGION, self.__usercache_snbt)
+        return joined
+
+    def remove(self, name: str) -> Optional[PlayerRecord]:
+        with self.__lock:
+            record = self.__players.pop(name, None)
+            if record is not None:
+                del self.__uuids[record.uuid]
+                # move the last player into the hole
+                position = self.__positions.pop(name)
+                last = self.__pool.pop()
+                if last is not record:
+                    self.__pool[position] = last
+                    self.__positions[last.name] = position
+                self.version += 1
+        if record is None:
+            get_logger().error('Player not found')
+        else:
+            get_logger().info(f'{name} left the game')
+        return record
+
+    def remove_all(self) -> List[PlayerRecord]:
+        logger = get_logger()
+        with logger.batch(), self.__lock:
+            removed = list(self.__players.values())
+            self.__players.clear()
+            self.__uuids.clear()
+            self.__pool.clear()
+            self.__positions.clear()
+            if len(removed) != 0:
+                self.version += 1
+            for record in removed:
+                logger.info(f'{record.name} left the game')
+        return removed
 
 
 def get_random_coordinate(limit: float = 30000000, digits=16):
@@ -0,0 +1,221 @@
+import asyncio
+import enum
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from player.online import players
+from utils.aio import AsyncRuntime, get_runtime
+from utils.executor import thread_name
+from utils.logger import get_logger
+
+
+class ArrivalPattern(enum.Enum):
+    # exponential gaps between single events
+    POISSON = 'poisson'
+    # all events of an interval at once
+    BURST = 'burst'
+
+
+class EventMix(NamedTuple):
+    join: float
+    leave: float
+    chat: float
+
+    @classmethod
+    def parse(cls, text: str) -> 'EventMix':
+        """
+        Parse a join:leave:chat weight triple like 1:1:8
+        """
+        parts = text.split(':')
+        if len(parts) != 3:
+            raise ValueError(f'Expected join:leave:chat weights, found {text}')
+        mix = cls(*map(float, parts))
+        if min(mix) < 0 or sum(mix) <= 0:
+            raise ValueError(f'Invalid weights {text}')
+        return mix
+
+    def __str__(self):
+        return ':'.join(format(weight, 'g') for weight in self)
+
+
+class SimulationStats(NamedTuple):
+    target_rate: float
+    elapsed: float
+    joins: int
+    leaves: int
+    chats: int
+    rejected: int
+
+    @property
+    def events(self) -> int:
+        return self.joins + self.leaves + self.chats
+
+    @property
+    def achieved_rate(self) -> float:
+        return self.events / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f'{self.events} events in {round(self.elapsed, 3)}s '
+                f'({round(self.achieved_rate, 1)}/s of target {round(self.target_rate, 1)}/s): '
+                f'{self.joins} joins, {self.leaves} leaves, {self.chats} chats, {self.rejected} rejected')
+
+
+class NamePool:
+    """
+    Set of names with O(1) add, remove and random choice
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.__names: List[str] = []
+        self.__index: Dict[str, int] = {}
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.__names)
+
+    def __contains__(self, name: str):
+        return name in self.__index
+
+    def add(self, name: str):
+        if name not in self.__index:
+            self.__index[name] = len(self.__names)
+            self.__names.append(name)
+
+    def remove(self, name: str):
+        position = self.__index.pop(name)
+        last = self.__names.pop()
+        # move the last name into the hole
+        if last != name:
+            self.__names[position] = last
+            self.__index[last] = position
+
+    def choice(self) -> str:
+        return self.__names[random.randrange(len(self.__names))]
+
+
+class EventSimulator:
+    """
+    Generate player join, leave and chat events at a target rate on the shared event loop
+    """
+    NAME_PREFIX = 'Sim'
+    BURST_INTERVAL = 1.0
+    MIX = EventMix(1, 1, 8)
+    POPULATION = 100
+    MESSAGES = (
+        'hello', 'hi all', 'anyone online?', 'brb', 'gg', 'where is the nether portal', 'lol',
+        'can someone help me', '!!MCDR status', '!!qb list', 'nice build', 'good night',
+    )
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__future: Optional[Future] = None
+        self.__reset(0.0)
+
+    def __reset(self, rate: float):
+        self.rate = rate
+        self.__start = self.__end = time.monotonic()
+        self.__counts = [0, 0, 0, 0]
+
+    @property
+    def running(self) -> bool:
+        return self.__future is not None
+
+    @property
+    def stats(self) -> SimulationStats:
+        end = time.monotonic() if self.running else self.__end
+        return SimulationStats(self.rate, end - self.__start, *self.__counts)
+
+    def start(self, rate: float, pattern: ArrivalPattern = ArrivalPattern.POISSON,
+              mix: Optional[EventMix] = None, population: Optional[int] = None) -> bool:
+        with self.__lock:
+            if self.__future is not None:
+                return False
+            self.__reset(rate)
+            coro = self.__run(rate, pattern, mix or self.MIX, population or self.POPULATION)
+            self.__future = get_runtime().spawn(coro)
+            return True
+
+    def stop(self) -> Optional[SimulationStats]:
+        with self.__lock:
+            future, self.__future = self.__future, None
+        if future is None:
+            return None
+        self.__end = time.monotonic()
+        future.cancel()
+        return self.stats
+
+    async def __run(self, rate: float, pattern: ArrivalPattern, mix: EventMix, population: int):
+        offline = NamePool(f'{self.NAME_PREFIX}{index}' for index in range(1, population + 1))
+        online = NamePool()
+        loop = asyncio.get_running_loop()
+        due = loop.time()
+        try:
+            while True:
+                now = loop.time()
+                if due > now:
+                    await asyncio.sleep(due - now)
+                    now = loop.time()
+                # emit everything that became due, so high rates are not bound by the sleep resolution
+                batch = 0
+                if pattern == ArrivalPattern.BURST:
+                    while due <= now:
+                        batch += max(1, round(rate * self.BURST_INTERVAL))
+                        due += self.BURST_INTERVAL
+                else:
+                    while due <= now:
+                        batch += 1
+                        due += random.expovariate(rate)
+                with thread_name(AsyncRuntime.SYNC_THREAD_NAME), get_logger().batch():
+                    for _ in range(batch):
+                        self.__emit(offline, online, mix)
+        except Exception:
+            get_logger().exception('Event simulation failed')
+            with self.__lock:
+                self.__future = None
+            self.__end = time.monotonic()
+
+    def __emit(self, offline: NamePool, online: NamePool, mix: EventMix):
+        if len(offline) == 0 and len(online) == 0:
+            # every name was rejected
+            self.__counts[3] += 1
+            return
+        kind = random.choices(range(3), mix)[0]
+        if kind == 0 and len(offline) == 0:
+            kind = 1
+        elif kind != 0 and len(online) == 0:
+            kind = 0
+        if kind == 0:
+            if players.amount >= players.limit:
+                # skipped instead of logging "Player limit reached" for every join while the server is full
+                self.__counts[3] += 1
+                return
+            name = offline.choice()
+            offline.remove(name)
+            if players.append(name) is None:
+                # e.g. already logged in by someone else, it would be rejected again
+                self.__counts[3] += 1
+                return
+            online.add(name)
+            get_logger().info(f'{name} joined the game')
+        else:
+            name = online.choice()
+            if not players.is_online(name):
+                # kicked by someone else, e.g. player left-all
+                online.remove(name)
+                offline.add(name)
+                self.__counts[3] += 1
+                return
+            if kind == 1:
+                online.remove(name)
+                offline.add(name)
+                players.remove(name)
+            else:
+                get_logger().info(f'<{name}> {random.choice(self.MESSAGES)}')
+        self.__counts[kind] += 1
+
+
+simulator = EventSimulator()
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import current_thread
+from typing import Any, Awaitable, Callable, Coroutine, Optional
+
+
+__all__ = [
+    "AsyncRuntime",
+    "get_runtime",
+]
+
+
+class AsyncRuntime:
+    """
+    The event loop shared by the asyncio server core and background activities.
+    In asyncio mode it is the loop of the main thread, otherwise it is started on a daemon thread on demand
+    """
+    THREAD_NAME = 'Async Thread'
+    SYNC_THREAD_NAME = 'Server Thread'
+    SYNC_WORKERS = 4
+
+    __gl_instance = None
+    __create_lock = threading.Lock()
+
+    def __init__(self):
+        self.__loop: Optional[asyncio.AbstractEventLoop] = None
+        self.__thread: Optional[threading.Thread] = None
+        self.__pool: Optional[ThreadPoolExecutor] = None
+        self.__lock = threading.Lock()
+        self.sync_workers = self.SYNC_WORKERS
+
+    @classmethod
+    def get_instance(cls) -> 'AsyncRuntime':
+        if cls.__gl_instance is None:
+            with cls.__create_lock:
+                if cls.__gl_instance is None:
+                    cls.__gl_instance = cls()
+        return cls.__gl_instance
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self.__loop is None:
+            self.__start_thread()
+        return self.__loop
+
+    @property
+    def in_loop(self) -> bool:
+        return self.__loop is not None and current_thread() is self.__loop_thread
+
+    @property
+    def __loop_thread(self) -> Optional[threading.Thread]:
+        return self.__thread if self.__thread is not None else threading.main_thread()
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        """
+        Use a loop running in the main thread, called by the asyncio server core at startup
+        """
+        with self.__lock:
+            if self.__loop is not None:
+                raise RuntimeError('Event loop already exists')
+            self.__loop = loop
+
+    def __start_thread(self):
+        with self.__lock:
+            if self.__loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            started = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                loop.call_soon(started.set)
+                loop.run_forever()
+
+            self.__thread = threading.Thread(target=run, name=self.THREAD_NAME, daemon=True)
+            self.__thread.start()
+            started.wait()
+            self.__loop = loop
+
+    def spawn(self, coro: Coroutine) -> Future:
+        """
+        Schedule a coroutine on the shared loop from any thread
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def call(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """
+        Run a coroutine on the shared loop and wait for its result, must not be called from the loop itself
+        """
+        if self.in_loop:
+            raise RuntimeError('Cannot block the event loop on itself')
+        return self.spawn(coro).result(timeout)
+
+    def run_sync(self, func: Callable, *args) -> Awaitable:
+        """
+        Adapter for blocking code: run func on the worker threads without blocking the loop
+        """
+        if self.__pool is None:
+            with self.__lock:
+                if self.__pool is None:
+                    self.__pool = ThreadPoolExecutor(self.sync_workers, initializer=self.__name_worker)
+        return self.loop.run_in_executor(self.__pool, func, *args)
+
+    def __name_worker(self):
+        current_thread().name = self.SYNC_THREAD_NAME
+
+    def stop(self):
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=True)
+            self.__pool = None
+        if self.__thread is not None and self.__loop is not None:
+            self.__loop.call_soon_threadsafe(self.__loop.stop)
+            self.__thread.join()
+            self.__thread = None
+        self.__loop = None
+
+
+def get_runtime() -> AsyncRuntime:
+    return AsyncRuntime.get_instance()
@@ -1,90 +1,333 @@
 import importlib
+import inspect
+import json
 import os
-from threading import RLock, current_thread
-from typing import Iterable, Union, Dict
-from contextlib import contextmanager
+import sys
+import time
+from threading import Lock, Thread, current_thread
+from types import MappingProxyType, ModuleType
+from typing import Any, Dict, Iterable, List, Union, Callable, Mapping, NamedTuple, Optional, Tuple
 from utils.logger import get_logger, log
+from utils.aio import AsyncRuntime, get_runtime
+from utils.executor import thread_name
+from utils.profiler import get_profiler
+from utils.grammar import (
+    CommandNode, CompiledNode, CommandSyntaxError, GreedyWords, Literal, StringReader, Word, match
+)
 
-from mcdreforged.api.decorator import new_thread
 from mcdreforged.api.rtext import RTextBase
 
 
 __all__ = [
     "AbstractCommand",
+    "CommandContext",
+    "CommandStub",
+    "CommandManifest",
     "CommandException",
     "CommandRegistryError",
     "CommandParsingError",
+    "CommandSyntaxError",
 ]
 
 
+class CommandContext(NamedTuple):
+    """
+    Everything known about one command invocation, handed to the handler as its first argument
+    """
+    raw: str
+    tokens: Tuple[str, ...]
+    start_time: float
+    thread: Thread
+
+    @classmethod
+    def of(cls, raw: str) -> 'CommandContext':
+        return cls(raw, tuple(raw.split()), time.time(), current_thread())
+
+    @property
+    def command(self) -> str:
+        return ' '.join(self.tokens)
+
+
+class Subcommand(NamedTuple):
+    handler: Callable
+    min_args: int
+    max_args: Optional[int]
+
+    @classmethod
+    def of(cls, handler: Callable) -> 'Subcommand':
+        min_args, max_args = 0, 0
+        # the first positional parameter of every handler receives the CommandContext
+        params = list(inspect.signature(handler).parameters.values())[1:]
+        for param in params:
+            if param.kind == param.VAR_POSITIONAL:
+                max_args = None
+            elif param.kind in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+                if max_args is not None:
+                    max_args += 1
+                if param.default is param.empty:
+                    min_args += 1
+        return cls(handler, min_args, max_args)
+
+    def attach(self, node: CommandNode, handler_name: str):
+        """
+        Append word arguments matching the handler signature below node
+        """
+        for index in range(self.min_args if self.max_args is None else self.max_args):
+            if index >= self.min_args:
+                node.runs(handler_name)
+            child = Word(f'arg{index}')
+            node.then(child)
+            node = child
+        node.runs(handler_name)
+        if self.max_args is None:
+            node.then(GreedyWords('args').runs(handler_name))
+
+
+class CommandStub(NamedTuple):
+    """
+    Registry entry of a command whose module is not imported yet, replaced by the command class on its first use
+    """
+    module: str
+    class_name: str
+    # the first name of the command, aliases share it
+    name: str
+    help: str
+
+    def _get_command_help(self) -> str:
+        return self.help
+
+
+class CommandManifest:
+    """
+    Names and help texts of the commands in every command module, cached on disk.
+    The entry of a module is only rebuilt, by importing it, when its modification time or size changed
+    """
+    VERSION = 1
+    FILE_NAME = 'command_manifest.json'
+
+    def __init__(self, folder: str, package: str):
+        self.folder = folder
+        self.package = package
+        self.path = os.path.join(folder, '__pycache__', self.FILE_NAME)
+
+    def __read(self) -> Dict[str, dict]:
+        try:
+            with open(self.path, encoding='utf8') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return {}
+        return data.get('modules', {}) if isinstance(data, dict) and data.get('version') == self.VERSION else {}
+
+    def __write(self, modules: Dict[str, dict]):
+        temp = f'{self.path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(temp, 'w', encoding='utf8') as file:
+                json.dump({'version': self.VERSION, 'modules': modules}, file, indent=1)
+            os.replace(temp, self.path)
+        except OSError:
+            # a read-only installation only loses the cache
+            get_logger().debug(f'Cannot write the command manifest {self.path}')
+
+    def load(self, describe: Callable[[ModuleType], List[dict]]) -> Dict[str, dict]:
+        """
+        Entries of every command module by module name. Modules without a valid entry are imported and
+        passed to describe, which returns the {class, names, help} dict of each command class found in it
+        """
+        cached = self.__read()
+        modules = {}
+        changed = False
+        with os.scandir(self.folder) as entries:
+            files = sorted((entry.name, entry.stat()) for entry in entries if entry.name.endswith('.py'))
+        for file_name, stat in files:
+            name = f'{self.package}.{file_name[:-3]}'
+            entry = cached.get(name)
+            if entry is None or entry.get('mtime') != stat.st_mtime_ns or entry.get('size') != stat.st_size:
+                entry = {
+                    'mtime': stat.st_mtime_ns,
+                    'size': stat.st_size,
+                    'commands': describe(importlib.import_module(name)),
+                }
+                changed = True
+            modules[name] = entry
+        if changed or len(modules) != len(cached):
+            self.__write(modules)
+        return modules
+
+
 class AbstractCommand:
-    __COMMAND_EXTENSION_FOLDER = 'commands'
+    # relative to the source tree instead of the working directory
+    __COMMAND_EXTENSION_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'commands')
+    __COMMAND_PACKAGE = 'commands'
     SHUTDOWN_KEYWORDS = ('end', 'exit', 'stop')
-    __registered: Dict[str, type] = {}
+    # replaced as a whole on every registration, so readers never need a lock
+    __registered: Mapping[str, Union[type, CommandStub]] = MappingProxyType({})
+    __registry_lock = Lock()
+    # held while the module of a stub is imported and its commands are registered
+    __load_lock = Lock()
     NAME: Union[str, Iterable[str], None] = None
-    cmd_gl_lock = RLock()
+    # arguments following the command name, derived from the public methods when not declared
+    TREE: Optional[CommandNode] = None
 
-    def __init__(self):
-        self.__cmd_cache = None
+    # built by _register(), shared by every invocation of the command
+    _name: Optional[str] = None
+    _instance: Optional['AbstractCommand'] = None
+    _subcommands: Mapping[str, Subcommand] = MappingProxyType({})
+    _tree: Optional[CompiledNode] = None
 
     @classmethod
-    def _register(cls):
-        with cls.cmd_gl_lock:
-            if cls.NAME is None:
+    def _build_dispatch_table(cls):
+        cls._name = cls._names()[0]
+        instance = cls()
+        subcommands = {}
+        for name in dir(cls):
+            if not name.startswith('_') and callable(getattr(cls, name)):
+                subcommands[name] = Subcommand.of(getattr(instance, name))
+        cls._instance = instance
+        cls._subcommands = MappingProxyType(subcommands)
+        cls._tree = (cls._default_tree() if cls.TREE is None else cls.TREE).compile(instance)
+
+    @classmethod
+    def _default_tree(cls) -> CommandNode:
+        root = CommandNode()
+        if cls._direct is not AbstractCommand._direct:
+            Subcommand.of(cls._instance._direct).attach(root, '_direct')
+        for name, subcommand in cls._subcommands.items():
+            literal = Literal(name)
+            root.then(literal)
+            subcommand.attach(literal, name)
+        return root
+
+    @classmethod
+    def _names(cls) -> List[str]:
+        if cls.NAME is None:
+            raise CommandRegistryError(cls.NAME)
+        names = [cls.NAME] if isinstance(cls.NAME, str) else list(cls.NAME)
+        for item in names:
+            if ' ' in item.strip():
                 raise CommandRegistryError(cls.NAME)
-            elif isinstance(cls.NAME, str):
-                if ' ' in cls.NAME.strip():
-                    raise CommandRegistryError(cls.NAME)
-                cls.__registered[cls.NAME.strip()] = cls
-            else:
-                for item in cls.NAME:
-                    if ' ' in item.strip():
-                        raise CommandRegistryError(cls.NAME)
-                    cls.__registered[item.strip()] = cls
+        return [item.strip() for item in names]
+
+    @classmethod
+    def _register(cls):
+        names = cls._names()
+        # the table must be complete before the name becomes visible to _parse
+        cls._build_dispatch_table()
+        cls.__publish({item: cls for item in names})
+
+    @staticmethod
+    def __publish(entries: Mapping[str, Union[type, CommandStub]]):
+        with AbstractCommand.__registry_lock:
+            registered = dict(AbstractCommand.__registered)
+            registered.update(entries)
+            AbstractCommand.__registered = MappingProxyType(registered)
+
+    @classmethod
+    def __command_classes(cls, module: ModuleType) -> List[type]:
+        return [
+            attr for name, attr in vars(module).items()
+            if not name.startswith('_') and isinstance(attr, type) and issubclass(attr, AbstractCommand)
+            and attr.NAME is not None
+        ]
+
+    @classmethod
+    def __describe(cls, module: ModuleType) -> List[dict]:
+        return [
+            {'class': command.__name__, 'names': command._names(), 'help': command._get_command_help()}
+            for command in cls.__command_classes(module)
+        ]
 
     @classmethod
     def _refresh(cls):
-        for item in os.listdir(cls.__COMMAND_EXTENSION_FOLDER):
-            if item.endswith('.py'):
-                item_path = f'{cls.__COMMAND_EXTENSION_FOLDER}.{item[:-3]}'
-                module = importlib.import_module(item_path)
-                for name, attr in vars(module).items():
-                    if not name.startswith('_') and isinstance(attr, type) and issubclass(attr, cls):
-                        if attr.NAME is None:
-                            continue
-                        attr._register()
+        """
+        Register every command module. Modules not imported yet are registered as stubs from the manifest,
+        so they are only imported once one of their commands is used
+        """
+        manifest = CommandManifest(cls.__COMMAND_EXTENSION_FOLDER, cls.__COMMAND_PACKAGE)
+        stubs = {}
+        for module_name, entry in manifest.load(cls.__describe).items():
+            module = sys.modules.get(module_name)
+            if module is not None:
+                for command in cls.__command_classes(module):
+                    command._register()
+                continue
+            for command in entry['commands']:
+                stub = CommandStub(module_name, command['class'], command['names'][0], command['help'])
+                for name in command['names']:
+                    stubs[name] = stub
+        cls.__publish(stubs)
 
     @classmethod
-    def _commands(cls):
-        return cls.__registered
+    def __resolve(cls, name: str, stub: CommandStub) -> Optional[type]:
+        """
+        Import the module of a stub and register its commands, returning the command now registered as name
+        """
+        with AbstractCommand.__load_lock:
+            if AbstractCommand.__registered.get(name) is stub:
+                for command in cls.__command_classes(importlib.import_module(stub.module)):
+                    command._register()
+        node = AbstractCommand.__registered.get(name)
+        return None if isinstance(node, CommandStub) else node
 
     @classmethod
-    def _parse(cls, cmd: str):
-        with cls.cmd_gl_lock:
-            cmd = cmd.strip().split(' ')
-            node = cls.__registered.get(cmd[0])
-            try:
-                if node is None:
-                    raise CommandParsingError(' '.join(cmd))
-                else:
-                    node()._parse_command(*cmd)
-            except CommandParsingError as e:
-                cmd = e.failed_command
-                if cmd is None:
-                    cmd = ''
-                log(cmd)
+    def _commands(cls) -> Mapping[str, Union[type, CommandStub]]:
+        """
+        Every registered name, with a stub for commands whose module is not imported yet
+        """
+        return AbstractCommand.__registered
 
+    @classmethod
+    def _canonical_name(cls, name: str) -> str:
+        """
+        First name of the command registered as name, so aliases share one key, or name itself if it is unknown
+        """
+        node = AbstractCommand.__registered.get(name)
+        if node is None:
+            return name
+        return node.name if isinstance(node, CommandStub) else node._name
 
-    @property
-    def _methods(self):
-        return {
-            item: getattr(self, item) for item in list(
-                filter(
-                    lambda m: not m.startswith("_") and callable(getattr(self, m)),
-                    dir(self)
-                )
-            )
-        }
+    @classmethod
+    def _match(cls, cmd: str) -> Optional[Tuple['AbstractCommand', CommandContext, Callable, List[Any]]]:
+        """
+        Resolve a command line to its handler, logging the syntax error and returning None if it does not match
+        """
+        ctx = CommandContext.of(cmd)
+        reader = StringReader(cmd.strip())
+        name = reader.read_word()
+        node = AbstractCommand.__registered.get(name)
+        if isinstance(node, CommandStub):
+            node = cls.__resolve(name, node)
+        try:
+            if node is None:
+                raise reader.error(CommandSyntaxError.UNKNOWN_COMMAND, 0)
+            handler, values = match(node._tree, reader)
+        except CommandSyntaxError as e:
+            for line in e.lines():
+                log(line)
+            return None
+        return node._instance, ctx, handler, values
+
+    @classmethod
+    def _parse(cls, cmd: str):
+        matched = cls._match(cmd)
+        if matched is not None:
+            instance, ctx, handler, values = matched
+            instance._secure_run(ctx, handler, values)
+
+    @classmethod
+    async def _parse_async(cls, cmd: str):
+        """
+        Coroutine handlers run on the event loop, others are adapted onto the runtime worker threads
+        """
+        # matching never awaits, so the loop thread can be renamed like a worker for its log lines
+        with thread_name(AsyncRuntime.SYNC_THREAD_NAME):
+            matched = cls._match(cmd)
+        if matched is not None:
+            instance, ctx, handler, values = matched
+            if inspect.iscoroutinefunction(handler):
+                await instance._secure_run_async(ctx, handler, values)
+            else:
+                await get_runtime().run_sync(instance._secure_run, ctx, handler, values)
 
     @classmethod
     def _get_command_help(cls):
@@ -92,46 +335,59 @@ class AbstractCommand:
         prefix = cls.NAME if isinstance(cls.NAME, str) else '/'.join(cls.NAME)
         return f"{prefix}: {msg}"
 
-    @new_thread('TaskExecutor')
-    def _secure_run(self, func, *sargs, **kwargs):
+    def _secure_run(self, ctx: CommandContext, handler: Callable, values: Iterable):
+        if inspect.iscoroutinefunction(handler):
+            get_runtime().call(self._secure_run_async(ctx, handler, values))
+            return
+        profiler = get_profiler()
+        start = time.perf_counter() if profiler.running else None
+        failed = False
+        with thread_name('TaskExecutor'):
+            try:
+                try:
+                    handler(ctx, *values)
+                except NotImplementedError:
+                    raise CommandParsingError(ctx.command)
+            except Exception as exc:
+                failed = True
+                self.__report(exc)
+        if start is not None:
+            profiler.record_command(self._name, time.perf_counter() - start, failed)
+
+    async def _secure_run_async(self, ctx: CommandContext, handler: Callable, values: Iterable):
+        profiler = get_profiler()
+        start = time.perf_counter() if profiler.running else None
+        failed = False
         try:
             try:
-                func(*sargs, **kwargs)
-            except (TypeError, NotImplementedError) as e:
-                raise CommandParsingError(' '.join(self.__cmd_cache))
+                await handler(ctx, *values)
+            except NotImplementedError:
+                raise CommandParsingError(ctx.command)
         except Exception as exc:
-            get_logger().exception(f'Exception in thread {current_thread().name}', exc_info=exc)
-
+            failed = True
+            self.__report(exc)
+        if start is not None:
+            profiler.record_command(self._name, time.perf_counter() - start, failed)
 
-    @contextmanager
-    def _cache_command(self, *args):
-        with self.cmd_gl_lock:
-            try:
-                result = list(args)
-                self.__cmd_cache = result.copy()
-                result.pop(0)
-                yield result
-            finally:
-                self.__cmd_cache = None
-
-    def _parse_command(self, *args):
-        with self._cache_command(*args) as editable_args:
-            if len(editable_args) != 0 and editable_args[0] in self._methods.keys():
-                handler = self._methods.get(editable_args.pop(0))
-                self._secure_run(handler, *editable_args)
-            else:
-                self._secure_run(self._direct, *editable_args)
+    @staticmethod
+    def __report(exc: Exception):
+        if isinstance(exc, CommandSyntaxError):
+            for line in exc.lines():
+                log(line)
+        elif isinstance(exc, CommandParsingError):
+            log(exc.failed_command or '')
+        else:
+            get_logger().exception(f'Exception in thread {current_thread().name}', exc_info=exc)
 
-    def _direct(self, *args):
+    def _direct(self, ctx: CommandContext, *args):
         raise NotImplementedError
 
-    @property
-    def _current_command(self):
-        return self.__cmd_cache
-
     @classmethod
     def _get_command(cls, command: str, default=None):
-        return cls.__registered.get(command, default)
+        node = AbstractCommand.__registered.get(command)
+        if isinstance(node, CommandStub):
+            node = cls.__resolve(command, node)
+        return default if node is None else node
 
 
 class CommandException(Exception):
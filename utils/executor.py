@@ -0,0 +1,151 @@
+import enum
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from itertools import count
+from threading import current_thread
+from typing import Callable, List, Optional, Hashable
+
+from mcdreforged.api.rtext import RText, RColor
+
+from utils.logger import get_logger
+from utils.profiler import get_profiler
+
+
+__all__ = [
+    "ExecutorMode",
+    "CommandExecutor",
+    "get_executor",
+    "thread_name",
+]
+
+
+_STOP = object()
+
+
+class ExecutorMode(enum.Enum):
+    # every task runs on one lane, in submission order
+    FIFO = 'fifo'
+    # tasks are spread over all lanes, tasks sharing a key keep their order
+    PARALLEL = 'parallel'
+
+
+@contextmanager
+def thread_name(name: str):
+    thread = current_thread()
+    previous = thread.name
+    thread.name = name
+    try:
+        yield
+    finally:
+        thread.name = previous
+
+
+class CommandExecutor:
+    WORKERS = 4
+    QUEUE_SIZE = 1024
+    MODE = ExecutorMode.FIFO
+    THREAD_NAME = 'Server Thread'
+
+    __gl_instance = None
+
+    def __init__(self, workers: Optional[int] = None, queue_size: Optional[int] = None,
+                 mode: Optional[ExecutorMode] = None):
+        self.mode = self.MODE if mode is None else mode
+        self.workers = 1 if self.mode == ExecutorMode.FIFO else max(1, workers or self.WORKERS)
+        self.queue_size = max(1, queue_size or self.QUEUE_SIZE)
+        # bounds the pending tasks of all lanes together, a slot is released once a worker takes its task
+        self.__slots = threading.Semaphore(self.queue_size)
+        self.__lanes: List[queue.Queue] = [queue.Queue() for _ in range(self.workers)]
+        self.__threads: List[threading.Thread] = []
+        self.__round_robin = count()
+        self.__state_lock = threading.Lock()
+        self.__running = False
+
+    @classmethod
+    def get_instance(cls) -> 'CommandExecutor':
+        if cls.__gl_instance is None:
+            cls.__gl_instance = cls()
+        return cls.__gl_instance
+
+    @classmethod
+    def set_instance(cls, executor: 'CommandExecutor'):
+        cls.__gl_instance = executor
+
+    @property
+    def running(self):
+        return self.__running
+
+    @property
+    def pending(self) -> int:
+        return sum(lane.qsize() for lane in self.__lanes)
+
+    def start(self):
+        with self.__state_lock:
+            if self.__running:
+                return
+            self.__running = True
+            for lane in self.__lanes:
+                thread = threading.Thread(target=self.__work, args=(lane, self.__slots), name=self.THREAD_NAME,
+                                          daemon=True)
+                self.__threads.append(thread)
+                thread.start()
+
+    def submit(self, func: Callable, *args, key: Optional[Hashable] = None):
+        """
+        Queue a task, blocking while queue_size tasks are pending
+        """
+        if not self.__running:
+            raise RuntimeError('Executor is not running')
+        self.__slots.acquire()
+        # the queue wait is only measured while profiling
+        queued = time.perf_counter() if get_profiler().running else None
+        # checked again under the lock, a task queued behind the stop sentinel would never run
+        with self.__state_lock:
+            if not self.__running:
+                self.__slots.release()
+                raise RuntimeError('Executor is not running')
+            self.__select_lane(key).put((func, args, key, queued))
+
+    def stop(self, wait: bool = True):
+        """
+        Stop accepting tasks and let the workers drain everything already queued
+        """
+        with self.__state_lock:
+            if not self.__running:
+                return
+            self.__running = False
+            for lane in self.__lanes:
+                lane.put(_STOP)
+        if wait:
+            for thread in self.__threads:
+                if thread is not current_thread():
+                    thread.join()
+        self.__threads.clear()
+
+    def __select_lane(self, key: Optional[Hashable]) -> queue.Queue:
+        if self.workers == 1:
+            return self.__lanes[0]
+        if key is None:
+            return self.__lanes[next(self.__round_robin) % self.workers]
+        return self.__lanes[hash(key) % self.workers]
+
+    @staticmethod
+    def __work(lane: queue.Queue, slots: threading.Semaphore):
+        while True:
+            task = lane.get()
+            if task is _STOP:
+                return
+            slots.release()
+            func, args, key, queued = task
+            if queued is not None:
+                get_profiler().record_wait(key, time.perf_counter() - queued)
+            try:
+                func(*args)
+            except:
+                get_logger().exception(RText(f'Error occurred in {current_thread().name}:', RColor.red))
+
+
+def get_executor() -> CommandExecutor:
+    return CommandExecutor.get_instance()
@@ -0,0 +1,515 @@
+import json
+import re
+import uuid
+from types import MappingProxyType
+from typing import Any, Callable, List, Mapping, NamedTuple, Optional, Tuple
+
+
+__all__ = [
+    "CommandSyntaxError",
+    "StringReader",
+    "CommandNode",
+    "Literal",
+    "ArgumentNode",
+    "Word",
+    "GreedyString",
+    "GreedyWords",
+    "Integer",
+    "Float",
+    "BlockPos",
+    "Vec3",
+    "Entity",
+    "ScoreHolder",
+    "Operation",
+    "Json",
+    "ResourceLocation",
+    "Coordinate",
+    "EntitySelector",
+    "JsonValue",
+    "CompiledNode",
+    "match",
+]
+
+
+class CommandSyntaxError(Exception):
+    CONTEXT_AMOUNT = 10
+    UNKNOWN_COMMAND = 'Unknown or incomplete command, see below for error'
+    UNKNOWN_ARGUMENT = 'Incorrect argument for command'
+    EXPECTED_SEPARATOR = 'Expected whitespace to end one argument, but found trailing data'
+
+    def __init__(self, message: str, string: Optional[str] = None, cursor: int = -1):
+        self.message = message
+        self.string = string
+        self.cursor = cursor
+        super(CommandSyntaxError, self).__init__(message)
+
+    @property
+    def context(self) -> Optional[str]:
+        """
+        Vanilla error context, e.g. "...a get block 1 x<--[HERE]"
+        """
+        if self.string is None or self.cursor < 0:
+            return None
+        cursor = min(len(self.string), self.cursor)
+        prefix = '...' if cursor > self.CONTEXT_AMOUNT else ''
+        return f'{prefix}{self.string[max(0, cursor - self.CONTEXT_AMOUNT):]}<--[HERE]'
+
+    def lines(self) -> List[str]:
+        context = self.context
+        return [self.message] if context is None else [self.message, context]
+
+
+class StringReader:
+    SEPARATOR = ' '
+    __NUMBER = re.compile(r'[0-9.\-]*')
+    __WORD = re.compile(r'[^ ]*')
+    __UNQUOTED = re.compile(r'[0-9A-Za-z_\-.+]*')
+
+    def __init__(self, string: str, cursor: int = 0):
+        self.string = string
+        self.cursor = cursor
+
+    @property
+    def remaining(self) -> str:
+        return self.string[self.cursor:]
+
+    def can_read(self, length: int = 1) -> bool:
+        return self.cursor + length <= len(self.string)
+
+    def peek(self, offset: int = 0) -> str:
+        return self.string[self.cursor + offset]
+
+    def read(self) -> str:
+        char = self.string[self.cursor]
+        self.cursor += 1
+        return char
+
+    def skip(self):
+        self.cursor += 1
+
+    def skip_whitespace(self):
+        while self.can_read() and self.string[self.cursor] == self.SEPARATOR:
+            self.cursor += 1
+
+    def error(self, message: str, cursor: Optional[int] = None) -> CommandSyntaxError:
+        return CommandSyntaxError(message, self.string, self.cursor if cursor is None else cursor)
+
+    def __read_pattern(self, pattern) -> str:
+        result = pattern.match(self.string, self.cursor).group()
+        self.cursor += len(result)
+        return result
+
+    def read_word(self) -> str:
+        return self.__read_pattern(self.__WORD)
+
+    def read_unquoted_string(self) -> str:
+        return self.__read_pattern(self.__UNQUOTED)
+
+    def read_quoted_string(self) -> str:
+        start = self.cursor
+        quote = self.read()
+        result = []
+        escaped = False
+        while self.can_read():
+            char = self.read()
+            if escaped:
+                if char not in (quote, '\\'):
+                    self.cursor -= 1
+                    raise self.error(f"Invalid escape sequence '\\{char}' in quoted string")
+                result.append(char)
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                return ''.join(result)
+            else:
+                result.append(char)
+        raise self.error('Unclosed quoted string', start)
+
+    def read_string(self) -> str:
+        if self.can_read() and self.peek() in ('"', "'"):
+            return self.read_quoted_string()
+        return self.read_unquoted_string()
+
+    def read_int(self) -> int:
+        start = self.cursor
+        number = self.__read_pattern(self.__NUMBER)
+        if len(number) == 0:
+            raise self.error('Expected integer')
+        try:
+            return int(number)
+        except ValueError:
+            self.cursor = start
+            raise self.error(f"Invalid integer '{number}'")
+
+    def read_float(self) -> float:
+        start = self.cursor
+        number = self.__read_pattern(self.__NUMBER)
+        if len(number) == 0:
+            raise self.error('Expected float')
+        try:
+            return float(number)
+        except ValueError:
+            self.cursor = start
+            raise self.error(f"Invalid float '{number}'")
+
+
+class Coordinate(NamedTuple):
+    x: float
+    y: float
+    z: float
+
+
+class EntitySelector(NamedTuple):
+    raw: str
+    # 'p', 'a', 'r', 's', 'e' for selectors, None for a plain name or UUID
+    kind: Optional[str]
+    name: Optional[str]
+    limit: Optional[int]
+
+    @property
+    def single(self) -> bool:
+        if self.kind is None or self.kind in ('p', 's'):
+            return True
+        # @r picks one player unless a limit says otherwise
+        return (self.limit or 1 if self.kind == 'r' else self.limit) == 1
+
+
+class JsonValue(NamedTuple):
+    raw: str
+    value: Any
+
+
+class CompiledNode(NamedTuple):
+    literals: Mapping[str, 'CompiledNode']
+    arguments: Tuple[Tuple['ArgumentNode', 'CompiledNode'], ...]
+    handler: Optional[Callable]
+
+
+class CommandNode:
+    """
+    A node of a command tree. The bare CommandNode stands for the command name itself
+    """
+
+    def __init__(self):
+        self.children: List['CommandNode'] = []
+        self.handler: Optional[str] = None
+
+    def then(self, *nodes: 'CommandNode') -> 'CommandNode':
+        self.children.extend(nodes)
+        return self
+
+    def runs(self, handler: str) -> 'CommandNode':
+        """
+        Name of the command method invoked when the input ends at this node
+        """
+        self.handler = handler
+        return self
+
+    def compile(self, instance: object) -> CompiledNode:
+        literals, arguments = {}, []
+        for child in self.children:
+            compiled = child.compile(instance)
+            if isinstance(child, Literal):
+                literals[child.literal] = compiled
+            else:
+                arguments.append((child, compiled))
+        handler = None if self.handler is None else getattr(instance, self.handler)
+        return CompiledNode(MappingProxyType(literals), tuple(arguments), handler)
+
+
+class Literal(CommandNode):
+    def __init__(self, literal: str):
+        super(Literal, self).__init__()
+        self.literal = literal
+
+
+class ArgumentNode(CommandNode):
+    # whether the parsed value is a sequence to be unpacked into several positional arguments
+    SPREAD = False
+
+    def __init__(self, name: str):
+        super(ArgumentNode, self).__init__()
+        self.name = name
+
+    def parse(self, reader: StringReader) -> Any:
+        raise NotImplementedError
+
+
+class Word(ArgumentNode):
+    def parse(self, reader: StringReader) -> str:
+        return reader.read_word()
+
+
+class GreedyString(ArgumentNode):
+    def parse(self, reader: StringReader) -> str:
+        result = reader.remaining
+        reader.cursor = len(reader.string)
+        return result
+
+
+class GreedyWords(ArgumentNode):
+    SPREAD = True
+
+    def parse(self, reader: StringReader) -> List[str]:
+        result = reader.remaining.split()
+        reader.cursor = len(reader.string)
+        return result
+
+
+class Integer(ArgumentNode):
+    def __init__(self, name: str, minimum: Optional[int] = None, maximum: Optional[int] = None):
+        super(Integer, self).__init__(name)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def parse(self, reader: StringReader) -> int:
+        start = reader.cursor
+        value = reader.read_int()
+        if self.minimum is not None and value < self.minimum:
+            raise reader.error(f'Integer must not be less than {self.minimum}, found {value}', start)
+        if self.maximum is not None and value > self.maximum:
+            raise reader.error(f'Integer must not be more than {self.maximum}, found {value}', start)
+        return value
+
+
+class Float(ArgumentNode):
+    def __init__(self, name: str, minimum: Optional[float] = None, maximum: Optional[float] = None):
+        super(Float, self).__init__(name)
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def parse(self, reader: StringReader) -> float:
+        start = reader.cursor
+        value = reader.read_float()
+        if self.minimum is not None and value < self.minimum:
+            raise reader.error(f'Float must not be less than {self.minimum}, found {value}', start)
+        if self.maximum is not None and value > self.maximum:
+            raise reader.error(f'Float must not be more than {self.maximum}, found {value}', start)
+        return value
+
+
+class Vec3(ArgumentNode):
+    """
+    Three world (~) or local (^) coordinates, resolved against ORIGIN since commands come from the console
+    """
+    ORIGIN = Coordinate(0.0, 0.0, 0.0)
+    INTEGER = False
+    MISSING = 'Expected a coordinate'
+
+    def __parse_one(self, reader: StringReader, origin: float, local: bool) -> float:
+        if not reader.can_read():
+            raise reader.error(self.MISSING)
+        if (reader.peek() == '^') != local:
+            raise reader.error('Cannot mix world & local coordinates (everything must either use ^ or not)')
+        relative = reader.peek() in ('~', '^')
+        if relative:
+            reader.skip()
+        if reader.can_read() and reader.peek() != ' ':
+            if self.INTEGER and not relative:
+                return reader.read_int()
+            value = reader.read_float()
+        else:
+            value = 0
+        return origin + value if relative else value
+
+    def parse(self, reader: StringReader) -> Coordinate:
+        start = reader.cursor
+        local = reader.can_read() and reader.peek() == '^'
+        values = []
+        for axis, origin in enumerate(self.ORIGIN):
+            if axis != 0:
+                if not reader.can_read() or reader.peek() != ' ':
+                    raise reader.error('Incomplete (expected 3 coordinates)', start)
+                reader.skip()
+            values.append(self.__parse_one(reader, origin, local))
+        if self.INTEGER:
+            return Coordinate(*map(lambda v: int(v // 1), values))
+        return Coordinate(*values)
+
+
+class BlockPos(Vec3):
+    INTEGER = True
+    MISSING = 'Expected a block position'
+
+
+class Entity(ArgumentNode):
+    SELECTOR_TYPES = ('p', 'a', 'r', 's', 'e')
+    __LIMIT = re.compile(r'(?:^|,)\s*limit\s*=\s*(-?\d+)')
+
+    def __init__(self, name: str, single: bool = False):
+        super(Entity, self).__init__(name)
+        self.single = single
+
+    @staticmethod
+    def __read_options(reader: StringReader) -> str:
+        start = reader.cursor
+        reader.skip()
+        while reader.can_read():
+            char = reader.peek()
+            if char in ('"', "'"):
+                reader.read_quoted_string()
+            elif char == ']':
+                reader.skip()
+                return reader.string[start + 1:reader.cursor - 1]
+            else:
+                reader.skip()
+        raise reader.error("Expected end of options", start)
+
+    def parse(self, reader: StringReader) -> EntitySelector:
+        start = reader.cursor
+        if reader.can_read() and reader.peek() == '@':
+            reader.skip()
+            kind = reader.read() if reader.can_read() else ''
+            if kind not in self.SELECTOR_TYPES:
+                raise reader.error(f"Unknown selector type '@{kind}'", start)
+            limit = None
+            if reader.can_read() and reader.peek() == '[':
+                options_start = reader.cursor + 1
+                found = self.__LIMIT.search(self.__read_options(reader))
+                limit = None if found is None else int(found.group(1))
+                if limit is not None and limit < 1:
+                    raise reader.error('Limit must be at least 1', options_start + found.start(1))
+            selector = EntitySelector(reader.string[start:reader.cursor], kind, None, limit)
+        else:
+            name = reader.read_word()
+            if len(name) == 0 or len(name) > 16:
+                try:
+                    uuid.UUID(name)
+                except ValueError:
+                    raise reader.error('Invalid name or UUID', start)
+            selector = EntitySelector(name, None, name, None)
+        if self.single and not selector.single:
+            raise reader.error('Only one entity is allowed, but the provided selector allows more than one', start)
+        return selector
+
+
+class ScoreHolder(Entity):
+    """
+    An entity selector, any score holder name, or * for every tracked holder
+    """
+    ALL = '*'
+
+    def parse(self, reader: StringReader) -> EntitySelector:
+        if reader.can_read() and reader.peek() == '@':
+            return super(ScoreHolder, self).parse(reader)
+        start = reader.cursor
+        name = reader.read_word()
+        if len(name) == 0:
+            raise reader.error('Expected a score holder', start)
+        if name == self.ALL:
+            if self.single:
+                raise reader.error('Only one entity is allowed, but the provided selector allows more than one', start)
+            return EntitySelector(name, self.ALL, None, None)
+        return EntitySelector(name, None, name, None)
+
+
+class Operation(ArgumentNode):
+    OPERATIONS = ('=', '+=', '-=', '*=', '/=', '%=', '<', '>', '><')
+
+    def parse(self, reader: StringReader) -> str:
+        start = reader.cursor
+        operation = reader.read_word()
+        if operation not in self.OPERATIONS:
+            raise reader.error('Invalid operation', start)
+        return operation
+
+
+class Json(ArgumentNode):
+    ERROR = 'Invalid chat component: {}'
+    __decoder = json.JSONDecoder()
+
+    def parse(self, reader: StringReader) -> JsonValue:
+        start = reader.cursor
+        try:
+            value, end = self.__decoder.raw_decode(reader.string, start)
+        except json.JSONDecodeError as exc:
+            raise reader.error(self.ERROR.format(exc.msg), exc.pos)
+        reader.cursor = end
+        return JsonValue(reader.string[start:end], value)
+
+
+class Time(ArgumentNode):
+    """
+    Vanilla time argument in ticks, with an optional d (day), s (second) or t (tick) unit
+    """
+    UNITS = {'d': 24000, 's': 20, 't': 1, '': 1}
+
+    def __init__(self, name: str, minimum: int = 0):
+        super(Time, self).__init__(name)
+        self.minimum = minimum
+
+    def parse(self, reader: StringReader) -> int:
+        start = reader.cursor
+        value = reader.read_float()
+        unit = reader.peek() if reader.can_read() and reader.peek() != ' ' else ''
+        if unit not in self.UNITS:
+            raise reader.error('Invalid unit')
+        if unit:
+            reader.skip()
+        ticks = round(value * self.UNITS[unit])
+        if ticks < self.minimum:
+            raise reader.error(f'Tick count must not be less than {self.minimum}, found {ticks}', start)
+        return ticks
+
+
+class ResourceLocation(ArgumentNode):
+    __ID = re.compile(r'[0-9a-z_\-.:/]*')
+
+    def parse(self, reader: StringReader) -> str:
+        start = reader.cursor
+        text = reader.read_word()
+        if self.__ID.fullmatch(text) is None or len(text) == 0 or text.count(':') > 1:
+            raise reader.error('Invalid ID', start)
+        namespace, sep, path = text.rpartition(':')
+        if '/' in namespace or len(path) == 0:
+            raise reader.error('Invalid ID', start)
+        return text if sep else f'minecraft:{text}'
+
+
+def match(root: CompiledNode, reader: StringReader) -> Tuple[Callable, List[Any]]:
+    """
+    Walk the compiled tree over the input in a single pass,
+    returning the handler of the last matched node and the parsed argument values
+    """
+    string, length = reader.string, len(reader.string)
+    node, values = root, []
+    while True:
+        start = reader.cursor
+        while start < length and string[start] == ' ':
+            start += 1
+        reader.cursor = start
+        if start >= length:
+            if node.handler is None:
+                raise reader.error(CommandSyntaxError.UNKNOWN_COMMAND)
+            return node.handler, values
+
+        word_end = string.find(' ', start)
+        if word_end < 0:
+            word_end = length
+        child = node.literals.get(string[start:word_end])
+        if child is not None:
+            reader.cursor = word_end
+            node = child
+            continue
+
+        error = None
+        for argument, child in node.arguments:
+            try:
+                value = argument.parse(reader)
+                if reader.cursor < length and string[reader.cursor] != ' ':
+                    raise reader.error(CommandSyntaxError.EXPECTED_SEPARATOR)
+            except CommandSyntaxError as exc:
+                error = error or exc
+                reader.cursor = start
+                continue
+            if argument.SPREAD:
+                values.extend(value)
+            else:
+                values.append(value)
+            node = child
+            break
+        else:
+            if error is not None:
+                raise error
+            raise reader.error(CommandSyntaxError.UNKNOWN_ARGUMENT)
@@ -0,0 +1,169 @@
+import datetime
+import gzip
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from logging.handlers import BaseRotatingHandler
+from typing import List, Optional, Tuple
+
+
+__all__ = [
+    "LogCompressor",
+    "RotatingLogHandler",
+]
+
+
+_STOP = object()
+
+
+class LogCompressor:
+    """
+    Gzip rotated logs on a background thread, then delete the oldest archives beyond the retention size
+    """
+    THREAD_NAME = 'Log Compressor'
+    ARCHIVE_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2})-(\d+)\.log(\.gz)?$')
+
+    def __init__(self, directory: str, retention_bytes: int):
+        self.directory = directory
+        self.retention_bytes = retention_bytes
+        self.__queue = queue.Queue()
+        self.__thread: Optional[threading.Thread] = None
+        self.__lock = threading.Lock()
+
+    def submit(self, path: str):
+        with self.__lock:
+            if self.__thread is None:
+                self.__thread = threading.Thread(target=self.__run, name=self.THREAD_NAME, daemon=True)
+                self.__thread.start()
+        self.__queue.put(path)
+
+    def join(self):
+        """
+        Wait until every submitted log is compressed
+        """
+        if self.__thread is not None:
+            self.__queue.join()
+
+    def stop(self):
+        with self.__lock:
+            thread, self.__thread = self.__thread, None
+        if thread is not None:
+            self.__queue.put(_STOP)
+            thread.join()
+
+    def __run(self):
+        while True:
+            path = self.__queue.get()
+            try:
+                if path is _STOP:
+                    return
+                self.compress(path)
+                self.apply_retention()
+            except OSError as exc:
+                logging.getLogger(__name__).warning('Failed to archive log %s: %s', path, exc)
+            finally:
+                self.__queue.task_done()
+
+    @staticmethod
+    def compress(path: str):
+        temp = path + '.gz.tmp'
+        with open(path, 'rb') as src, gzip.open(temp, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(temp, path + '.gz')
+        os.remove(path)
+
+    def archives(self) -> List[Tuple[str, int, str]]:
+        """
+        (date, index, file name) of archived logs, oldest first
+        """
+        result = []
+        for file_name in os.listdir(self.directory):
+            match = self.ARCHIVE_PATTERN.match(file_name)
+            if match is not None:
+                result.append((match.group(1), int(match.group(2)), file_name))
+        result.sort()
+        return result
+
+    def apply_retention(self):
+        if self.retention_bytes <= 0:
+            return
+        archives = [(file_name, os.path.getsize(os.path.join(self.directory, file_name)))
+                    for _, _, file_name in self.archives() if file_name.endswith('.gz')]
+        total = sum(size for _, size in archives)
+        for file_name, size in archives:
+            if total <= self.retention_bytes:
+                break
+            os.remove(os.path.join(self.directory, file_name))
+            total -= size
+
+
+class RotatingLogHandler(BaseRotatingHandler):
+    """
+    Vanilla style log file: everything goes to latest.log, which is archived as YYYY-MM-DD-N.log.gz
+    on startup, once it reaches max_bytes and when the date changes
+    """
+    FILE_NAME = 'latest.log'
+    # 0 disables size based rotation
+    MAX_BYTES = 16 * 1024 * 1024
+    # total size of the archives, 0 keeps all of them
+    RETENTION_BYTES = 256 * 1024 * 1024
+    ROTATE_AT_MIDNIGHT = True
+
+    def __init__(self, directory: str, max_bytes: Optional[int] = None, retention_bytes: Optional[int] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = self.MAX_BYTES if max_bytes is None else max_bytes
+        self.compressor = LogCompressor(directory, self.RETENTION_BYTES if retention_bytes is None else retention_bytes)
+        path = os.path.join(directory, self.FILE_NAME)
+        if os.path.isfile(path) and os.path.getsize(path) > 0:
+            self.__archive(path, self.__date_of(os.path.getmtime(path)))
+        super().__init__(path, 'a', encoding='UTF-8', delay=True)
+        self.__date = self.__date_of(time.time())
+        # date of the record which triggered the pending rollover, the date of the next file
+        self.__next_date = self.__date
+
+    @property
+    def retention_bytes(self) -> int:
+        return self.compressor.retention_bytes
+
+    @retention_bytes.setter
+    def retention_bytes(self, value: int):
+        self.compressor.retention_bytes = value
+
+    @staticmethod
+    def __date_of(timestamp: float) -> str:
+        return datetime.date.fromtimestamp(timestamp).isoformat()
+
+    def __archive(self, path: str, date: str):
+        taken = {index for archive_date, index, _ in self.compressor.archives() if archive_date == date}
+        index = 1
+        while index in taken:
+            index += 1
+        target = os.path.join(self.directory, f'{date}-{index}.log')
+        os.replace(path, target)
+        self.compressor.submit(target)
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        # the record date follows the logger clock, which is virtual while sprinting ticks
+        date = self.__date_of(record.created)
+        if self.ROTATE_AT_MIDNIGHT and date != self.__date:
+            self.__next_date = date
+            return True
+        # checked before writing, so a file ends after the record (or batch) crossing the threshold
+        return self.stream is not None and 0 < self.max_bytes <= self.stream.tell()
+
+    def doRollover(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        if os.path.isfile(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+            self.__archive(self.baseFilename, self.__date)
+        self.__date = self.__next_date
+
+    def close(self):
+        super().close()
+        self.compressor.stop()
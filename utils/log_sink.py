@@ -0,0 +1,180 @@
+import atexit
+import enum
+import logging
+import queue
+import threading
+from logging.handlers import BaseRotatingHandler
+from typing import Iterable, List, NamedTuple, Optional
+
+
+__all__ = [
+    "OverflowPolicy",
+    "LogSinkStats",
+    "AsyncLogSink",
+    "write_records",
+]
+
+
+_STOP = object()
+
+
+class OverflowPolicy(enum.Enum):
+    # wait for the writer thread, nothing is lost
+    BLOCK = 'block'
+    # discard the message and count it, the caller never waits
+    DROP = 'drop'
+
+
+class LogSinkStats(NamedTuple):
+    depth: int
+    peak_depth: int
+    dropped: int
+    written: int
+    batches: int
+    bytes_written: int
+
+
+class AsyncLogSink:
+    """
+    Hand log records to a dedicated writer thread, which formats them
+    and writes every batch to each handler with a single write and flush
+    """
+    QUEUE_SIZE = 8192
+    BATCH_SIZE = 1024
+    THREAD_NAME = 'Log Writer'
+
+    def __init__(self, logger: logging.Logger, queue_size: Optional[int] = None,
+                 overflow: OverflowPolicy = OverflowPolicy.BLOCK):
+        self.__logger = logger
+        self.__queue = queue.Queue(queue_size or self.QUEUE_SIZE)
+        self.overflow = overflow
+        self.__thread: Optional[threading.Thread] = None
+        self.__peak_depth = 0
+        self.__dropped = 0
+        self.__written = 0
+        self.__batches = 0
+        self.__bytes_written = 0
+
+    @property
+    def running(self) -> bool:
+        return self.__thread is not None
+
+    @property
+    def stats(self) -> LogSinkStats:
+        return LogSinkStats(
+            self.__queue.qsize(), self.__peak_depth, self.__dropped,
+            self.__written, self.__batches, self.__bytes_written
+        )
+
+    def start(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__run, name=self.THREAD_NAME, daemon=True)
+            self.__thread.start()
+            atexit.register(self.stop)
+
+    def put(self, records: List[logging.LogRecord]) -> bool:
+        """
+        Queue the records of one log call as a whole, returning False if they were dropped
+        """
+        if self.overflow == OverflowPolicy.BLOCK:
+            self.__queue.put(records)
+        else:
+            try:
+                self.__queue.put_nowait(records)
+            except queue.Full:
+                self.__dropped += len(records)
+                return False
+        depth = self.__queue.qsize()
+        if depth > self.__peak_depth:
+            self.__peak_depth = depth
+        return True
+
+    def flush(self):
+        """
+        Wait until everything queued so far has been written
+        """
+        if self.__thread is not None:
+            self.__queue.join()
+
+    def stop(self):
+        thread = self.__thread
+        if thread is not None:
+            self.__thread = None
+            self.__queue.put(_STOP)
+            thread.join()
+
+    def __run(self):
+        while True:
+            item = self.__queue.get()
+            taken, batch, stop = 1, [], False
+            while True:
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.extend(item)
+                if len(batch) >= self.BATCH_SIZE:
+                    break
+                try:
+                    item = self.__queue.get_nowait()
+                except queue.Empty:
+                    break
+                taken += 1
+            try:
+                if len(batch) != 0:
+                    self.__write(batch)
+            finally:
+                for _ in range(taken):
+                    self.__queue.task_done()
+            if stop:
+                return
+
+    def __write(self, records: List[logging.LogRecord]):
+        self.__bytes_written += write_records(self.__logger, records)
+        self.__written += len(records)
+        self.__batches += 1
+
+
+def iter_handlers(logger: logging.Logger) -> Iterable[logging.Handler]:
+    while logger is not None:
+        yield from logger.handlers
+        logger = logger.parent if logger.propagate else None
+
+
+def write_records(logger: logging.Logger, records: List[logging.LogRecord]) -> int:
+    """
+    Write the records to every handler of the logger with a single write and flush per handler,
+    returning the amount of characters written
+    """
+    written = 0
+    for handler in iter_handlers(logger):
+        # file handlers open their stream lazily
+        if getattr(handler, 'stream', None) is None and not isinstance(handler, logging.FileHandler):
+            for record in records:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+            continue
+        lines = []
+        for record in records:
+            if record.levelno >= handler.level and handler.filter(record):
+                try:
+                    lines.append(handler.format(record))
+                except Exception:
+                    handler.handleError(record)
+        if len(lines) == 0:
+            continue
+        terminator = getattr(handler, 'terminator', '\n')
+        text = terminator.join(lines) + terminator
+        handler.acquire()
+        try:
+            if isinstance(handler, BaseRotatingHandler) and handler.shouldRollover(records[-1]):
+                handler.doRollover()
+            if handler.stream is None:
+                handler.stream = handler._open()
+            handler.stream.write(text)
+            handler.flush()
+        except Exception:
+            handler.handleError(records[-1])
+        finally:
+            handler.release()
+        written += len(text)
+    return written
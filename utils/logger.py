@@ -1,15 +1,24 @@
 import logging
 import re
-import os
 import enum
-from typing import Union, Optional
+from typing import Callable, List, Tuple, Union, Optional
 from mcdreforged.api.types import MCDReforgedLogger, SyncStdoutStreamHandler, Version
 from mcdreforged.api.rtext import *
 from colorlog import ColoredFormatter
 from threading import local
 from contextlib import contextmanager
+from contextvars import ContextVar
+from utils.log_rotation import RotatingLogHandler
+from utils.log_sink import AsyncLogSink, LogSinkStats, OverflowPolicy, write_records
+from utils.profiler import get_profiler
 
-LOG_FILE = 'logs/dummy_server.log'
+LOG_DIR = 'logs'
+
+MC_CODE_PATTERN = re.compile('§[a-z0-9]')
+CONSOLE_CODE_PATTERN = re.compile(r'\033\[(\d+(;\d+)?)?m')
+
+# (messages, echo) of DummyServerLogger.capture(), follows the context into coroutines the command awaits
+_CAPTURED: ContextVar[Optional[Tuple[List[str], bool]]] = ContextVar('captured', default=None)
 
 
 class MCColoredFormatter(ColoredFormatter):
@@ -18,12 +27,18 @@ class MCColoredFormatter(ColoredFormatter):
     else:
         MC_CODE_ITEMS = list(
             filter(lambda item: isinstance(item, RColor) or isinstance(item, RStyle), list(RColor) + list(RStyle)))
+    # minecraft code -> console code, unknown codes are translated to nothing
+    MC_CODE_TABLE = {item.mc_code: item.console_code for item in MC_CODE_ITEMS}
 
     # global flag
     console_color_disabled = False
 
     __TLS = local()
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__escape_code_cache = {}
+
     @classmethod
     @contextmanager
     def disable_minecraft_color_code_transform(cls):
@@ -45,17 +60,44 @@ class MCColoredFormatter(ColoredFormatter):
     def __set_mc_code_trans_disable(cls, state: bool):
         cls.__TLS.mc_code_trans = state
 
+    @classmethod
+    def capture_mc_code_trans_state(cls, record: logging.LogRecord):
+        """
+        Store the thread local state on the record, for records formatted by another thread
+        """
+        record.mc_code_trans_disabled = cls.__is_mc_code_trans_disabled()
+
+    def _escape_code_map(self, item: str):
+        # colorlog rebuilds the whole escape code table for every record, while it only depends on the level
+        key = (item, self._colorize())
+        codes = self.__escape_code_cache.get(key)
+        if codes is None:
+            codes = self.__escape_code_cache[key] = super()._escape_code_map(item)
+        return codes
+
+    def __translate_code(self, match: re.Match) -> str:
+        return self.MC_CODE_TABLE.get(match.group(), '')
+
+    def __translate_sequentially(self, text: str) -> str:
+        for item in self.MC_CODE_ITEMS:
+            if item.mc_code in text:
+                text = text.replace(item.mc_code, item.console_code)
+        return clean_minecraft_color_code(text)
+
     def formatMessage(self, record):
         text = super().formatMessage(record)
-        if not self.__is_mc_code_trans_disabled():
-            # minecraft code -> console code
-            for item in self.MC_CODE_ITEMS:
-                if item.mc_code in text:
-                    text = text.replace(item.mc_code, item.console_code)
-            # clean the rest of minecraft codes
-            text = clean_minecraft_color_code(text)
-        if self.console_color_disabled:
-            text = clean_console_color_code(text)
+        disabled = getattr(record, 'mc_code_trans_disabled', None)
+        if disabled is None:
+            disabled = self.__is_mc_code_trans_disabled()
+        if '§' in text and not disabled:
+            if '§§' in text:
+                # dropping a code here may join the leading § with the following character into a new code,
+                # which only item-by-item replacement reproduces
+                text = self.__translate_sequentially(text)
+            else:
+                text = MC_CODE_PATTERN.sub(self.__translate_code, text)
+        if self.console_color_disabled and '\033' in text:
+            text = CONSOLE_CODE_PATTERN.sub('', text)
         return text
 
 
@@ -70,6 +112,7 @@ class DummyServerLogger(MCDReforgedLogger):
 
     VERBOSE = True
     SPLIT_LOG = True
+    ASYNC_LOG = False
 
     LOG_COLORS = {
         'DEBUG': 'white',
@@ -107,6 +150,99 @@ class DummyServerLogger(MCDReforgedLogger):
         super(DummyServerLogger, self).__init__(self.DEFAULT_NAME)
         self.console_handler.setFormatter(self.__console_formatter)
         self.setLevel(logging.DEBUG)
+        self.file_handler: Optional[logging.FileHandler] = None
+        # replaces the wall clock for record timestamps, e.g. the virtual clock of the tick scheduler
+        self.time_source: Optional[Callable[[], float]] = None
+        self.__sink: Optional[AsyncLogSink] = None
+        self.__batch = local()
+        if self.ASYNC_LOG:
+            self.enable_async()
+
+    def enable_async(self, queue_size: Optional[int] = None, overflow: OverflowPolicy = OverflowPolicy.BLOCK):
+        if self.__sink is None:
+            sink = AsyncLogSink(self, queue_size, overflow)
+            sink.start()
+            self.__sink = sink
+
+    def disable_async(self):
+        """
+        Write everything still queued and go back to writing on the calling thread
+        """
+        sink, self.__sink = self.__sink, None
+        if sink is not None:
+            sink.stop()
+
+    def flush(self):
+        if self.__sink is not None:
+            self.__sink.flush()
+
+    @property
+    def sink_stats(self) -> Optional[LogSinkStats]:
+        return None if self.__sink is None else self.__sink.stats
+
+    @contextmanager
+    def batch(self):
+        """
+        Collect the records logged by the current thread in the block and write them as one batch
+        """
+        if getattr(self.__batch, 'records', None) is not None:
+            yield
+            return
+        self.__batch.records = records = []
+        try:
+            yield
+        finally:
+            self.__batch.records = None
+            if len(records) != 0:
+                sink = self.__sink
+                if sink is not None:
+                    sink.put(records)
+                else:
+                    write_records(self, records)
+
+    @contextmanager
+    def capture(self, echo: bool = False):
+        """
+        Collect the plain text of the messages logged in the block instead of writing them,
+        e.g. the reply to a RCON command. Errors are written as well, and everything with echo
+        """
+        lines = []
+        token = _CAPTURED.set((lines, echo))
+        try:
+            yield lines
+        finally:
+            _CAPTURED.reset(token)
+
+    def handle(self, record: logging.LogRecord):
+        captured = _CAPTURED.get()
+        if captured is not None:
+            lines, echo = captured
+            lines.append(clean_minecraft_color_code(clean_console_color_code(record.getMessage())))
+            if not echo and record.levelno < logging.ERROR:
+                return
+        profiler = get_profiler()
+        if profiler.running:
+            profiler.record_log(record.getMessage())
+        sink = self.__sink
+        pending = getattr(self.__batch, 'records', None)
+        if sink is None and pending is None:
+            return super().handle(record)
+        if self.disabled or not self.filter(record):
+            return
+        # formatted later, possibly by the log writer thread
+        MCColoredFormatter.capture_mc_code_trans_state(record)
+        if pending is not None:
+            pending.append(record)
+        else:
+            sink.put([record])
+
+    def makeRecord(self, *args, **kwargs) -> logging.LogRecord:
+        record = super().makeRecord(*args, **kwargs)
+        if self.time_source is not None:
+            created = self.time_source()
+            record.created = created
+            record.msecs = int((created - int(created)) * 1000) + 0.0
+        return record
 
     def debug(self, *args):
         if self.VERBOSE:
@@ -121,13 +257,19 @@ class DummyServerLogger(MCDReforgedLogger):
         self.addHandler(self.file_handler)
     """
 
+    def set_file_handler(self, handler: logging.FileHandler):
+        if self.file_handler is not None:
+            self.removeHandler(self.file_handler)
+            self.file_handler.close()
+        handler.setFormatter(self.FILE_FMT)
+        self.file_handler = handler
+        self.addHandler(handler)
+
     @classmethod
     def get_instance(cls):
         if cls.__gl_instance is None:
             cls.__gl_instance = cls()
-            if not os.path.isdir(os.path.dirname(LOG_FILE)):
-                os.makedirs(os.path.dirname(LOG_FILE))
-            cls.__gl_instance.set_file(LOG_FILE)
+            cls.__gl_instance.set_file_handler(RotatingLogHandler(LOG_DIR))
         return cls.__gl_instance
 
     def _log(self, level: int, msg: object, *args, **kwargs) -> None:
@@ -136,8 +278,13 @@ class DummyServerLogger(MCDReforgedLogger):
         elif not isinstance(msg, str):
             msg = str(msg)
         if self.SPLIT_LOG:
-            for line in msg.splitlines():
-                super()._log(level, line, *args, **kwargs)
+            lines = msg.splitlines()
+            if len(lines) == 1:
+                return super()._log(level, lines[0], *args, **kwargs)
+            # write all lines of the message as one batch
+            with self.batch():
+                for line in lines:
+                    super()._log(level, line, *args, **kwargs)
         else:
             super()._log(level, msg, *args, **kwargs)
 
@@ -151,8 +298,9 @@ def log(msg: Union[RTextBase, str]):
 
 
 def clean_minecraft_color_code(text):
-    return re.sub('§[a-z0-9]', '', str(text))
+    text = str(text)
+    return MC_CODE_PATTERN.sub('', text) if '§' in text else text
 
 
 def clean_console_color_code(text):
-    return re.sub(r'\033\[(\d+(;\d+)?)?m', '', text)
+    return CONSOLE_CODE_PATTERN.sub('', text) if '\033' in text else text
@@ -0,0 +1,654 @@
+import math
+import re
+from decimal import Decimal
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.grammar import ArgumentNode, CommandSyntaxError, StringReader
+
+
+__all__ = [
+    "Byte",
+    "Short",
+    "Int",
+    "Long",
+    "Float",
+    "Double",
+    "ByteArray",
+    "IntArray",
+    "LongArray",
+    "tag_name",
+    "matches",
+    "same_tag",
+    "copy_tag",
+    "to_snbt",
+    "parse_snbt",
+    "SnbtParser",
+    "PathNode",
+    "NbtPath",
+    "compile_path",
+    "NbtPathArgument",
+    "CompoundArgument",
+    "TagArgument",
+]
+
+
+# The typed value model: numbers are int / float subclasses tagged with their NBT type,
+# strings, lists and compounds are the plain str, list and dict.
+# Untagged int and float values are treated as Int and Double
+
+class Byte(int):
+    __slots__ = ()
+
+
+class Short(int):
+    __slots__ = ()
+
+
+class Int(int):
+    __slots__ = ()
+
+
+class Long(int):
+    __slots__ = ()
+
+
+class Float(float):
+    __slots__ = ()
+
+
+class Double(float):
+    __slots__ = ()
+
+
+class ByteArray(list):
+    __slots__ = ()
+
+
+class IntArray(list):
+    __slots__ = ()
+
+
+class LongArray(list):
+    __slots__ = ()
+
+
+TAG_NAMES = {
+    Byte: 'TAG_Byte', bool: 'TAG_Byte', Short: 'TAG_Short', Int: 'TAG_Int', int: 'TAG_Int', Long: 'TAG_Long',
+    Float: 'TAG_Float', Double: 'TAG_Double', float: 'TAG_Double', str: 'TAG_String', list: 'TAG_List',
+    dict: 'TAG_Compound', ByteArray: 'TAG_Byte_Array', IntArray: 'TAG_Int_Array', LongArray: 'TAG_Long_Array',
+}
+
+
+def tag_name(value: Any) -> str:
+    return TAG_NAMES[type(value)]
+
+
+_SIMPLE_KEY = re.compile(r'[A-Za-z0-9._+\-]+')
+
+
+def quote_string(text: str) -> str:
+    """
+    Vanilla string quoting: double quotes unless the text contains a double quote before any single quote
+    """
+    if '"' not in text and '\\' not in text:
+        return f'"{text}"'
+    quote = None
+    result = []
+    for char in text:
+        if char == '\\':
+            result.append('\\')
+        elif char == '"' or char == "'":
+            if quote is None:
+                quote = "'" if char == '"' else '"'
+            if char == quote:
+                result.append('\\')
+        result.append(char)
+    quote = quote or '"'
+    return quote + ''.join(result) + quote
+
+
+@lru_cache(maxsize=4096)
+def quote_key(key: str) -> str:
+    return key if _SIMPLE_KEY.fullmatch(key) is not None else quote_string(key)
+
+
+def format_decimal(value: float) -> str:
+    """
+    Java's Double.toString, which switches to the computerized scientific notation outside [1e-3, 1e7)
+    """
+    if math.isnan(value):
+        return 'NaN'
+    if math.isinf(value):
+        return 'Infinity' if value > 0 else '-Infinity'
+    if value == 0 or 1e-3 <= abs(value) < 1e7:
+        # repr only switches to exponents below 1e-4 or from 1e16 on
+        return repr(value)
+    sign, digits, exponent = Decimal(repr(value)).as_tuple()
+    exponent += len(digits) - 1
+    mantissa = ''.join(map(str, digits)).rstrip('0') or '0'
+    return f"{'-' if sign else ''}{mantissa[0]}.{mantissa[1:] or '0'}E{exponent}"
+
+
+def _compound(value: dict) -> str:
+    return '{' + ', '.join([f'{quote_key(key)}: {to_snbt(item)}' for key, item in value.items()]) + '}'
+
+
+def _list(value: list) -> str:
+    return '[' + ', '.join([to_snbt(item) for item in value]) + ']'
+
+
+def _array(prefix: str, suffix: str) -> Callable[[list], str]:
+    def write(value: list) -> str:
+        if len(value) == 0:
+            return f'[{prefix};]'
+        return f'[{prefix}; ' + ', '.join([f'{int.__repr__(item)}{suffix}' for item in value]) + ']'
+    return write
+
+
+_WRITERS: Dict[type, Callable[[Any], str]] = {
+    dict: _compound,
+    list: _list,
+    str: quote_string,
+    Int: int.__repr__,
+    int: int.__repr__,
+    Byte: lambda value: f'{int.__repr__(value)}b',
+    bool: lambda value: '1b' if value else '0b',
+    Short: lambda value: f'{int.__repr__(value)}s',
+    Long: lambda value: f'{int.__repr__(value)}L',
+    Float: lambda value: f'{format_decimal(value)}f',
+    Double: lambda value: f'{format_decimal(value)}d',
+    float: lambda value: f'{format_decimal(value)}d',
+    ByteArray: _array('B', 'b'),
+    IntArray: _array('I', ''),
+    LongArray: _array('L', 'L'),
+}
+
+
+def to_snbt(value: Any) -> str:
+    """
+    Vanilla SNBT of a value, as shown by the data command
+    """
+    writer = _WRITERS.get(type(value))
+    if writer is None:
+        raise TypeError(f'{type(value).__name__} is not an NBT value')
+    return writer(value)
+
+
+class SnbtParser:
+    """
+    Vanilla TagParser over a StringReader, so errors point at the command input
+    """
+    __NUMBER_PATTERNS: List[Tuple[Any, Callable[[str], Any]]] = [
+        (re.compile(r'[-+]?(?:[0-9]+[.]|[0-9]*[.][0-9]+)(?:e[-+]?[0-9]+)?f', re.I), lambda text: Float(float(text[:-1]))),
+        (re.compile(r'[-+]?(?:0|[1-9][0-9]*)b', re.I), lambda text: Byte(_ranged(text[:-1], 8))),
+        (re.compile(r'[-+]?(?:0|[1-9][0-9]*)l', re.I), lambda text: Long(_ranged(text[:-1], 64))),
+        (re.compile(r'[-+]?(?:0|[1-9][0-9]*)s', re.I), lambda text: Short(_ranged(text[:-1], 16))),
+        (re.compile(r'[-+]?(?:0|[1-9][0-9]*)', re.I), lambda text: Int(_ranged(text, 32))),
+        (re.compile(r'[-+]?(?:[0-9]+[.]|[0-9]*[.][0-9]+)(?:e[-+]?[0-9]+)?d', re.I), lambda text: Double(float(text[:-1]))),
+        (re.compile(r'[-+]?(?:[0-9]+[.]|[0-9]*[.][0-9]+)(?:e[-+]?[0-9]+)?', re.I), lambda text: Double(float(text))),
+    ]
+    ARRAY_TYPES = {'B': (ByteArray, Byte), 'I': (IntArray, Int), 'L': (LongArray, Long)}
+
+    def __init__(self, reader: StringReader):
+        self.reader = reader
+
+    def __expect(self, char: str):
+        self.reader.skip_whitespace()
+        if not self.reader.can_read() or self.reader.peek() != char:
+            raise self.reader.error(f"Expected '{char}'")
+        self.reader.skip()
+
+    def __has_element_separator(self) -> bool:
+        reader = self.reader
+        reader.skip_whitespace()
+        if reader.can_read() and reader.peek() == ',':
+            reader.skip()
+            reader.skip_whitespace()
+            return True
+        return False
+
+    def read_value(self) -> Any:
+        reader = self.reader
+        reader.skip_whitespace()
+        if not reader.can_read():
+            raise reader.error('Expected value')
+        char = reader.peek()
+        if char == '{':
+            return self.read_compound()
+        if char == '[':
+            return self.read_list()
+        return self.read_primitive()
+
+    def read_compound(self) -> dict:
+        reader = self.reader
+        self.__expect('{')
+        result = {}
+        reader.skip_whitespace()
+        while reader.can_read() and reader.peek() != '}':
+            start = reader.cursor
+            key = reader.read_string()
+            if len(key) == 0 and reader.cursor == start:
+                raise reader.error('Expected key')
+            self.__expect(':')
+            result[key] = self.read_value()
+            if not self.__has_element_separator():
+                break
+            if not reader.can_read():
+                raise reader.error('Expected key')
+        self.__expect('}')
+        return result
+
+    def read_list(self) -> list:
+        reader = self.reader
+        if reader.can_read(3) and reader.peek(1) in self.ARRAY_TYPES and reader.peek(2) == ';':
+            return self.__read_array()
+        self.__expect('[')
+        result = []
+        kind = None
+        reader.skip_whitespace()
+        while reader.can_read() and reader.peek() != ']':
+            start = reader.cursor
+            value = self.read_value()
+            if kind is None:
+                kind = tag_name(value)
+            elif tag_name(value) != kind:
+                raise reader.error(f"Can't insert {tag_name(value)} into list of {kind}", start)
+            result.append(value)
+            if not self.__has_element_separator():
+                break
+            if not reader.can_read():
+                raise reader.error('Expected value')
+        self.__expect(']')
+        return result
+
+    def __read_array(self) -> list:
+        reader = self.reader
+        reader.skip()
+        array_type, element_type = self.ARRAY_TYPES[reader.read()]
+        reader.skip()
+        result = array_type()
+        reader.skip_whitespace()
+        while reader.can_read() and reader.peek() != ']':
+            start = reader.cursor
+            value = self.read_value()
+            if type(value) is not element_type:
+                raise reader.error(f"Can't insert {tag_name(value)} into {TAG_NAMES[array_type]}", start)
+            result.append(value)
+            if not self.__has_element_separator():
+                break
+            if not reader.can_read():
+                raise reader.error('Expected value')
+        self.__expect(']')
+        return result
+
+    def read_primitive(self) -> Any:
+        reader = self.reader
+        reader.skip_whitespace()
+        if reader.can_read() and reader.peek() in ('"', "'"):
+            return reader.read_quoted_string()
+        start = reader.cursor
+        text = reader.read_unquoted_string()
+        if len(text) == 0:
+            raise reader.error('Expected value', start)
+        return self.type_primitive(text)
+
+    @classmethod
+    def type_primitive(cls, text: str) -> Any:
+        for pattern, convert in cls.__NUMBER_PATTERNS:
+            if pattern.fullmatch(text) is not None:
+                try:
+                    return convert(text)
+                except ValueError:
+                    # out of range numbers are plain strings, like vanilla
+                    break
+        if text == 'true':
+            return Byte(1)
+        if text == 'false':
+            return Byte(0)
+        return text
+
+
+def _ranged(text: str, bits: int) -> int:
+    value = int(text)
+    limit = 1 << (bits - 1)
+    if not -limit <= value < limit:
+        raise ValueError(f'{text} out of range')
+    return value
+
+
+def parse_snbt(text: str) -> Any:
+    reader = StringReader(text)
+    value = SnbtParser(reader).read_value()
+    reader.skip_whitespace()
+    if reader.can_read():
+        raise reader.error('Unexpected trailing data')
+    return value
+
+
+def matches(pattern: Any, value: Any) -> bool:
+    """
+    Vanilla partial NBT comparison used by path filters:
+    compounds match on the keys of the pattern, lists when every pattern element matches some element
+    """
+    if isinstance(pattern, dict):
+        if type(value) is not dict:
+            return False
+        for key, item in pattern.items():
+            if key not in value or not matches(item, value[key]):
+                return False
+        return True
+    if type(pattern) is list:
+        if type(value) is not list:
+            return False
+        if len(pattern) == 0:
+            return len(value) == 0
+        return all(any(matches(item, element) for element in value) for item in pattern)
+    return tag_name(pattern) == tag_name(value) and pattern == value
+
+
+_ARRAYS = {ByteArray: Byte, IntArray: Int, LongArray: Long}
+_SEQUENCES = (list, ByteArray, IntArray, LongArray)
+
+
+def same_tag(a: Any, b: Any) -> bool:
+    return tag_name(a) == tag_name(b) and a == b
+
+
+def copy_tag(value: Any) -> Any:
+    """
+    Deep copy of the containers of a value, numbers and strings are immutable and shared
+    """
+    kind = type(value)
+    if kind is dict:
+        return {key: copy_tag(item) for key, item in value.items()}
+    if kind is list:
+        return [copy_tag(item) for item in value]
+    if kind in _ARRAYS:
+        return kind(value)
+    return value
+
+
+def _accepts(sequence: list, value: Any) -> bool:
+    element_type = _ARRAYS.get(type(sequence))
+    if element_type is not None:
+        return type(value) is element_type
+    return len(sequence) == 0 or tag_name(sequence[0]) == tag_name(value)
+
+
+class PathNode:
+    """
+    One element of an NBT path. Besides reading, nodes locate the slots a write goes to,
+    so writers can copy the containers along the way
+    """
+    __slots__ = ()
+
+    def get(self, value: Any, result: List[Any]):
+        raise NotImplementedError
+
+    def slots(self, parent: Any, create: Optional[Callable[[], Any]]) -> List[Any]:
+        """
+        Keys or indexes of the children of parent matched by this node, creating a missing child with create if given
+        """
+        raise NotImplementedError
+
+    def set(self, parent: Any, value: Any) -> int:
+        """
+        Set the matched children of parent to copies of value, returning the number of changed tags
+        """
+        changed = 0
+        for slot in self.slots(parent, None):
+            if not same_tag(parent[slot], value):
+                parent[slot] = copy_tag(value)
+                changed += 1
+        return changed
+
+    @staticmethod
+    def new_parent() -> Any:
+        return []
+
+
+class KeyNode(PathNode):
+    __slots__ = ('key', 'pattern')
+
+    def __init__(self, key: str, pattern: Optional[dict]):
+        self.key = key
+        self.pattern = pattern
+
+    def get(self, value: Any, result: List[Any]):
+        if type(value) is dict and self.key in value:
+            child = value[self.key]
+            if self.pattern is None or matches(self.pattern, child):
+                result.append(child)
+
+    def slots(self, parent: Any, create: Optional[Callable[[], Any]]) -> List[Any]:
+        if type(parent) is not dict:
+            return []
+        if self.key not in parent:
+            if create is None or self.pattern is not None:
+                return []
+            parent[self.key] = create()
+        elif self.pattern is not None and not matches(self.pattern, parent[self.key]):
+            return []
+        return [self.key]
+
+    def set(self, parent: Any, value: Any) -> int:
+        if type(parent) is not dict or self.pattern is not None:
+            return super(KeyNode, self).set(parent, value)
+        if self.key in parent and same_tag(parent[self.key], value):
+            return 0
+        parent[self.key] = copy_tag(value)
+        return 1
+
+    @staticmethod
+    def new_parent() -> Any:
+        return {}
+
+
+class IndexNode(PathNode):
+    __slots__ = ('index',)
+
+    def __init__(self, index: int):
+        self.index = index
+
+    def get(self, value: Any, result: List[Any]):
+        if isinstance(value, _SEQUENCES) and -len(value) <= self.index < len(value):
+            result.append(value[self.index])
+
+    def slots(self, parent: Any, create: Optional[Callable[[], Any]]) -> List[Any]:
+        if isinstance(parent, _SEQUENCES) and -len(parent) <= self.index < len(parent):
+            return [self.index % len(parent)]
+        return []
+
+    def set(self, parent: Any, value: Any) -> int:
+        if not isinstance(parent, _SEQUENCES) or not _accepts(parent, value):
+            return 0
+        return super(IndexNode, self).set(parent, value)
+
+
+class ElementsNode(PathNode):
+    __slots__ = ('pattern',)
+
+    def __init__(self, pattern: Optional[dict]):
+        self.pattern = pattern
+
+    def get(self, value: Any, result: List[Any]):
+        if isinstance(value, _SEQUENCES):
+            if self.pattern is None:
+                result.extend(value)
+            else:
+                result.extend(element for element in value if matches(self.pattern, element))
+
+    def slots(self, parent: Any, create: Optional[Callable[[], Any]]) -> List[Any]:
+        if not isinstance(parent, _SEQUENCES):
+            return []
+        if self.pattern is None:
+            return list(range(len(parent)))
+        return [index for index, element in enumerate(parent) if matches(self.pattern, element)]
+
+    def set(self, parent: Any, value: Any) -> int:
+        if not isinstance(parent, _SEQUENCES) or not _accepts(parent, value):
+            return 0
+        return super(ElementsNode, self).set(parent, value)
+
+
+class RootNode(PathNode):
+    """
+    A {...} filter on the root compound itself
+    """
+    __slots__ = ('pattern',)
+
+    def __init__(self, pattern: dict):
+        self.pattern = pattern
+
+    def get(self, value: Any, result: List[Any]):
+        if matches(self.pattern, value):
+            result.append(value)
+
+    def slots(self, parent: Any, create: Optional[Callable[[], Any]]) -> List[Any]:
+        raise TypeError('The root filter has no slots')
+
+    def set(self, parent: Any, value: Any) -> int:
+        return 0
+
+
+class NbtPath:
+    """
+    A compiled NBT path like Inventory[0].id or Attributes[{Name:"minecraft:generic.movement_speed"}].Base
+    """
+    INVALID_ELEMENT = 'Invalid NBT path element'
+    __KEY = re.compile(r'''[^ "'\[\]{}.]*''')
+
+    def __init__(self, raw: str, nodes: Tuple[PathNode, ...]):
+        self.raw = raw
+        self.nodes = nodes
+
+    def __str__(self):
+        return self.raw
+
+    def __repr__(self):
+        return f'NbtPath({self.raw!r})'
+
+    def get(self, root: Any) -> List[Any]:
+        values = [root]
+        for node in self.nodes:
+            result = []
+            for value in values:
+                node.get(value, result)
+            if len(result) == 0:
+                return result
+            values = result
+        return values
+
+    @classmethod
+    def parse(cls, reader: StringReader) -> 'NbtPath':
+        start = reader.cursor
+        nodes = []
+        root = True
+        while reader.can_read() and reader.peek() != ' ':
+            nodes.append(cls.__read_node(reader, root))
+            root = False
+            if reader.can_read() and reader.peek() not in (' ', '[', '{'):
+                if reader.peek() != '.':
+                    raise reader.error("Expected '.'")
+                reader.skip()
+        if root:
+            raise reader.error(cls.INVALID_ELEMENT, start)
+        return cls(reader.string[start:reader.cursor], tuple(nodes))
+
+    @classmethod
+    def __read_node(cls, reader: StringReader, root: bool) -> PathNode:
+        char = reader.peek()
+        if char == '{':
+            if not root:
+                raise reader.error(cls.INVALID_ELEMENT)
+            return RootNode(SnbtParser(reader).read_compound())
+        if char == '[':
+            reader.skip()
+            if not reader.can_read():
+                raise reader.error(cls.INVALID_ELEMENT)
+            char = reader.peek()
+            if char == ']':
+                reader.skip()
+                return ElementsNode(None)
+            if char == '{':
+                pattern = SnbtParser(reader).read_compound()
+                node = ElementsNode(pattern)
+            else:
+                node = IndexNode(reader.read_int())
+            if not reader.can_read() or reader.peek() != ']':
+                raise reader.error("Expected ']'")
+            reader.skip()
+            return node
+        start = reader.cursor
+        if char in ('"', "'"):
+            key = reader.read_quoted_string()
+        else:
+            key = cls.__KEY.match(reader.string, reader.cursor).group()
+            reader.cursor += len(key)
+            if len(key) == 0:
+                raise reader.error(cls.INVALID_ELEMENT, start)
+        pattern = None
+        if reader.can_read() and reader.peek() == '{':
+            pattern = SnbtParser(reader).read_compound()
+        return KeyNode(key, pattern)
+
+
+@lru_cache(maxsize=1024)
+def compile_path(expression: str) -> NbtPath:
+    """
+    Compiled path of an expression, cached since the same paths are queried over and over
+    """
+    reader = StringReader(expression)
+    path = NbtPath.parse(reader)
+    if reader.can_read():
+        raise reader.error(CommandSyntaxError.EXPECTED_SEPARATOR)
+    return path
+
+
+class NbtPathArgument(ArgumentNode):
+    def parse(self, reader: StringReader) -> NbtPath:
+        start = reader.cursor
+        end = self.__token_end(reader.string, start)
+        try:
+            path = compile_path(reader.string[start:end])
+        except CommandSyntaxError as exc:
+            raise reader.error(exc.message, start + max(exc.cursor, 0))
+        reader.cursor = end
+        return path
+
+    @staticmethod
+    def __token_end(string: str, cursor: int) -> int:
+        """
+        End of the path, spaces only count outside of quotes, brackets and braces
+        """
+        depth, quote, escaped = 0, None, False
+        while cursor < len(string):
+            char = string[cursor]
+            if quote is not None:
+                if escaped:
+                    escaped = False
+                elif char == '\\':
+                    escaped = True
+                elif char == quote:
+                    quote = None
+            elif char in ('"', "'"):
+                quote = char
+            elif char in ('[', '{'):
+                depth += 1
+            elif char in (']', '}'):
+                depth -= 1
+            elif char == ' ' and depth <= 0:
+                break
+            cursor += 1
+        return cursor
+
+
+class CompoundArgument(ArgumentNode):
+    def parse(self, reader: StringReader) -> dict:
+        return SnbtParser(reader).read_compound()
+
+
+class TagArgument(ArgumentNode):
+    def parse(self, reader: StringReader) -> Any:
+        return SnbtParser(reader).read_value()
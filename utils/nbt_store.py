@@ -0,0 +1,147 @@
+import threading
+from typing import Any, Dict, FrozenSet, List, Optional
+
+from utils.nbt import NbtPath, KeyNode, RootNode, copy_tag, matches, same_tag, to_snbt
+
+
+__all__ = [
+    "NbtTemplate",
+    "CowCompound",
+]
+
+
+class NbtTemplate:
+    """
+    Read-only compound shared by many copy-on-write compounds, e.g. the data every simulated player starts with
+    """
+
+    def __init__(self, data: dict):
+        self.data = data
+        self.shared: FrozenSet[int] = frozenset(self.__containers(data))
+
+    @staticmethod
+    def __containers(data: Any) -> List[int]:
+        result, tasks = [], [data]
+        while len(tasks) != 0:
+            value = tasks.pop()
+            result.append(id(value))
+            if type(value) is dict:
+                tasks.extend(item for item in value.values() if isinstance(item, (dict, list)))
+            elif isinstance(value, list):
+                tasks.extend(item for item in value if isinstance(item, (dict, list)))
+        return result
+
+    def create(self, **overrides: Any) -> 'CowCompound':
+        """
+        A new compound on top of the template, with its own copies of the overridden top level values
+        """
+        return CowCompound(self, overrides)
+
+    def restore(self, data: dict) -> 'CowCompound':
+        """
+        A compound taking over data, e.g. loaded from the world, which shares nothing with the template
+        """
+        return CowCompound(self, root=data)
+
+
+class CowCompound:
+    """
+    Copy-on-write compound over a template. Reads go to the shared containers,
+    a write first copies the containers along its path, so an entity only owns the subtrees it changed.
+    The rendered SNBT is cached until the next change
+    """
+    __slots__ = ('__template', '__root', '__snbt', '__lock')
+
+    def __init__(self, template: NbtTemplate, overrides: Optional[Dict[str, Any]] = None, root: Optional[dict] = None):
+        self.__template = template
+        self.__root = template.data if root is None else root
+        if overrides:
+            self.__root = dict(self.__root)
+            for key, value in overrides.items():
+                self.__root[key] = copy_tag(value)
+        self.__snbt: Optional[str] = None
+        self.__lock = threading.Lock()
+
+    @property
+    def data(self) -> dict:
+        """
+        The current compound, which must be treated as read-only
+        """
+        return self.__root
+
+    @property
+    def materialized(self) -> bool:
+        return self.__root is not self.__template.data
+
+    def get(self, path: NbtPath) -> List[Any]:
+        with self.__lock:
+            return path.get(self.__root)
+
+    def snbt(self) -> str:
+        snbt = self.__snbt
+        if snbt is None:
+            with self.__lock:
+                if self.__snbt is None:
+                    self.__snbt = to_snbt(self.__root)
+                snbt = self.__snbt
+        return snbt
+
+    def __own(self, value: Any) -> Any:
+        if id(value) in self.__template.shared:
+            return type(value)(value)
+        return value
+
+    def merge(self, compound: dict) -> bool:
+        """
+        Vanilla data merge: compounds are merged recursively, everything else is replaced.
+        Returns whether anything changed
+        """
+        with self.__lock:
+            root = self.__own(self.__root)
+            changed = self.__merge(root, compound)
+            if changed:
+                self.__root = root
+                self.__snbt = None
+        return changed
+
+    def __merge(self, target: dict, source: dict) -> bool:
+        changed = False
+        for key, value in source.items():
+            current = target.get(key)
+            if type(value) is dict and type(current) is dict:
+                owned = self.__own(current)
+                if self.__merge(owned, value):
+                    target[key] = owned
+                    changed = True
+            elif key not in target or not same_tag(current, value):
+                target[key] = copy_tag(value)
+                changed = True
+        return changed
+
+    def set(self, path: NbtPath, value: Any) -> int:
+        """
+        Vanilla data modify ... set: creates the missing compounds along the path and
+        sets every matched tag to value. Returns the number of changed tags
+        """
+        nodes = path.nodes
+        with self.__lock:
+            root = self.__own(self.__root)
+            parents = [root]
+            if isinstance(nodes[0], RootNode):
+                if len(nodes) == 1 or not matches(nodes[0].pattern, root):
+                    return 0
+                nodes = nodes[1:]
+            for node, following in zip(nodes, nodes[1:]):
+                create = following.new_parent if isinstance(node, KeyNode) else None
+                children = []
+                for parent in parents:
+                    for slot in node.slots(parent, create):
+                        child = parent[slot] = self.__own(parent[slot])
+                        children.append(child)
+                parents = children
+            changed = sum(nodes[-1].set(parent, value) for parent in parents)
+            # an owned root may have gained empty parents even if the value itself was rejected
+            if changed or root is self.__root:
+                self.__root = root
+                self.__snbt = None
+        return changed
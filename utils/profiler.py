@@ -0,0 +1,305 @@
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+
+__all__ = [
+    "LatencyHistogram",
+    "ProfileResults",
+    "Profiler",
+    "get_profiler",
+]
+
+
+# (file name, first line, function name) of a sampled frame
+FunctionKey = Tuple[str, int, str]
+
+
+class LatencyHistogram:
+    """
+    Latencies in logarithmic buckets, BUCKETS_PER_DOUBLING per power of two microseconds,
+    so percentiles are estimated within about a fifth of their value whatever the range
+    """
+    BUCKETS_PER_DOUBLING = 4
+
+    __slots__ = ('count', 'total', 'max', '__buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.__buckets: List[int] = []
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count != 0 else 0.0
+
+    def add(self, seconds: float):
+        index = int(math.log2(max(seconds * 1e6, 1.0)) * self.BUCKETS_PER_DOUBLING)
+        if index >= len(self.__buckets):
+            self.__buckets.extend([0] * (index + 1 - len(self.__buckets)))
+        self.__buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction: float) -> float:
+        """
+        Upper bound in seconds of the bucket holding the given fraction of the values
+        """
+        rank = fraction * self.count
+        seen = 0
+        for index, amount in enumerate(self.__buckets):
+            seen += amount
+            if amount != 0 and seen >= rank:
+                return min(2 ** ((index + 1) / self.BUCKETS_PER_DOUBLING) / 1e6, self.max)
+        return self.max
+
+
+class CommandMetrics:
+    __slots__ = ('wait', 'execute', 'failed')
+
+    def __init__(self):
+        self.wait = LatencyHistogram()
+        self.execute = LatencyHistogram()
+        self.failed = 0
+
+
+class ProfileResults(NamedTuple):
+    seconds: float
+    ticks: int
+    path: str
+
+    @property
+    def tps(self) -> float:
+        return self.ticks / self.seconds if self.seconds > 0 else 0.0
+
+
+class Profiler:
+    """
+    What the debug command starts and stops: per-command latency histograms, queue wait, log output
+    and a statistical sampler walking the stacks of every thread, dumped as a report like vanilla.
+    Instrumented code checks running first, so nothing is measured while the profiler is off
+    """
+    # seconds between two stack samples
+    INTERVAL = 0.005
+    MAX_DEPTH = 64
+    TOP_FUNCTIONS = 25
+    TOP_THREAD_FUNCTIONS = 8
+    REPORT_DIR = 'debug'
+    THREAD_NAME = 'Profiler'
+    # a thread whose innermost frame is in one of these modules is blocked waiting for work
+    IDLE_MODULES = ('threading.py', 'queue.py', 'selectors.py', 'socket.py')
+    # functions which only block on a read, like the one of the input reader thread
+    IDLE_FUNCTIONS = frozenset({'__read_chunk'})
+
+    __gl_instance = None
+    __create_lock = threading.Lock()
+
+    def __init__(self, interval: Optional[float] = None, report_dir: Optional[str] = None):
+        self.interval = self.INTERVAL if interval is None else interval
+        self.report_dir = self.REPORT_DIR if report_dir is None else report_dir
+        self.running = False
+        self.__lock = threading.Lock()
+        self.__stopping = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.__reset(0)
+
+    @classmethod
+    def get_instance(cls) -> 'Profiler':
+        if cls.__gl_instance is None:
+            with cls.__create_lock:
+                if cls.__gl_instance is None:
+                    cls.__gl_instance = cls()
+        return cls.__gl_instance
+
+    def __reset(self, tick: int):
+        self.__start_time = time.perf_counter()
+        self.__start_tick = tick
+        self.__commands: Dict[str, CommandMetrics] = defaultdict(CommandMetrics)
+        self.__log_lines = 0
+        self.__log_bytes = 0
+        self.__samples = 0
+        self.__live_threads: List[int] = []
+        self.__self_samples: Counter = Counter()
+        self.__total_samples: Counter = Counter()
+        self.__thread_samples: Dict[str, Counter] = defaultdict(Counter)
+        # threads may share a name, so the busy and idle shares are relative to the samples of that name
+        self.__thread_presence: Counter = Counter()
+        self.__idle_samples: Counter = Counter()
+
+    def start(self, tick: int = 0, sample: bool = True) -> bool:
+        """
+        Start collecting from a clean state, returning False if the profiler is already running
+        """
+        with self.__lock:
+            if self.running:
+                return False
+            self.__reset(tick)
+            self.running = True
+        if sample:
+            self.__stopping.clear()
+            self.__thread = threading.Thread(target=self.__sample_loop, name=self.THREAD_NAME, daemon=True)
+            self.__thread.start()
+        return True
+
+    def stop(self, tick: int = 0) -> Optional[ProfileResults]:
+        """
+        Stop collecting and write the report, returning None if the profiler is not running
+        """
+        with self.__lock:
+            if not self.running:
+                return None
+            self.running = False
+        thread, self.__thread = self.__thread, None
+        if thread is not None:
+            self.__stopping.set()
+            if thread is not threading.current_thread():
+                thread.join()
+        seconds = time.perf_counter() - self.__start_time
+        ticks = tick - self.__start_tick
+        path = os.path.join(self.report_dir, time.strftime('profile-results-%Y-%m-%d_%H.%M.%S.txt'))
+        os.makedirs(self.report_dir, exist_ok=True)
+        with open(path, 'w', encoding='utf8') as file:
+            file.write(self.report(seconds, ticks))
+        return ProfileResults(seconds, ticks, path)
+
+    def record_command(self, name: str, seconds: float, failed: bool = False):
+        with self.__lock:
+            metrics = self.__commands[name]
+            metrics.execute.add(seconds)
+            if failed:
+                metrics.failed += 1
+
+    def record_wait(self, key: Optional[Hashable], seconds: float):
+        """
+        Time a task spent queued before a worker picked it up, keyed by the command name it was submitted with
+        """
+        with self.__lock:
+            self.__commands['(unkeyed)' if key is None else str(key)].wait.add(seconds)
+
+    def record_log(self, message: str):
+        size = len(message.encode('utf8', 'replace')) + 1
+        with self.__lock:
+            self.__log_lines += 1
+            self.__log_bytes += size
+
+    def __sample_loop(self):
+        ident = threading.get_ident()
+        while not self.__stopping.wait(self.interval):
+            frames = sys._current_frames()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            with self.__lock:
+                self.__samples += 1
+                self.__live_threads.append(len(names))
+                for thread_ident, frame in frames.items():
+                    if thread_ident != ident:
+                        self.__sample_stack(names.get(thread_ident, str(thread_ident)), frame)
+
+    def __sample_stack(self, thread: str, frame):
+        self.__thread_presence[thread] += 1
+        code = frame.f_code
+        if code.co_filename.endswith(self.IDLE_MODULES) or code.co_name in self.IDLE_FUNCTIONS:
+            self.__idle_samples[thread] += 1
+            return
+        leaf = (code.co_filename, code.co_firstlineno, code.co_name)
+        self.__self_samples[leaf] += 1
+        self.__thread_samples[thread][leaf] += 1
+        # recursive functions count once per sample in the cumulative table
+        seen = set()
+        depth = 0
+        while frame is not None and depth < self.MAX_DEPTH:
+            code = frame.f_code
+            key = (code.co_filename, code.co_firstlineno, code.co_name)
+            if key not in seen:
+                seen.add(key)
+                self.__total_samples[key] += 1
+            frame = frame.f_back
+            depth += 1
+
+    @staticmethod
+    def __describe(key: FunctionKey) -> str:
+        filename, line, name = key
+        return f'{name} ({os.path.basename(filename)}:{line})'
+
+    @staticmethod
+    def __ms(seconds: float) -> str:
+        return f'{seconds * 1000:.3f}'
+
+    def report(self, seconds: float, ticks: int) -> str:
+        with self.__lock:
+            lines = [
+                '---- Fake Server Profiler Results ----',
+                '',
+                f'Time span: {round(seconds * 1000)} ms',
+                f'Tick span: {ticks} ticks',
+                f'// This is approximately {ticks / seconds if seconds > 0 else 0.0:.2f} ticks per second',
+                '',
+            ]
+            lines.extend(self.__report_commands())
+            lines.extend(self.__report_output(seconds))
+            lines.extend(self.__report_samples())
+        return '\n'.join(lines) + '\n'
+
+    def __report_commands(self) -> List[str]:
+        lines = ['--- Commands (ms, wait is the time queued before a worker picked the command up) ---']
+        header = ('command', 'count', 'failed', 'mean', 'p50', 'p90', 'p99', 'max', 'wait mean', 'wait p99')
+        rows = []
+        for name, metrics in sorted(self.__commands.items(), key=lambda item: -item[1].execute.total):
+            execute, wait = metrics.execute, metrics.wait
+            rows.append((
+                name, str(execute.count), str(metrics.failed), self.__ms(execute.mean),
+                self.__ms(execute.percentile(0.5)), self.__ms(execute.percentile(0.9)),
+                self.__ms(execute.percentile(0.99)), self.__ms(execute.max),
+                self.__ms(wait.mean), self.__ms(wait.percentile(0.99)),
+            ))
+        if len(rows) == 0:
+            return lines + ['No command was run', '']
+        widths = [max(len(row[column]) for row in rows + [header]) for column in range(len(header))]
+        for row in [header] + rows:
+            lines.append('  '.join(
+                cell.ljust(width) if column == 0 else cell.rjust(width)
+                for column, (cell, width) in enumerate(zip(row, widths))
+            ))
+        return lines + ['']
+
+    def __report_output(self, seconds: float) -> List[str]:
+        live = self.__live_threads or [threading.active_count()]
+        return [
+            '--- Threads and logging ---',
+            f'Live threads: min {min(live)}, mean {sum(live) / len(live):.1f}, max {max(live)}',
+            f'Log output: {self.__log_lines} lines, {self.__log_bytes} bytes '
+            f'({self.__log_bytes / seconds if seconds > 0 else 0.0:.1f} bytes/sec)',
+            '',
+        ]
+
+    def __report_samples(self) -> List[str]:
+        samples = self.__samples
+        if samples == 0:
+            return ['--- Sampled functions ---', 'No sample was taken']
+        lines = [
+            f'--- Sampled functions ({samples} samples every {round(self.interval * 1000, 1)} ms, idle waits excluded) ---',
+            f"{'self':>7}  {'total':>7}  function",
+        ]
+        for key, count in self.__self_samples.most_common(self.TOP_FUNCTIONS):
+            lines.append(f'{count / samples:7.1%}  {self.__total_samples[key] / samples:7.1%}  {self.__describe(key)}')
+        busy = {thread: sum(self.__thread_samples[thread].values()) for thread in self.__thread_presence}
+        for thread in sorted(busy, key=lambda name: -busy[name]):
+            presence = self.__thread_presence[thread]
+            lines.extend([
+                '',
+                f'--- Thread {thread}: busy in {busy[thread] / presence:.1%} of its samples, '
+                f'idle in {self.__idle_samples[thread] / presence:.1%} ---',
+            ])
+            for key, count in self.__thread_samples[thread].most_common(self.TOP_THREAD_FUNCTIONS):
+                lines.append(f'{count / presence:7.1%}  {self.__describe(key)}')
+        return lines
+
+
+def get_profiler() -> Profiler:
+    return Profiler.get_instance()
@@ -1,102 +1,298 @@
 import json
+import re
 from json.decoder import JSONDecodeError
-from typing import Dict, List, Union, Optional, Tuple
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
 
 from mcdreforged.api.rtext import *
-from mcdreforged.api.utils import Serializable, deserialize
 
+from utils.render_cache import get_render_cache
 
-class ClickEvent(Serializable):
-    action: str
-    value: str
 
-    def get(self) -> Optional[Tuple[RAction, str]]:
-        if self.action in [action.name for action in list(RAction)]:
-            return RAction[self.action], self.value
-        return None
+class TextComponentError(ValueError):
+    pass
+
+
+class Style(NamedTuple):
+    """
+    Effective style of a component, children inherit every field their own json does not set
+    """
+    color: Optional[RColor] = None
+    styles: frozenset = frozenset()
+    click: Optional[Tuple[Any, str]] = None
+    hover: Optional[RTextBase] = None
+    insertion: Optional[str] = None
+
+
+class TextCompiler:
+    """
+    Compile decoded json text components into RText in a single iterative walk.
+    The result is a flat list of RText pieces carrying the inherited style,
+    so nesting depth costs neither recursion nor nested RTextList rendering
+    """
+    COLORS: Dict[str, RColor] = {color.name: color for color in RColor if color.name != 'reset'}
+    # vanilla rgb values of the named colors, used to approximate hex colors
+    COLOR_RGB = {
+        'black': 0x000000, 'dark_blue': 0x0000AA, 'dark_green': 0x00AA00, 'dark_aqua': 0x00AAAA,
+        'dark_red': 0xAA0000, 'dark_purple': 0xAA00AA, 'gold': 0xFFAA00, 'gray': 0xAAAAAA,
+        'dark_gray': 0x555555, 'blue': 0x5555FF, 'green': 0x55FF55, 'aqua': 0x55FFFF,
+        'red': 0xFF5555, 'light_purple': 0xFF55FF, 'yellow': 0xFFFF55, 'white': 0xFFFFFF,
+    }
+    STYLES: Dict[str, RStyle] = {style.name: style for style in RStyle}
+    CLICK_KEYS = ('clickEvent', 'click_event')
+    HOVER_KEYS = ('hoverEvent', 'hover_event')
+    # the few en_us translations a dedicated server console usually shows, unknown keys render as themselves
+    TRANSLATIONS = {
+        'chat.type.text': '<%s> %s',
+        'chat.type.announcement': '[%s] %s',
+        'chat.type.emote': '* %s %s',
+        'chat.type.admin': '[%s: %s]',
+        'commands.message.display.incoming': '%s whispers to you: %s',
+        'commands.message.display.outgoing': 'You whisper to %s: %s',
+        'multiplayer.player.joined': '%s joined the game',
+        'multiplayer.player.left': '%s left the game',
+        'death.attack.generic': '%s died',
+        'death.attack.outOfWorld': '%s fell out of the world',
+    }
+    SELECTOR_SEPARATOR = {'text': ', ', 'color': 'gray'}
+    # components whose text depends on the game state, so their rendering must not be cached
+    DYNAMIC_KEYS = ('"score"', '"selector"', '"nbt"')
+    __FORMAT = re.compile(r'%(?:(\d+)\$)?([s%])')
 
-    @property
-    def avail(self):
-        return self.get() is not None
+    def compile(self, data: Union[str, list, dict]) -> RTextBase:
+        # plain strings and unstyled text, common for hover texts and arguments
+        if isinstance(data, str):
+            return RText(data)
+        if isinstance(data, dict) and len(data) == 1 and isinstance(data.get('text'), str):
+            return RText(data['text'])
+        pieces: List[Tuple[str, Style]] = []
+        # work items are (json, inherited style), or a str with a style for text emitted by a parent
+        tasks: List[Tuple[Any, Style, bool]] = [(data, Style(), False)]
+        while len(tasks) != 0:
+            item, style, emitted = tasks.pop()
+            if emitted or isinstance(item, str):
+                if len(item) != 0:
+                    pieces.append((item, style))
+            elif isinstance(item, dict):
+                style = self.__merge(item, style)
+                children = self.__content(item, style)
+                extra = item.get('extra')
+                if extra is not None:
+                    if not isinstance(extra, list) or len(extra) == 0:
+                        raise TextComponentError(f'Invalid extra: {extra!r}')
+                    tasks.extend((child, style, False) for child in reversed(extra))
+                tasks.extend(reversed(children))
+            elif isinstance(item, list):
+                if len(item) == 0:
+                    raise TextComponentError('Empty list is not a component')
+                # the first element is the parent of the rest
+                first, rest = item[0], item[1:]
+                tasks.append((self.__as_parent(first, rest) if len(rest) != 0 else first, style, False))
+            elif isinstance(item, (bool, int, float)):
+                pieces.append((json.dumps(item), style))
+            else:
+                raise TextComponentError(f"Don't know how to turn {json.dumps(item)} into a Component")
+        return self.__build(pieces)
+
+    @staticmethod
+    def __as_parent(first: Any, rest: list) -> dict:
+        if isinstance(first, dict):
+            parent = dict(first)
+            parent['extra'] = list(first.get('extra') or ()) + rest
+            return parent
+        if isinstance(first, list):
+            return {'text': '', 'extra': [first] + rest}
+        return {'text': first if isinstance(first, str) else json.dumps(first), 'extra': rest}
+
+    def __merge(self, data: dict, parent: Style) -> Style:
+        color, styles, click, hover, insertion = parent
+        changed = False
+        if 'color' in data:
+            color, changed = self.__color(data['color']), True
+        for name, style in self.STYLES.items():
+            if name in data:
+                styles = styles | {style} if data[name] else styles - {style}
+                changed = True
+        for key in self.CLICK_KEYS:
+            if key in data:
+                click, changed = self.__click(data[key]), True
+                break
+        for key in self.HOVER_KEYS:
+            if key in data:
+                hover, changed = self.__hover(data[key]), True
+                break
+        if 'insertion' in data:
+            insertion, changed = str(data['insertion']), True
+        return Style(color, styles, click, hover, insertion) if changed else parent
 
+    def __color(self, name: Any) -> Optional[RColor]:
+        if not isinstance(name, str):
+            raise TextComponentError(f'Invalid color: {name!r}')
+        color = self.COLORS.get(name)
+        if color is not None or name == 'reset':
+            return color
+        if name.startswith('#') and len(name) == 7:
+            try:
+                rgb = int(name[1:], 16)
+            except ValueError:
+                pass
+            else:
+                return self.COLORS[min(self.COLOR_RGB, key=lambda key: self.__distance(self.COLOR_RGB[key], rgb))]
+        raise TextComponentError(f'Invalid color: {name!r}')
 
-class HoverEvent(Serializable):
-    action: str
-    content: Dict[str, 'RTextSerializer']
+    @staticmethod
+    def __distance(a: int, b: int) -> int:
+        return sum((((a >> shift) & 0xFF) - ((b >> shift) & 0xFF)) ** 2 for shift in (0, 8, 16))
 
-    def get(self):
-        if self.action != 'show_text':
-            return self.content['show_text']
+    @staticmethod
+    def __click(event: Any) -> Optional[Tuple[Any, str]]:
+        if not isinstance(event, dict):
+            raise TextComponentError(f'Invalid click event: {event!r}')
+        action = getattr(RAction, str(event.get('action')), None)
+        value = event.get('value', event.get('url', event.get('command', event.get('path', event.get('page')))))
+        if action is None or value is None:
+            return None
+        return action, str(value)
+
+    def __hover(self, event: Any) -> Optional[RTextBase]:
+        if not isinstance(event, dict):
+            raise TextComponentError(f'Invalid hover event: {event!r}')
+        action = event.get('action')
+        contents = event.get('contents', event.get('value'))
+        if action == 'show_text':
+            return None if contents is None else self.compile(contents)
+        if action == 'show_item':
+            if isinstance(contents, str):
+                contents = {'id': contents}
+            elif not isinstance(contents, dict):
+                contents = {'id': event.get('id', 'minecraft:air'), 'count': event.get('count', 1)}
+            count = contents.get('count', contents.get('Count', 1))
+            return RText(f"{contents.get('id')}" + (f' x{count}' if count != 1 else ''))
+        if action == 'show_entity':
+            if not isinstance(contents, dict):
+                contents = event
+            lines = []
+            if contents.get('name') is not None:
+                lines.append(self.compile(contents['name']).to_plain_text())
+            lines.append(f"Type: {contents.get('type', contents.get('id', 'minecraft:pig'))}")
+            if contents.get('id') is not None and 'type' in contents:
+                uuid = contents['id']
+                lines.append(str(uuid) if isinstance(uuid, str) else ','.join(map(str, uuid)))
+            return RText('\n'.join(lines))
         return None
 
-    @classmethod
-    def deserialize(cls, data: dict, **kwargs):
-        serialized: 'HoverEvent' = deserialize(data, cls)
-        if 'show_text' in serialized.content.keys():
-            serialized.content['show_text'].allow_extra()
+    def __content(self, data: dict, style: Style) -> List[Tuple[Any, Style, bool]]:
+        """
+        The pieces making up the component itself, in order, before its extra
+        """
+        if 'text' in data:
+            text = data['text']
+            return [(text if isinstance(text, str) else json.dumps(text), style, True)]
+        if 'translate' in data:
+            return self.__translate(data, style)
+        if 'score' in data:
+            score = data['score']
+            if not isinstance(score, dict) or 'name' not in score or 'objective' not in score:
+                raise TextComponentError(f'Invalid score: {score!r}')
+            value = score.get('value')
+            if value is None:
+                value = self.resolve_score(str(score['name']), str(score['objective']))
+            return [(str(value), style, True)]
+        if 'selector' in data:
+            names = self.resolve_selector(str(data['selector']))
+            separator = data.get('separator', self.SELECTOR_SEPARATOR)
+            result = []
+            for index, name in enumerate(names):
+                if index != 0:
+                    result.append((separator, style, False))
+                result.append((name, style, True))
+            return result
+        if 'keybind' in data:
+            return [(self.resolve_keybind(str(data['keybind'])), style, True)]
+        if 'nbt' in data:
+            return [(self.resolve_nbt(data), style, True)]
+        raise TextComponentError(f"Don't know how to turn {json.dumps(data)} into a Component")
 
-    @property
-    def avail(self):
-        return self.get() is not None
+    def __translate(self, data: dict, style: Style) -> List[Tuple[Any, Style, bool]]:
+        key = str(data['translate'])
+        template = self.TRANSLATIONS.get(key, data.get('fallback'))
+        if template is None:
+            return [(key, style, True)]
+        args = data.get('with', [])
+        if not isinstance(args, list):
+            raise TextComponentError(f'Invalid translation arguments: {args!r}')
+        result, position, index = [], 0, 0
+        for match in self.__FORMAT.finditer(template):
+            result.append((template[position:match.start()], style, True))
+            position = match.end()
+            if match.group(2) == '%':
+                result.append(('%', style, True))
+                continue
+            if match.group(1) is not None:
+                arg_index = int(match.group(1)) - 1
+            else:
+                arg_index, index = index, index + 1
+            if 0 <= arg_index < len(args):
+                result.append((args[arg_index], style, False))
+        result.append((template[position:], style, True))
+        return result
 
+    @staticmethod
+    def resolve_score(name: str, objective: str) -> str:
+        from utils.scoreboard import get_scoreboard
+        scoreboard = get_scoreboard()
+        target = scoreboard.objectives.get(objective)
+        value = None if target is None else scoreboard.get(name, target)
+        return '' if value is None else str(value)
 
-class RTextSerializer(Serializable):
-    text: str = ''
-    color: Optional[RColor] = None
-    strikethrough: bool = False
-    bold: bool = False
-    underlined: bool = False
-    obfuscated: bool = False
-    italic: bool = False
-    clickEvent: Optional[ClickEvent] = None
-    hoverEvent: Optional[HoverEvent] = None
-    extra: Optional[List['RTextSerializer']] = None
-    __allow_extra: bool = False
-
-    def get_styles(self) -> Optional[Tuple[RStyle]]:
-        styles = []
-        for style in list(RStyle):
-            if self.__dict__[style.name]:
-                styles.append(style)
-        return None if len(styles) == 0 else tuple(styles)
-
-    def allow_extra(self):
-        self.__allow_extra = True
-
-    def forbid_extra(self):
-        self.__allow_extra = False
-
-    def get(self) -> Union[RText, RTextList]:
-        rt = RText(self.text, self.color, self.get_styles())
-        click = self.clickEvent.get() if self.clickEvent is not None else None
-        if click is not None:
-            rt.c(*self.clickEvent.get())
-        hover = self.hoverEvent.get() if self.hoverEvent is not None else None
-        if hover is not None:
-            rt.h(self.hoverEvent.get())
-        if self.__allow_extra and self.extra is not None:
-            return get_rtext_list(self.extra)
+    @staticmethod
+    def resolve_selector(selector: str) -> List[str]:
+        from player.online import players
+        from utils.grammar import CommandSyntaxError, Entity, StringReader
+        try:
+            return [record.name for record in players.select(Entity('selector').parse(StringReader(selector)))]
+        except CommandSyntaxError:
+            return []
+
+    @staticmethod
+    def resolve_keybind(keybind: str) -> str:
+        return keybind
+
+    @staticmethod
+    def resolve_nbt(data: dict) -> str:
+        return ''
+
+    @staticmethod
+    def __build(pieces: List[Tuple[str, Style]]) -> RTextBase:
+        texts, text, style = [], None, None
+        for piece, piece_style in pieces:
+            # neighbours sharing a style are rendered as one RText
+            if piece_style is style or piece_style == style:
+                text.append(piece)
+                continue
+            if text is not None:
+                texts.append(TextCompiler.__make(''.join(text), style))
+            text, style = [piece], piece_style
+        if text is not None:
+            texts.append(TextCompiler.__make(''.join(text), style))
+        if len(texts) == 1:
+            return texts[0]
+        return RTextList(*texts)
+
+    @staticmethod
+    def __make(text: str, style: Style) -> RText:
+        rt = RText(text, style.color, style.styles or None)
+        if style.click is not None:
+            rt.c(*style.click)
+        if style.hover is not None:
+            rt.h(style.hover)
         return rt
 
-    @classmethod
-    def deserialize(cls, data: Union[str, dict], **kwargs):
-        if isinstance(data, str):
-            return data
-        return deserialize(data, cls)
+
+compiler = TextCompiler()
 
 
-def get_rtext_list(original_list: list):
-    rt = RTextList()
-    for item in original_list:
-        if isinstance(item, str):
-            rt.append(item)
-        elif isinstance(item, dict):
-            item = RTextSerializer.deserialize(item)
-            item.forbid_extra()
-            rt.append(item.get())
-        elif isinstance(item, list):
-            rt.append(get_rtext_list(item))
-    return rt
+def convert_json_object(js: Union[list, dict, str]) -> RTextBase:
+    return compiler.compile(js)
 
 
 def convert_rtext(js: Union[list, dict, str]) -> RTextBase:
@@ -104,9 +300,22 @@ def convert_rtext(js: Union[list, dict, str]) -> RTextBase:
         try:
             js = json.loads(js)
         except JSONDecodeError:
-            pass
+            return RText(js)
+    return convert_json_object(js)
 
-    if isinstance(js, str):
-        return RText(js)
-    else:
-        return RTextBase.from_json_object(js)
+
+# default of render_json() for callers without the decoded value, json null is a valid text component
+_UNPARSED = object()
+
+
+def render_json(raw: str, value: Any = _UNPARSED) -> str:
+    """
+    Console string of a raw json text, memoized on the raw text so repeated payloads skip parsing and rendering.
+    A miss compiles value, the text already decoded from raw, instead of parsing raw again
+    """
+    def render() -> str:
+        return (convert_rtext(raw) if value is _UNPARSED else convert_json_object(value)).to_colored_text()
+
+    if any(key in raw for key in TextCompiler.DYNAMIC_KEYS):
+        return render()
+    return get_render_cache().get(raw, render)
@@ -0,0 +1,248 @@
+import asyncio
+import hmac
+import struct
+import threading
+from typing import List, NamedTuple, Optional, Set, Tuple
+
+from utils.aio import get_runtime
+from utils.commands import AbstractCommand
+from utils.logger import get_logger, log
+
+
+__all__ = [
+    "RconError",
+    "RconPacket",
+    "RconServer",
+    "RconClient",
+    "get_rcon",
+]
+
+
+class RconError(Exception):
+    pass
+
+
+class RconPacket(NamedTuple):
+    """
+    Source RCON packet: little endian length, request id and type, followed by a body and two null bytes
+    """
+    request_id: int
+    type: int
+    body: str
+
+    RESPONSE = 0
+    COMMAND = 2
+    AUTH_RESPONSE = 2
+    AUTH = 3
+    # request id of the reply to a failed login
+    AUTH_FAILED = -1
+
+    HEADER = struct.Struct('<iii')
+    # vanilla reads requests into a buffer of this size
+    MAX_REQUEST = 1460
+    MIN_LENGTH = 10
+
+    def pack(self) -> bytes:
+        body = self.body.encode('utf8')
+        return self.HEADER.pack(len(body) + self.MIN_LENGTH, self.request_id, self.type) + body + b'\0\0'
+
+    @classmethod
+    async def read(cls, reader: asyncio.StreamReader, max_length: Optional[int] = None) -> 'RconPacket':
+        """
+        Read the next packet, raising asyncio.IncompleteReadError once the connection is closed
+        """
+        header = await reader.readexactly(cls.HEADER.size)
+        length, request_id, kind = cls.HEADER.unpack(header)
+        if length < cls.MIN_LENGTH or (max_length is not None and length > max_length):
+            raise RconError(f'Invalid packet length {length}')
+        data = await reader.readexactly(length - 8)
+        return cls(request_id, kind, data.split(b'\0', 1)[0].decode('utf8', 'replace'))
+
+
+class RconServer:
+    """
+    Remote console listener running on the shared event loop. Commands go to the same registry as the console,
+    their log output is captured as the reply instead of being written.
+    A connection keeps reading pipelined requests while a command runs, and answers them in order
+    """
+    HOST = '127.0.0.1'
+    PORT = 25575
+    # vanilla splits longer replies into several packets with the same request id
+    MAX_RESPONSE = 4096
+
+    __gl_instance = None
+    __create_lock = threading.Lock()
+
+    def __init__(self):
+        self.__server: Optional[asyncio.AbstractServer] = None
+        self.__password = ''
+        self.__clients: Set[asyncio.StreamWriter] = set()
+        self.requests = 0
+
+    @classmethod
+    def get_instance(cls) -> 'RconServer':
+        if cls.__gl_instance is None:
+            with cls.__create_lock:
+                if cls.__gl_instance is None:
+                    cls.__gl_instance = cls()
+        return cls.__gl_instance
+
+    @property
+    def running(self) -> bool:
+        return self.__server is not None
+
+    @property
+    def connections(self) -> int:
+        return len(self.__clients)
+
+    @property
+    def address(self) -> Optional[Tuple[str, int]]:
+        if self.__server is None or len(self.__server.sockets) == 0:
+            return None
+        return self.__server.sockets[0].getsockname()[:2]
+
+    async def open(self, host: Optional[str] = None, port: Optional[int] = None, password: str = '') -> bool:
+        """
+        Start listening on the running loop, returning False if rcon stays disabled for lack of a password
+        """
+        log('Starting remote control listener')
+        if len(password) == 0:
+            get_logger().warning('No rcon password set, rcon disabled!')
+            return False
+        await self.close()
+        self.__password = password
+        self.__server = await asyncio.start_server(
+            self.__serve, self.HOST if host is None else host, self.PORT if port is None else port)
+        host, port = self.address
+        log(f'RCON running on {host}:{port}')
+        return True
+
+    async def close(self):
+        server, self.__server = self.__server, None
+        if server is not None:
+            server.close()
+            # newer python versions wait for the open connections as well
+            for writer in list(self.__clients):
+                writer.close()
+            await server.wait_closed()
+
+    def start(self, host: Optional[str] = None, port: Optional[int] = None, password: str = '') -> bool:
+        """
+        Blocking open() for code outside of the event loop
+        """
+        return get_runtime().call(self.open(host, port, password))
+
+    def stop(self):
+        if self.__server is not None:
+            get_runtime().call(self.close())
+
+    @staticmethod
+    def execute(command: str) -> str:
+        """
+        Run a command on the calling thread and return what it logged. The lines are written to the console
+        and the log as well, since they may be server events like a player joining that MCDR has to see
+        """
+        with get_logger().capture(echo=True) as lines:
+            if len(command) != 0:
+                AbstractCommand._parse(command)
+        return '\n'.join(lines)
+
+    @classmethod
+    def __response(cls, request_id: int, text: str) -> List[bytes]:
+        chunks = [text[i:i + cls.MAX_RESPONSE] for i in range(0, len(text), cls.MAX_RESPONSE)] or ['']
+        return [RconPacket(request_id, RconPacket.RESPONSE, chunk).pack() for chunk in chunks]
+
+    async def __serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        peer = writer.get_extra_info('peername')
+        name = f'RCON Client /{peer[0]}' if peer else 'RCON Client'
+        log(f'Thread {name} started')
+        self.__clients.add(writer)
+        authed = False
+        runtime = get_runtime()
+        try:
+            while True:
+                packet = await RconPacket.read(reader, RconPacket.MAX_REQUEST)
+                if packet.type == RconPacket.AUTH:
+                    authed = hmac.compare_digest(packet.body.encode('utf8'), self.__password.encode('utf8'))
+                    request_id = packet.request_id if authed else RconPacket.AUTH_FAILED
+                    writer.write(RconPacket(request_id, RconPacket.AUTH_RESPONSE, '').pack())
+                elif packet.type == RconPacket.COMMAND:
+                    if not authed:
+                        writer.write(RconPacket(RconPacket.AUTH_FAILED, RconPacket.AUTH_RESPONSE, '').pack())
+                    else:
+                        self.requests += 1
+                        output = await runtime.run_sync(self.execute, packet.body)
+                        writer.writelines(self.__response(packet.request_id, output))
+                else:
+                    # clients send an unknown type after a command to find the end of a multi-packet reply
+                    writer.writelines(self.__response(packet.request_id, f'Unknown request {packet.type:x}'))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except RconError as exc:
+            get_logger().warning(f'{name}: {exc}')
+        finally:
+            self.__clients.discard(writer)
+            writer.close()
+            log(f'Thread {name} shutting down')
+
+
+class RconClient:
+    """
+    Minimal asyncio RCON client, used by the load benchmark
+    """
+
+    def __init__(self):
+        self.__reader: Optional[asyncio.StreamReader] = None
+        self.__writer: Optional[asyncio.StreamWriter] = None
+        self.__next_id = 0
+
+    async def connect(self, host: str, port: int, password: str):
+        self.__reader, self.__writer = await asyncio.open_connection(host, port)
+        self.__writer.write(RconPacket(self.__new_id(), RconPacket.AUTH, password).pack())
+        reply = await RconPacket.read(self.__reader)
+        if reply.request_id == RconPacket.AUTH_FAILED:
+            await self.close()
+            raise RconError('Authentication failed')
+
+    def __new_id(self) -> int:
+        self.__next_id += 1
+        return self.__next_id
+
+    def send(self, command: str) -> int:
+        """
+        Queue a command followed by an end marker without waiting for the reply, returning its request id
+        """
+        request_id = self.__new_id()
+        self.__writer.write(RconPacket(request_id, RconPacket.COMMAND, command).pack())
+        self.__writer.write(RconPacket(request_id, RconPacket.RESPONSE, '').pack())
+        return request_id
+
+    async def receive(self) -> Tuple[int, str]:
+        """
+        The request id and the full reply of the oldest command sent
+        """
+        chunks = []
+        while True:
+            packet = await RconPacket.read(self.__reader)
+            if packet.body == f'Unknown request {RconPacket.RESPONSE:x}':
+                return packet.request_id, ''.join(chunks)
+            chunks.append(packet.body)
+
+    async def flush(self):
+        await self.__writer.drain()
+
+    async def command(self, command: str) -> str:
+        self.send(command)
+        await self.flush()
+        return (await self.receive())[1]
+
+    async def close(self):
+        if self.__writer is not None:
+            self.__writer.close()
+            self.__writer = None
+            self.__reader = None
+
+
+def get_rcon() -> RconServer:
+    return RconServer.get_instance()
@@ -0,0 +1,139 @@
+import asyncio
+import queue
+import threading
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Iterator, List, Optional
+
+
+__all__ = [
+    "LineSplitter",
+    "LineReader",
+    "AsyncLineReader",
+]
+
+
+_EOF = object()
+
+
+class LineSplitter:
+    """
+    Split a stream of byte chunks into decoded lines, keeping incomplete lines until a later chunk ends them
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        self.__pending: List[bytes] = []
+
+    def __decode(self, data: bytes) -> List[str]:
+        lines = data.decode(self.encoding, 'replace').split('\n')
+        return [line[:-1] if line.endswith('\r') else line for line in lines]
+
+    def feed(self, chunk: bytes) -> List[str]:
+        head, sep, tail = chunk.rpartition(b'\n')
+        if not sep:
+            self.__pending.append(tail)
+            return []
+        self.__pending.append(head)
+        lines = self.__decode(b''.join(self.__pending))
+        self.__pending = [tail] if tail else []
+        return lines
+
+    def close(self) -> List[str]:
+        if not self.__pending:
+            return []
+        lines = self.__decode(b''.join(self.__pending))
+        self.__pending = []
+        return lines
+
+
+class LineReader:
+    """
+    Read a binary stream in large chunks on a background thread and hand out decoded lines,
+    so reading the pipe overlaps with command dispatching
+    """
+    CHUNK_SIZE = 64 * 1024
+    QUEUE_SIZE = 256
+    THREAD_NAME = 'Input Reader'
+
+    def __init__(self, stream: BinaryIO, encoding: str, queue_size: Optional[int] = None):
+        self.__stream = stream
+        self.encoding = encoding
+        self.__queue = queue.Queue(queue_size or self.QUEUE_SIZE)
+        self.__thread: Optional[threading.Thread] = None
+        self.__error: Optional[BaseException] = None
+        self.lines_read = 0
+
+    def start(self):
+        if self.__thread is None:
+            self.__thread = threading.Thread(target=self.__read, name=self.THREAD_NAME, daemon=True)
+            self.__thread.start()
+
+    def __read_chunk(self) -> bytes:
+        read1 = getattr(self.__stream, 'read1', None)
+        if read1 is not None:
+            return read1(self.CHUNK_SIZE)
+        return self.__stream.read(self.CHUNK_SIZE)
+
+    def __read(self):
+        splitter = LineSplitter(self.encoding)
+        try:
+            while True:
+                chunk = self.__read_chunk()
+                if not chunk:
+                    break
+                lines = splitter.feed(chunk)
+                if lines:
+                    self.__queue.put(lines)
+            lines = splitter.close()
+            if lines:
+                self.__queue.put(lines)
+        except BaseException as exc:
+            self.__error = exc
+        finally:
+            self.__queue.put(_EOF)
+
+    def __iter__(self) -> Iterator[str]:
+        self.start()
+        while True:
+            batch = self.__queue.get()
+            if batch is _EOF:
+                if self.__error is not None:
+                    raise self.__error
+                return
+            for line in batch:
+                self.lines_read += 1
+                yield line
+
+
+class AsyncLineReader:
+    """
+    Asyncio flavor of LineReader, reading pipes through an asyncio stream.
+    Regular files cannot be attached to a pipe transport, so they are read on the default executor instead
+    """
+    CHUNK_SIZE = LineReader.CHUNK_SIZE
+
+    def __init__(self, stream: BinaryIO, encoding: str):
+        self.__stream = stream
+        self.encoding = encoding
+        self.lines_read = 0
+
+    async def __open(self) -> Callable[[], Awaitable[bytes]]:
+        loop = asyncio.get_running_loop()
+        try:
+            reader = asyncio.StreamReader(limit=self.CHUNK_SIZE)
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), self.__stream)
+            return lambda: reader.read(self.CHUNK_SIZE)
+        except (ValueError, OSError):
+            read = getattr(self.__stream, 'read1', self.__stream.read)
+            return lambda: loop.run_in_executor(None, read, self.CHUNK_SIZE)
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        read_chunk = await self.__open()
+        splitter = LineSplitter(self.encoding)
+        while True:
+            chunk = await read_chunk()
+            lines = splitter.feed(chunk) if chunk else splitter.close()
+            for line in lines:
+                self.lines_read += 1
+                yield line
+            if not chunk:
+                return
@@ -0,0 +1,96 @@
+import threading
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+
+__all__ = [
+    "RenderCacheStats",
+    "RenderCache",
+    "get_render_cache",
+]
+
+
+class RenderCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    capacity: int
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return 0.0 if total == 0 else self.hits / total
+
+
+class RenderCache:
+    """
+    Bounded LRU cache from a raw text component to its rendered console string
+    """
+    SIZE = 1024
+
+    __gl_instance = None
+    __create_lock = threading.Lock()
+
+    def __init__(self, size: Optional[int] = None):
+        self.__capacity = self.SIZE if size is None else max(0, size)
+        self.__entries: 'OrderedDict[str, str]' = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+
+    @classmethod
+    def get_instance(cls) -> 'RenderCache':
+        if cls.__gl_instance is None:
+            with cls.__create_lock:
+                if cls.__gl_instance is None:
+                    cls.__gl_instance = cls()
+        return cls.__gl_instance
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    @property
+    def stats(self) -> RenderCacheStats:
+        with self.__lock:
+            return RenderCacheStats(self.__hits, self.__misses, self.__evictions, len(self.__entries), self.__capacity)
+
+    def get(self, key: str, render: Callable[[], str]) -> str:
+        """
+        Return the cached rendering of key, calling render on a miss.
+        Rendering happens outside the lock, so concurrent misses of one key may render it twice
+        """
+        with self.__lock:
+            text = self.__entries.get(key)
+            if text is not None:
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return text
+            self.__misses += 1
+        text = render()
+        if self.__capacity > 0:
+            with self.__lock:
+                self.__entries[key] = text
+                self.__evict()
+        return text
+
+    def resize(self, size: int):
+        with self.__lock:
+            self.__capacity = max(0, size)
+            self.__evict()
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.__hits = self.__misses = self.__evictions = 0
+
+    def __evict(self):
+        while len(self.__entries) > self.__capacity:
+            self.__entries.popitem(last=False)
+            self.__evictions += 1
+
+
+def get_render_cache() -> RenderCache:
+    return RenderCache.get_instance()
@@ -0,0 +1,343 @@
+import heapq
+import itertools
+import re
+import threading
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.nbt import Int, IntArray, to_snbt
+from utils.world import get_world
+
+
+__all__ = [
+    "ScoreboardError",
+    "Objective",
+    "Scoreboard",
+    "get_scoreboard",
+]
+
+
+INT_MIN = -2 ** 31
+INT_MAX = 2 ** 31 - 1
+
+
+def wrap_int(value: int) -> int:
+    """
+    Java int overflow
+    """
+    return (value - INT_MIN) % 2 ** 32 + INT_MIN
+
+
+class ScoreboardError(ValueError):
+    pass
+
+
+class Objective:
+    """
+    Scores of one objective in a column indexed by the holder id of the scoreboard.
+    Only the holders up to the highest id that ever had a score take space, 5 bytes each
+    """
+    __slots__ = ('name', 'criterion', 'display_name', 'render_type', 'scores', 'present', 'count', 'version',
+                 '__ranking', '__ranking_version')
+    # longest ranking kept between changes, enough for the sidebar
+    RANKING_SIZE = 15
+
+    def __init__(self, name: str, criterion: str, display_name: str, render_type: str = 'integer'):
+        self.name = name
+        self.criterion = criterion
+        # plain text of the display name component
+        self.display_name = display_name
+        self.render_type = render_type
+        self.scores = array('i')
+        self.present = bytearray()
+        self.count = 0
+        self.version = 0
+        self.__ranking: List[int] = []
+        self.__ranking_version = -1
+
+    def __str__(self):
+        return f'[{self.display_name}]'
+
+    @property
+    def read_only(self) -> bool:
+        return self.criterion in Scoreboard.READ_ONLY_CRITERIA
+
+    def get(self, holder: int) -> Optional[int]:
+        if holder < len(self.present) and self.present[holder]:
+            return self.scores[holder]
+        return None
+
+    def set(self, holder: int, value: int) -> bool:
+        """
+        Set a score, returning whether the holder had none before
+        """
+        if holder >= len(self.present):
+            grow = holder + 1 - len(self.present)
+            self.scores.extend(itertools.repeat(0, grow))
+            self.present.extend(bytes(grow))
+        ranked = self.__ranking_version == self.version
+        old = self.scores[holder] if self.present[holder] else None
+        self.scores[holder] = value
+        self.version += 1
+        if old is None:
+            self.present[holder] = 1
+            self.count += 1
+        if ranked and self.__rerank(holder, old, value):
+            self.__ranking_version = self.version
+        return old is None
+
+    def reset(self, holder: int) -> bool:
+        if holder < len(self.present) and self.present[holder]:
+            ranked = self.__ranking_version == self.version
+            complete = len(self.__ranking) == self.count
+            self.present[holder] = 0
+            self.count -= 1
+            self.version += 1
+            if ranked and (holder not in self.__ranking or complete):
+                if holder in self.__ranking:
+                    self.__ranking.remove(holder)
+                self.__ranking_version = self.version
+            return True
+        return False
+
+    def __key(self, holder: int) -> Tuple[int, int]:
+        return -self.scores[holder], holder
+
+    def __rerank(self, holder: int, old: Optional[int], value: int) -> bool:
+        """
+        Keep the cached ranking valid after one score changed, returning False if it has to be rebuilt
+        """
+        ranking = self.__ranking
+        size = len(ranking)
+        complete = size == self.count - (1 if old is None else 0)
+        if holder in ranking:
+            # a lower score may fall behind holders outside the ranking
+            if old is not None and value < old and not complete:
+                return False
+        elif complete or self.__key(holder) < self.__key(ranking[-1]):
+            ranking.append(holder)
+        else:
+            return True
+        ranking.sort(key=self.__key)
+        if len(ranking) > max(size, self.RANKING_SIZE):
+            ranking.pop()
+        return True
+
+    def holders(self) -> Iterable[int]:
+        return itertools.compress(range(len(self.present)), self.present)
+
+    def top(self, amount: int) -> List[int]:
+        """
+        Holder ids of the highest scores, best first
+        """
+        if self.__ranking_version != self.version or (amount > len(self.__ranking) and self.count > len(self.__ranking)):
+            size = max(amount, self.RANKING_SIZE)
+            self.__ranking = heapq.nlargest(size, self.holders(), key=self.scores.__getitem__)
+            self.__ranking_version = self.version
+        return self.__ranking[:amount]
+
+
+class Scoreboard:
+    """
+    Objectives, score holders and display slots. Holder names are interned into ids once,
+    so every objective stores its scores as flat arrays instead of per-holder dicts
+    """
+    MAX_OBJECTIVE_NAME = 16
+    CRITERIA = ('dummy', 'trigger', 'deathCount', 'playerKillCount', 'totalKillCount',
+                'health', 'xp', 'level', 'food', 'air', 'armor')
+    READ_ONLY_CRITERIA = ('health', 'xp', 'level', 'food', 'air', 'armor')
+    # stat criteria like minecraft.custom:minecraft.jump and team criteria like teamkill.red
+    CRITERION_PATTERN = re.compile(r'(?:[a-z0-9_.-]+:[a-z0-9_.-]+|(?:teamkill|killedByTeam)\.[a-z_]+)')
+    COLORS = ('black', 'dark_blue', 'dark_green', 'dark_aqua', 'dark_red', 'dark_purple', 'gold', 'gray',
+              'dark_gray', 'blue', 'green', 'aqua', 'red', 'light_purple', 'yellow', 'white')
+    DISPLAY_SLOTS = ('list', 'sidebar', 'belowName') + tuple(f'sidebar.team.{color}' for color in COLORS)
+    REGION = 'data/scoreboard'
+
+    __gl_instance = None
+    __create_lock = threading.Lock()
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.objectives: Dict[str, Objective] = {}
+        self.display_slots: Dict[str, str] = {}
+        self.__holders: Dict[str, int] = {}
+        self.__names: List[str] = []
+        # amount of objectives each holder has a score in
+        self.__tracked = array('I')
+
+    @classmethod
+    def get_instance(cls) -> 'Scoreboard':
+        if cls.__gl_instance is None:
+            with cls.__create_lock:
+                if cls.__gl_instance is None:
+                    cls.__gl_instance = cls()
+        return cls.__gl_instance
+
+    def holder_id(self, name: str) -> int:
+        holder = self.__holders.get(name)
+        if holder is None:
+            holder = self.__holders[name] = len(self.__names)
+            self.__names.append(name)
+            self.__tracked.append(0)
+        return holder
+
+    def holder_name(self, holder: int) -> str:
+        return self.__names[holder]
+
+    def tracked(self) -> List[str]:
+        """
+        Names of every holder with at least one score
+        """
+        with self.lock:
+            return [self.__names[holder] for holder in itertools.compress(range(len(self.__tracked)), self.__tracked)]
+
+    def is_tracked(self, name: str) -> bool:
+        holder = self.__holders.get(name)
+        return holder is not None and self.__tracked[holder] != 0
+
+    def objective(self, name: str) -> Objective:
+        objective = self.objectives.get(name)
+        if objective is None:
+            raise ScoreboardError(f"Unknown scoreboard objective '{name}'")
+        return objective
+
+    def add_objective(self, name: str, criterion: str, display_name: Optional[str] = None) -> Objective:
+        with self.lock:
+            if name in self.objectives:
+                raise ScoreboardError('An objective already exists by that name')
+            if len(name) > self.MAX_OBJECTIVE_NAME:
+                raise ScoreboardError(
+                    f"The objective name '{name}' is too long; must be at most {self.MAX_OBJECTIVE_NAME} characters")
+            if criterion not in self.CRITERIA and self.CRITERION_PATTERN.fullmatch(criterion) is None:
+                raise ScoreboardError(f"Unknown criterion '{criterion}'")
+            render_type = 'hearts' if criterion == 'health' else 'integer'
+            objective = self.objectives[name] = Objective(name, criterion, name if display_name is None else display_name,
+                                                          render_type)
+            self.__changed(objective)
+            return objective
+
+    def remove_objective(self, name: str) -> Objective:
+        with self.lock:
+            objective = self.objective(name)
+            for holder in objective.holders():
+                self.__tracked[holder] -= 1
+            del self.objectives[name]
+            for slot, shown in list(self.display_slots.items()):
+                if shown == name:
+                    del self.display_slots[slot]
+            self.__changed(objective)
+            return objective
+
+    def modify(self, objective: Objective, display_name: Optional[str] = None, render_type: Optional[str] = None):
+        with self.lock:
+            if display_name is not None:
+                objective.display_name = display_name
+            if render_type is not None:
+                objective.render_type = render_type
+            self.__changed(objective)
+
+    def set_display(self, slot: str, objective: Optional[str]) -> bool:
+        with self.lock:
+            if self.display_slots.get(slot) == objective:
+                return False
+            if objective is None:
+                del self.display_slots[slot]
+            else:
+                self.display_slots[slot] = objective
+            self.__changed(None)
+            return True
+
+    def get(self, name: str, objective: Objective) -> Optional[int]:
+        holder = self.__holders.get(name)
+        return None if holder is None else objective.get(holder)
+
+    def set(self, name: str, objective: Objective, value: int) -> int:
+        with self.lock:
+            holder = self.holder_id(name)
+            if objective.set(holder, wrap_int(value)):
+                self.__tracked[holder] += 1
+            self.__changed(objective)
+            return objective.scores[holder]
+
+    def add(self, name: str, objective: Objective, delta: int) -> int:
+        with self.lock:
+            return self.set(name, objective, (self.get(name, objective) or 0) + delta)
+
+    def reset(self, name: str, objective: Optional[Objective] = None) -> bool:
+        with self.lock:
+            holder = self.__holders.get(name)
+            if holder is None:
+                return False
+            changed = False
+            for target in self.objectives.values() if objective is None else (objective,):
+                if target.reset(holder):
+                    self.__tracked[holder] -= 1
+                    self.__changed(target)
+                    changed = True
+            return changed
+
+    def scores_of(self, name: str) -> List[Tuple[Objective, int]]:
+        with self.lock:
+            holder = self.__holders.get(name)
+            if holder is None:
+                return []
+            return [(objective, objective.scores[holder])
+                    for objective in self.objectives.values() if objective.get(holder) is not None]
+
+    def top(self, objective: Objective, amount: int) -> List[Tuple[str, int]]:
+        with self.lock:
+            return [(self.__names[holder], objective.scores[holder]) for holder in objective.top(amount)]
+
+    def __changed(self, objective: Optional[Objective]):
+        world = get_world()
+        world.mark_dirty(self.REGION, self.__snbt)
+        if objective is not None:
+            world.mark_dirty(f'{self.REGION}/{objective.name}', lambda: self.__objective_snbt(objective))
+
+    def __snbt(self) -> str:
+        with self.lock:
+            return to_snbt({'Objectives': list(self.objectives), 'DisplaySlots': dict(self.display_slots)})
+
+    def __objective_snbt(self, objective: Objective) -> str:
+        """
+        One objective in columns: the holder names and their scores in the same order
+        """
+        with self.lock:
+            if self.objectives.get(objective.name) is not objective:
+                return '{}'
+            holders = list(objective.holders())
+            return to_snbt({
+                'Name': objective.name,
+                'CriteriaName': objective.criterion,
+                'DisplayName': objective.display_name,
+                'RenderType': objective.render_type,
+                'Holders': [self.__names[holder] for holder in holders],
+                'Scores': IntArray(map(Int, map(objective.scores.__getitem__, holders))),
+            })
+
+    def load(self) -> int:
+        """
+        Restore the saved objectives, returning their amount
+        """
+        world = get_world()
+        saved = world.restore(self.REGION)
+        if saved is None:
+            return 0
+        with self.lock:
+            for name in saved.get('Objectives', []):
+                data = world.restore(f'{self.REGION}/{name}')
+                if not data:
+                    continue
+                objective = self.objectives[name] = Objective(
+                    name, data['CriteriaName'], data['DisplayName'], data['RenderType'])
+                for holder_name, value in zip(data['Holders'], data['Scores']):
+                    holder = self.holder_id(holder_name)
+                    objective.set(holder, value)
+                    self.__tracked[holder] += 1
+            self.display_slots.update(
+                (slot, name) for slot, name in saved.get('DisplaySlots', {}).items() if name in self.objectives)
+        return len(self.objectives)
+
+
+def get_scoreboard() -> Scoreboard:
+    return Scoreboard.get_instance()
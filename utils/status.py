@@ -0,0 +1,316 @@
+import asyncio
+import json
+import secrets
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from utils.aio import get_runtime
+from utils.logger import get_logger, log
+from player.online import PlayerRecord, players
+
+
+__all__ = [
+    "StatusCache",
+    "ServerStatus",
+    "QueryProtocol",
+    "write_varint",
+    "read_varint",
+    "get_status",
+]
+
+
+def write_varint(value: int) -> bytes:
+    value &= 0xFFFFFFFF
+    result = bytearray()
+    while True:
+        if value & ~0x7F == 0:
+            result.append(value)
+            return bytes(result)
+        result.append(value & 0x7F | 0x80)
+        value >>= 7
+
+
+async def read_varint(reader: asyncio.StreamReader, first: Optional[int] = None) -> int:
+    """
+    Read a VarInt, whose first byte may have been read already
+    """
+    result = 0
+    for shift in range(0, 35, 7):
+        byte = (await reader.readexactly(1))[0] if first is None or shift != 0 else first
+        result |= (byte & 0x7F) << shift
+        if byte & 0x80 == 0:
+            return result - (1 << 32) if result >= 1 << 31 else result
+    raise ValueError('VarInt too big')
+
+
+class StatusCache:
+    """
+    Every status reply in its final encoding, built from one snapshot of the online players
+    """
+    __slots__ = ('key', 'status', 'legacy', 'basic', 'full')
+
+    def __init__(self, key: Tuple[int, int], status: bytes, legacy: bytes, basic: bytes, full: bytes):
+        self.key = key
+        # complete Server List Ping response packet
+        self.status = status
+        # reply to the pre-1.7 0xFE ping
+        self.legacy = legacy
+        # Query stat payloads, following the type and session id
+        self.basic = basic
+        self.full = full
+
+
+class ServerStatus:
+    """
+    Server List Ping listener on TCP and Query listener on UDP, both on the shared event loop.
+    Replies are cached until a player joins or leaves, so polls never reach the command path
+    """
+    HOST = '127.0.0.1'
+    PORT = 25565
+    MOTD = 'A Minecraft Server'
+    VERSION = '1.19.2'
+    PROTOCOL = 760
+    # vanilla shows at most 12 players when hovering the player count
+    SAMPLE_SIZE = 12
+    # status connections are closed when they take longer
+    TIMEOUT = 30.0
+    MAX_PACKET = 1024
+    # Query challenge tokens stay valid this long
+    CHALLENGE_LIFETIME = 30.0
+    QUERY_MAGIC = b'\xfe\xfd'
+    QUERY_HANDSHAKE = 9
+    QUERY_STAT = 0
+    QUERY_HEADER = struct.Struct('>2sBi')
+
+    __gl_instance = None
+    __create_lock = threading.Lock()
+
+    def __init__(self):
+        self.motd = self.MOTD
+        self.__cache: Optional[StatusCache] = None
+        self.__cache_lock = threading.Lock()
+        self.__server: Optional[asyncio.AbstractServer] = None
+        self.__query: Optional[asyncio.DatagramTransport] = None
+        self.__clients: Set[asyncio.StreamWriter] = set()
+        self.__host_address: Tuple[str, int] = (self.HOST, self.PORT)
+        # address -> (token, issue time)
+        self.__challenges: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        self.status_polls = 0
+        self.query_polls = 0
+
+    @classmethod
+    def get_instance(cls) -> 'ServerStatus':
+        if cls.__gl_instance is None:
+            with cls.__create_lock:
+                if cls.__gl_instance is None:
+                    cls.__gl_instance = cls()
+        return cls.__gl_instance
+
+    @property
+    def status_address(self) -> Optional[Tuple[str, int]]:
+        if self.__server is None or len(self.__server.sockets) == 0:
+            return None
+        return self.__server.sockets[0].getsockname()[:2]
+
+    @property
+    def query_address(self) -> Optional[Tuple[str, int]]:
+        return None if self.__query is None else self.__query.get_extra_info('sockname')[:2]
+
+    def cache(self) -> StatusCache:
+        key = (players.version, players.limit)
+        cache = self.__cache
+        if cache is None or cache.key != key:
+            with self.__cache_lock:
+                cache = self.__cache
+                if cache is None or cache.key != key:
+                    cache = self.__cache = self.__build(key)
+        return cache
+
+    def invalidate(self):
+        self.__cache = None
+
+    def __status_text(self, online: Tuple[PlayerRecord, ...], limit: int) -> str:
+        status = {
+            'version': {'name': self.VERSION, 'protocol': self.PROTOCOL},
+            'players': {'max': limit, 'online': len(online)},
+            'description': {'text': self.motd},
+        }
+        if len(online) != 0:
+            status['players']['sample'] = [
+                {'name': record.name, 'id': str(record.uuid)} for record in online[:self.SAMPLE_SIZE]
+            ]
+        return json.dumps(status, separators=(',', ':'), ensure_ascii=False)
+
+    def __build(self, key: Tuple[int, int]) -> StatusCache:
+        # the version is read before the snapshot, a join in between only causes another rebuild
+        online = players.snapshot()
+        limit = key[1]
+        text = self.__status_text(online, limit).encode('utf8')
+        body = b'\x00' + write_varint(len(text)) + text
+        status = write_varint(len(body)) + body
+
+        legacy_text = f'§1\x00127\x00{self.VERSION}\x00{self.motd}\x00{len(online)}\x00{limit}'
+        legacy = b'\xff' + struct.pack('>H', len(legacy_text)) + legacy_text.encode('utf-16-be')
+
+        host, port = self.__host_address
+        basic = b''.join(self.__string(item) for item in (self.motd, 'SMP', 'world', str(len(online)), str(limit)))
+        basic += struct.pack('<H', port) + self.__string(host)
+
+        pairs = {
+            'hostname': self.motd, 'gametype': 'SMP', 'game_id': 'MINECRAFT', 'version': self.VERSION,
+            'plugins': '', 'map': 'world', 'numplayers': str(len(online)), 'maxplayers': str(limit),
+            'hostport': str(port), 'hostip': host,
+        }
+        full: List[bytes] = [b'splitnum\x00\x80\x00']
+        for name, value in pairs.items():
+            full.append(self.__string(name) + self.__string(value))
+        full.append(b'\x00\x01player_\x00\x00')
+        full.extend(self.__string(record.name) for record in online)
+        full.append(b'\x00')
+        return StatusCache(key, status, legacy, basic, b''.join(full))
+
+    @staticmethod
+    def __string(text: str) -> bytes:
+        return text.encode('utf8') + b'\x00'
+
+    async def open(self, host: Optional[str] = None, status_port: Optional[int] = None,
+                   query_port: Optional[int] = None):
+        """
+        Start the listeners whose port is given on the running loop
+        """
+        await self.close()
+        host = self.HOST if host is None else host
+        loop = asyncio.get_running_loop()
+        if status_port is not None:
+            self.__server = await asyncio.start_server(self.__serve, host, status_port)
+            self.__host_address = self.status_address
+            log(f'Starting Minecraft server on {self.__host_address[0]}:{self.__host_address[1]}')
+        if query_port is not None:
+            self.__query, _ = await loop.create_datagram_endpoint(
+                lambda: QueryProtocol(self), local_addr=(host, query_port))
+            address = self.query_address
+            log('Starting GS4 status listener')
+            log(f'Query running on {address[0]}:{address[1]}')
+        self.invalidate()
+
+    async def close(self):
+        server, self.__server = self.__server, None
+        if server is not None:
+            server.close()
+            for writer in list(self.__clients):
+                writer.close()
+            await server.wait_closed()
+        query, self.__query = self.__query, None
+        if query is not None:
+            query.close()
+
+    def start(self, host: Optional[str] = None, status_port: Optional[int] = None, query_port: Optional[int] = None):
+        """
+        Blocking open() for code outside of the event loop
+        """
+        get_runtime().call(self.open(host, status_port, query_port))
+
+    def stop(self):
+        if self.__server is not None or self.__query is not None:
+            get_runtime().call(self.close())
+
+    async def __serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.__clients.add(writer)
+        try:
+            await asyncio.wait_for(self.__session(reader, writer), self.TIMEOUT)
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError, ValueError):
+            pass
+        except Exception:
+            get_logger().exception('Error while answering a status request')
+        finally:
+            self.__clients.discard(writer)
+            writer.close()
+
+    async def __packet(self, reader: asyncio.StreamReader) -> Tuple[int, bytes]:
+        length = await read_varint(reader)
+        if not 0 < length <= self.MAX_PACKET:
+            raise ValueError(f'Invalid packet length {length}')
+        data = await reader.readexactly(length)
+        # every packet id of the handshake and status states fits in one byte
+        return data[0], data[1:]
+
+    async def __session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        first = await reader.readexactly(1)
+        if first == b'\xfe':
+            self.status_polls += 1
+            writer.write(self.cache().legacy)
+            await writer.drain()
+            return
+        length = await read_varint(reader, first[0])
+        if not 0 < length <= self.MAX_PACKET:
+            raise ValueError(f'Invalid packet length {length}')
+        handshake = await reader.readexactly(length)
+        # packet id, protocol version, address, port and finally the next state
+        if len(handshake) == 0 or handshake[0] != 0x00 or handshake[-1] != 1:
+            return
+        while True:
+            packet_id, payload = await self.__packet(reader)
+            if packet_id == 0x00:
+                self.status_polls += 1
+                writer.write(self.cache().status)
+            elif packet_id == 0x01 and len(payload) == 8:
+                writer.write(b'\x09\x01' + payload)
+                await writer.drain()
+                return
+            else:
+                return
+            await writer.drain()
+
+    def query(self, data: bytes, address: Tuple[str, int]) -> Optional[bytes]:
+        """
+        The reply to a Query datagram, or None if it is ignored like vanilla does with invalid requests
+        """
+        if len(data) < self.QUERY_HEADER.size:
+            return None
+        magic, kind, session = self.QUERY_HEADER.unpack_from(data)
+        if magic != self.QUERY_MAGIC:
+            return None
+        header = bytes((kind,)) + struct.pack('>i', session)
+        now = time.monotonic()
+        if kind == self.QUERY_HANDSHAKE:
+            token = secrets.randbelow(1 << 24)
+            self.__challenges[address] = (token, now)
+            if len(self.__challenges) > 1024:
+                self.__expire(now)
+            return header + self.__string(str(token))
+        if kind != self.QUERY_STAT or len(data) < self.QUERY_HEADER.size + 4:
+            return None
+        challenge = self.__challenges.get(address)
+        token = struct.unpack_from('>i', data, self.QUERY_HEADER.size)[0]
+        if challenge is None or challenge[0] != token or now - challenge[1] > self.CHALLENGE_LIFETIME:
+            return None
+        self.query_polls += 1
+        cache = self.cache()
+        # the full stat request pads the token with 4 more bytes
+        return header + (cache.full if len(data) >= self.QUERY_HEADER.size + 8 else cache.basic)
+
+    def __expire(self, now: float):
+        for address, (_, issued) in list(self.__challenges.items()):
+            if now - issued > self.CHALLENGE_LIFETIME:
+                del self.__challenges[address]
+
+
+class QueryProtocol(asyncio.DatagramProtocol):
+
+    def __init__(self, status: ServerStatus):
+        self.__status = status
+        self.__transport: Optional[asyncio.DatagramTransport] = None
+
+    def connection_made(self, transport: asyncio.DatagramTransport):
+        self.__transport = transport
+
+    def datagram_received(self, data: bytes, address: Tuple[str, int]):
+        reply = self.__status.query(data, address)
+        if reply is not None:
+            self.__transport.sendto(reply, address)
+
+
+def get_status() -> ServerStatus:
+    return ServerStatus.get_instance()
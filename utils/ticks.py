@@ -0,0 +1,233 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Callable, List, Optional, Tuple
+
+from mcdreforged.api.rtext import *
+
+from utils.logger import get_logger, log
+
+
+__all__ = [
+    "ScheduledTask",
+    "TickScheduler",
+    "get_scheduler",
+]
+
+
+class ScheduledTask:
+    __slots__ = ('due', 'func', 'args', 'interval', 'cancelled')
+
+    def __init__(self, due: int, func: Callable, args: tuple, interval: Optional[int]):
+        self.due = due
+        self.func = func
+        self.args = args
+        self.interval = interval
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TickScheduler:
+    """
+    The game loop: runs scheduled tasks every tick at the target tick rate and warns when it falls behind like vanilla.
+    With a virtual clock the game time only advances with ticks, so sprinting fast-forwards the log timestamps
+    """
+    TPS = 20.0
+    # the range accepted by vanilla's tick rate command
+    MIN_TPS = 1.0
+    MAX_TPS = 10000.0
+    THREAD_NAME = 'Server Thread'
+    # vanilla warns when running 2000ms behind, at most once per 15 seconds
+    WARNING_THRESHOLD = 2.0
+    WARNING_INTERVAL = 15.0
+    SAMPLE_SIZE = 100
+
+    __gl_instance = None
+    __create_lock = threading.Lock()
+
+    def __init__(self, tps: Optional[float] = None, virtual: bool = False):
+        self.__tps = self.TPS if tps is None else self.__checked_rate(tps)
+        self.virtual = virtual
+        self.__tick = 0
+        self.__queue: List[Tuple[int, int, ScheduledTask]] = []
+        self.__counter = itertools.count()
+        self.__lock = threading.Lock()
+        self.__wakeup = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+        self.__running = False
+        self.__frozen = False
+        self.__steps = 0
+        self.__sprint = 0
+        self.__lag = 0.0
+        self.__virtual_time = time.time()
+        self.__durations = deque(maxlen=self.SAMPLE_SIZE)
+
+    @classmethod
+    def get_instance(cls) -> 'TickScheduler':
+        if cls.__gl_instance is None:
+            with cls.__create_lock:
+                if cls.__gl_instance is None:
+                    cls.__gl_instance = cls()
+        return cls.__gl_instance
+
+    @property
+    def tick(self) -> int:
+        return self.__tick
+
+    @property
+    def tps(self) -> float:
+        return self.__tps
+
+    @property
+    def frozen(self) -> bool:
+        return self.__frozen
+
+    @property
+    def sprinting(self) -> bool:
+        return self.__sprint > 0
+
+    @property
+    def mspt(self) -> float:
+        """
+        Average milliseconds spent per tick over the recent ticks
+        """
+        durations = list(self.__durations)
+        return 0.0 if len(durations) == 0 else sum(durations) * 1000 / len(durations)
+
+    def time(self) -> float:
+        return self.__virtual_time if self.virtual else time.time()
+
+    def start(self):
+        if self.__thread is None:
+            self.__running = True
+            self.__virtual_time = time.time()
+            self.__thread = threading.Thread(target=self.__run, name=self.THREAD_NAME, daemon=True)
+            self.__thread.start()
+
+    def stop(self):
+        thread = self.__thread
+        if thread is not None:
+            self.__running = False
+            self.__wakeup.set()
+            thread.join()
+            self.__thread = None
+
+    def schedule(self, delay: int, func: Callable, *args, interval: Optional[int] = None) -> ScheduledTask:
+        """
+        Run func on the tick thread after delay ticks, then every interval ticks if given
+        """
+        with self.__lock:
+            task = ScheduledTask(self.__tick + max(delay, 1), func, args, interval)
+            heapq.heappush(self.__queue, (task.due, next(self.__counter), task))
+        return task
+
+    @classmethod
+    def __checked_rate(cls, tps: float) -> float:
+        # the tick thread divides by the rate, and would spin on a negative one
+        if not cls.MIN_TPS <= tps <= cls.MAX_TPS:
+            raise ValueError(f'Tick rate must be between {cls.MIN_TPS} and {cls.MAX_TPS}, found {tps}')
+        return tps
+
+    def set_rate(self, tps: float):
+        self.__tps = self.__checked_rate(tps)
+        self.__wakeup.set()
+
+    def freeze(self):
+        self.__frozen = True
+
+    def unfreeze(self):
+        self.__frozen = False
+        self.__steps = 0
+        self.__wakeup.set()
+
+    def step(self, ticks: int):
+        self.__steps += ticks
+        self.__wakeup.set()
+
+    def sprint(self, ticks: int):
+        """
+        Run ticks as fast as possible, reporting the achieved rate once they are done
+        """
+        self.__sprint += ticks
+        self.__wakeup.set()
+
+    def stop_sprint(self) -> bool:
+        sprinting, self.__sprint = self.__sprint > 0, 0
+        return sprinting
+
+    def inject_lag(self, milliseconds: float):
+        """
+        Stall the next tick, as if it took milliseconds to process
+        """
+        self.__lag += milliseconds / 1000
+        self.__wakeup.set()
+
+    def __run(self):
+        next_time = time.monotonic()
+        last_warning = float('-inf')
+        sprint_start = sprint_ticks = None
+        while self.__running:
+            now = time.monotonic()
+            if self.__sprint > 0:
+                if sprint_start is None:
+                    sprint_start, sprint_ticks = now, 0
+            else:
+                if sprint_start is not None:
+                    self.__report_sprint(sprint_ticks, now - sprint_start)
+                    sprint_start = None
+                    next_time = now
+                behind = now - next_time
+                if behind > self.WARNING_THRESHOLD and next_time - last_warning >= self.WARNING_INTERVAL:
+                    ticks = int(behind * self.__tps)
+                    get_logger().warning(
+                        f"Can't keep up! Is the server overloaded? Running {int(behind * 1000)}ms or {ticks} ticks behind")
+                    next_time += ticks / self.__tps
+                    last_warning = next_time
+                if now < next_time:
+                    self.__wakeup.wait(next_time - now)
+                    self.__wakeup.clear()
+                    continue
+                next_time += 1 / self.__tps
+                if self.__frozen:
+                    if self.__steps == 0:
+                        continue
+                    self.__steps -= 1
+            start = time.monotonic()
+            self.__run_tick()
+            if self.__lag > 0:
+                lag, self.__lag = self.__lag, 0.0
+                time.sleep(lag)
+            self.__durations.append(time.monotonic() - start)
+            if sprint_start is not None:
+                sprint_ticks += 1
+                self.__sprint = max(self.__sprint - 1, 0)
+
+    def __run_tick(self):
+        self.__tick += 1
+        self.__virtual_time += 1 / self.__tps
+        while True:
+            with self.__lock:
+                if len(self.__queue) == 0 or self.__queue[0][0] > self.__tick:
+                    return
+                _, _, task = heapq.heappop(self.__queue)
+                if task.interval is not None and not task.cancelled:
+                    task.due = self.__tick + task.interval
+                    heapq.heappush(self.__queue, (task.due, next(self.__counter), task))
+            if task.cancelled:
+                continue
+            try:
+                task.func(*task.args)
+            except Exception:
+                get_logger().exception(RText(f'Error occurred in {self.THREAD_NAME}:', RColor.red))
+
+    def __report_sprint(self, ticks: int, cost: float):
+        cost = max(cost, 1e-9)
+        log(f'Sprint completed with {round(ticks / cost)} ticks per second, or {round(cost * 1000 / max(ticks, 1), 2)} ms per tick')
+
+
+def get_scheduler() -> TickScheduler:
+    return TickScheduler.get_instance()
@@ -2,58 +2,79 @@ import typing
 import uuid
 import hashlib
 import re
-import requests
+import struct
+from functools import lru_cache
+
+
+PLAYER_NAME_PATTERN = re.compile(r'\w+')
+OFFLINE_UUID_CACHE_SIZE = 65536
+# the int array form used by NBT, four big endian signed 32 bit words
+INT_ARRAY = struct.Struct('>4i')
+
+
+@lru_cache(maxsize=OFFLINE_UUID_CACHE_SIZE)
+def _offline_uuid(player: str) -> uuid.UUID:
+    # same as java.util.UUID.nameUUIDFromBytes, the version argument sets the version 3 and IETF variant bits
+    return uuid.UUID(bytes=hashlib.md5(b'OfflinePlayer:' + player.encode()).digest(), version=3)
 
 
 def get_offline_uuid(player: str, verify_name: bool = True) -> typing.Optional[uuid.UUID]:
     if verify_name and not verify_player_name(player):
         return None
-    id_ = ("OfflinePlayer:" + player).encode()
-    md5 = hashlib.md5()
-    md5.update(id_)
-    md5_bytes = bytearray(md5.digest())
-    md5_bytes[6] &= 0x0F  # clear version
-    md5_bytes[6] |= 0x30  # set to version 3
-    md5_bytes[8] &= 0x3F  # clear variant
-    md5_bytes[8] |= 0x80  # set to IETF variant
-    return uuid.UUID(bytes=bytes(md5_bytes))
+    return _offline_uuid(player)
+
+
+def get_offline_uuids(players: typing.Iterable[str], verify_name: bool = True) -> typing.List[typing.Optional[uuid.UUID]]:
+    """
+    Offline UUIDs of many players at once, invalid names map to None when verify_name is set
+    """
+    if not verify_name:
+        return list(map(_offline_uuid, players))
+    return [_offline_uuid(player) if verify_player_name(player) else None for player in players]
 
 
 def verify_player_name(player: str):
-    return (re.fullmatch(r"\w+", player) is not None) and len(player) <= 16
+    return len(player) <= 16 and PLAYER_NAME_PATTERN.fullmatch(player) is not None
 
 
-def get_decimal(num: str):
-    num = list(num)
-    pos = num.pop(0) == '0'
-    #pre = '' if pos else '-'
-    return eval(f'0b{"".join(num)}')
+def get_decimal(num: str) -> int:
+    """
+    Value of a two's complement binary string, the first digit being the sign bit
+    """
+    value = int(num, 2)
+    return value - (1 << len(num)) if num[0] == '1' else value
 
 
-def get_tuple_uuid(uuid_: uuid.UUID):
-    uuid_ = [uuid_.hex[:8], uuid_.hex[8:16], uuid_.hex[16:24], uuid_.hex[24:32]]
-    for item in uuid_:
-        yield eval(f'(0x{item} << 1) / 0b10')
+def get_tuple_uuid(uuid_: uuid.UUID) -> typing.Tuple[int, int, int, int]:
+    return INT_ARRAY.unpack(uuid_.bytes)
 
 
-def convert_uuid_from_tuple(uuid_tuple: typing.Iterable[int]):
-    uuid_tuple: typing.Tuple[int, int, int, int] = tuple(uuid_tuple)
+def convert_uuid_from_tuple(uuid_tuple: typing.Iterable[int]) -> uuid.UUID:
+    uuid_tuple = tuple(uuid_tuple)
     if len(uuid_tuple) != 4:
         raise ValueError('Invalid length iterable object input')
-    ret = []
-    for item in uuid_tuple:
-        if item < 0:
-            item = int(f'1{"0" * 8}', 16) + item
-        item = format(item, 'x')
-        length = 8 - len(item)
-        if length > 0:
-            item = length * '0' + item
-        ret.append(item)
-    return uuid.UUID(''.join(ret))
+    try:
+        return uuid.UUID(bytes=INT_ARRAY.pack(*uuid_tuple))
+    except struct.error as exc:
+        raise ValueError(f'Invalid int array {uuid_tuple}: {exc}') from None
+
+
+def get_tuple_uuids(uuids: typing.Iterable[uuid.UUID]) -> typing.List[typing.Tuple[int, int, int, int]]:
+    return list(INT_ARRAY.iter_unpack(b''.join(uuid_.bytes for uuid_ in uuids)))
+
+
+def convert_uuids_from_tuples(uuid_tuples: typing.Iterable[typing.Iterable[int]]) -> typing.List[uuid.UUID]:
+    return [convert_uuid_from_tuple(uuid_tuple) for uuid_tuple in uuid_tuples]
+
+
+def format_int_array(uuid_: uuid.UUID) -> str:
+    """
+    SNBT form of the UUID, as shown by data get entity
+    """
+    return '[I; {}, {}, {}, {}]'.format(*INT_ARRAY.unpack(uuid_.bytes))
 
 
 if __name__ == "__main__":
     target = convert_uuid_from_tuple([240899192, 1909081247, -1531449260, -1479246119])
-    print(len(target.hex))
     print(target.hex)
-    print(list(get_tuple_uuid(uuid_=target)))
+    print(get_tuple_uuid(target))
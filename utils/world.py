@@ -0,0 +1,290 @@
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from utils.logger import get_logger
+from utils.nbt import parse_snbt
+
+
+__all__ = [
+    "SaveStats",
+    "WorldState",
+    "get_world",
+]
+
+
+class SaveStats(NamedTuple):
+    regions: int
+    written: int
+    duration: float
+    compacted: bool
+
+    def __str__(self):
+        text = f'Saved {self.regions} regions ({self.written} bytes) in {round(self.duration * 1000, 2)} ms'
+        return text + ', compacted the world file' if self.compacted else text
+
+
+class WorldState:
+    """
+    Persistent world state: command storage, entity and block data, scoreboards and the player registry.
+    Owners mark regions dirty with a provider of the region's current SNBT, and a save appends only
+    the dirty regions to an append-only file. Loading just indexes the latest record of every region,
+    the payloads stay in the memory-mapped file until a region is restored
+    """
+    DIRECTORY = 'world'
+    FILE_NAME = 'regions.dat'
+    # vanilla autosaves every 6000 ticks, i.e. 5 minutes
+    AUTOSAVE_INTERVAL = 6000
+    COMPRESS_LEVEL = 6
+    # rewrite the file once superseded records make up most of it
+    COMPACT_RATIO = 2.0
+    COMPACT_MIN_BYTES = 1024 * 1024
+    # crc32 of name and payload, payload length, name length
+    HEADER = struct.Struct('>IIH')
+
+    __gl_instance = None
+    __create_lock = threading.Lock()
+
+    def __init__(self):
+        self.__lock = threading.RLock()
+        self.__dirty_lock = threading.Lock()
+        self.__dirty: Dict[str, Callable[[], str]] = {}
+        # the dirty regions of the running save, until their records are indexed
+        self.__saving: Dict[str, Callable[[], str]] = {}
+        # serializes saves, which call the providers without holding the world lock
+        self.__save_lock = threading.Lock()
+        self.__index: Dict[str, Tuple[int, int]] = {}
+        self.__path: Optional[str] = None
+        self.__file = None
+        self.__map: Optional[mmap.mmap] = None
+        self.__size = 0
+        self.__live = 0
+        self.saving_enabled = True
+
+    @classmethod
+    def get_instance(cls) -> 'WorldState':
+        if cls.__gl_instance is None:
+            with cls.__create_lock:
+                if cls.__gl_instance is None:
+                    cls.__gl_instance = cls()
+        return cls.__gl_instance
+
+    @property
+    def path(self) -> Optional[str]:
+        return self.__path
+
+    @property
+    def dirty(self) -> int:
+        return len(self.__dirty)
+
+    @property
+    def regions(self) -> int:
+        return len(self.__index)
+
+    @property
+    def file_size(self) -> int:
+        return self.__size
+
+    def open(self, directory: Optional[str] = None) -> int:
+        """
+        Index the world file, returning the number of regions found
+        """
+        with self.__lock:
+            self.close(save=False)
+            directory = self.DIRECTORY if directory is None else directory
+            os.makedirs(directory, exist_ok=True)
+            self.__path = os.path.join(directory, self.FILE_NAME)
+            self.__file = open(self.__path, 'a+b')
+            self.__remap()
+            self.__index.clear()
+            self.__size = self.__live = 0
+            for name, offset, length, end in self.__records():
+                previous = self.__index.get(name)
+                if previous is not None:
+                    self.__live -= self.__record_length(name, previous[1])
+                self.__index[name] = (offset, length)
+                self.__live += end - self.__size
+                self.__size = end
+            if self.__size < os.fstat(self.__file.fileno()).st_size:
+                get_logger().warning(f'Discarding a torn record at the end of {self.__path}')
+                self.__file.truncate(self.__size)
+                self.__remap()
+            return len(self.__index)
+
+    def close(self, save: bool = True):
+        # outside the world lock like every save, see save()
+        if save and self.__file is not None and self.saving_enabled and self.dirty != 0:
+            self.save(flush=True)
+        with self.__lock:
+            if self.__file is None:
+                return
+            if self.__map is not None:
+                self.__map.close()
+                self.__map = None
+            self.__file.close()
+            self.__file = None
+
+    def __remap(self):
+        if self.__map is not None:
+            self.__map.close()
+            self.__map = None
+        self.__file.flush()
+        if os.fstat(self.__file.fileno()).st_size > 0:
+            self.__map = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __record_length(self, name: str, length: int) -> int:
+        return self.HEADER.size + len(name.encode('utf8')) + length
+
+    def __records(self) -> Iterator[Tuple[str, int, int, int]]:
+        """
+        (name, payload offset, payload length, record end) of every intact record, stopping at the first torn one
+        """
+        data = self.__map
+        if data is None:
+            return
+        position, size = 0, len(data)
+        while position + self.HEADER.size <= size:
+            crc, length, name_length = self.HEADER.unpack_from(data, position)
+            start = position + self.HEADER.size
+            end = start + name_length + length
+            if end > size or zlib.crc32(data[start:end]) != crc:
+                return
+            yield data[start:start + name_length].decode('utf8'), start + name_length, length, end
+            position = end
+
+    def mark_dirty(self, region: str, provider: Callable[[], str]):
+        """
+        Save the SNBT returned by provider as the region on the next save
+        """
+        with self.__dirty_lock:
+            self.__dirty[region] = provider
+
+    def restore(self, region: str) -> Any:
+        """
+        The NBT of a region, from its pending provider if it changed since the last save,
+        or None if it was never saved
+        """
+        with self.__dirty_lock:
+            provider = self.__dirty.get(region) or self.__saving.get(region)
+        if provider is not None:
+            return parse_snbt(provider())
+        with self.__lock:
+            location = self.__index.get(region)
+            if location is None or self.__map is None:
+                return None
+            offset, length = location
+            payload = self.__map[offset:offset + length]
+        return parse_snbt(zlib.decompress(payload).decode('utf8'))
+
+    def save(self, flush: bool = False) -> SaveStats:
+        """
+        Append every dirty region to the world file, syncing it to the disk if flush is set
+        """
+        start = time.perf_counter()
+        with self.__save_lock:
+            with self.__dirty_lock:
+                dirty, self.__dirty = self.__dirty, {}
+                self.__saving = dirty
+            try:
+                # providers may take the locks of their owners, which call restore() while holding them,
+                # so they run before the world lock is taken
+                records = []
+                for name, provider in dirty.items():
+                    records.append((name, name.encode('utf8'),
+                                    zlib.compress(provider().encode('utf8'), self.COMPRESS_LEVEL)))
+                written, compacted = self.__append(records, flush)
+            except BaseException:
+                with self.__dirty_lock:
+                    # regions marked again meanwhile keep their newer provider
+                    for name, provider in dirty.items():
+                        self.__dirty.setdefault(name, provider)
+                raise
+            finally:
+                with self.__dirty_lock:
+                    self.__saving = {}
+        return SaveStats(len(dirty), written, time.perf_counter() - start, compacted)
+
+    def __append(self, records: List[Tuple[str, bytes, bytes]], flush: bool) -> Tuple[int, bool]:
+        """
+        Write the (name, encoded name, payload) records and index them, returning the bytes written
+        and whether the file was compacted
+        """
+        with self.__lock:
+            if self.__file is None:
+                self.open()
+            chunks = []
+            locations = {}
+            written = 0
+            for name, encoded, payload in records:
+                body = encoded + payload
+                chunks.append(self.HEADER.pack(zlib.crc32(body), len(payload), len(encoded)))
+                chunks.append(body)
+                locations[name] = (self.__size + written + self.HEADER.size + len(encoded), len(payload))
+                written += self.HEADER.size + len(body)
+            if written != 0:
+                try:
+                    self.__file.seek(0, os.SEEK_END)
+                    self.__file.write(b''.join(chunks))
+                    self.__file.flush()
+                except BaseException:
+                    # drop a partly written tail, so the next save appends at the indexed size again
+                    self.__file.truncate(self.__size)
+                    raise
+            # the index only points at records once they are in the file
+            for name, location in locations.items():
+                previous = self.__index.get(name)
+                if previous is not None:
+                    self.__live -= self.__record_length(name, previous[1])
+                self.__index[name] = location
+            self.__live += written
+            self.__size += written
+            compacted = self.__size >= self.COMPACT_MIN_BYTES and self.__size > self.__live * self.COMPACT_RATIO
+            if compacted:
+                self.__compact()
+            elif written != 0:
+                self.__remap()
+            if flush:
+                os.fsync(self.__file.fileno())
+        return written, compacted
+
+    def __compact(self):
+        """
+        Rewrite the latest record of every region into a new file, which replaces the old one
+        """
+        self.__file.flush()
+        self.__remap()
+        temp = self.__path + '.tmp'
+        index = {}
+        position = 0
+        with open(temp, 'wb') as file:
+            for name, (offset, length) in self.__index.items():
+                header_start = offset - len(name.encode('utf8')) - self.HEADER.size
+                record = self.__map[header_start:offset + length]
+                file.write(record)
+                index[name] = (position + len(record) - length, length)
+                position += len(record)
+            file.flush()
+            os.fsync(file.fileno())
+        self.__map.close()
+        self.__map = None
+        self.__file.close()
+        os.replace(temp, self.__path)
+        self.__file = open(self.__path, 'a+b')
+        self.__index = index
+        self.__size = self.__live = position
+        self.__remap()
+
+    def autosave(self):
+        """
+        Periodic save, skipped while saving is turned off
+        """
+        if self.saving_enabled and self.dirty != 0:
+            self.save()
+
+
+def get_world() -> WorldState:
+    return WorldState.get_instance()